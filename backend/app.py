@@ -1,107 +1,125 @@
+import os
 import json
+from functions.aws import get_client
+from functions.metrics import begin_request, emit_request_metrics, remote_calls
+from functions.http import (
+    RequestContext, Router, build_pipeline, handle_errors, cors, decode_body, authenticate
+)
+from functions.responses import accepts_gzip, encode_response
 from functions.helpers import (
-    create_project, get_projects, update_project, delete_project,
-    create_task, get_tasks, update_task, delete_task, TASK_STATUSES,
-    invite_user, get_project_invites, update_invite_status, search_users
+    create_project, get_projects, update_project, delete_project, export_project, import_project,
+    create_task, get_tasks, update_task, delete_task, batch_tasks, search_tasks, get_archived_tasks, TASK_STATUSES,
+    invite_user, get_project_invites, update_invite_status, search_users,
+    get_analytics, get_activity, get_changes, run_cascade_delete, run_rebuild_stats, run_rebuild_search,
+    run_archive_tasks
 )
+from functions.storage import storage
 
-def lambda_handler(event, context):
-    # Add CORS headers
-    headers = {
-        'Access-Control-Allow-Headers': 'Content-Type',
-        'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Methods': '*'
+# Asynchronous jobs the function invokes on itself
+JOBS = {
+    'cascade_delete': run_cascade_delete,
+    'rebuild_stats': run_rebuild_stats,
+    'rebuild_search': run_rebuild_search,
+    'archive_tasks': run_archive_tasks
+}
+
+
+def start_job(job, **params):
+    """Hand a JOBS entry to an asynchronous invocation of this function.
+
+    Returns False when not running inside Lambda; the caller then runs the
+    job inline.
+    """
+    function_name = os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+    if not function_name:
+        return False
+    get_client('lambda').invoke(
+        FunctionName=function_name,
+        InvocationType='Event',
+        Payload=json.dumps({'job': job, **params})
+    )
+    return True
+
+# Handlers are called as handler(request, user_id)
+ROUTES = {
+    '/projects': {
+        'POST': create_project,
+        'GET': get_projects,
+        'PUT': update_project,
+        'DELETE': delete_project
+    },
+    '/projects/export': {
+        'GET': export_project
+    },
+    '/projects/import': {
+        'POST': import_project
+    },
+    '/tasks': {
+        'POST': create_task,
+        'GET': get_tasks,
+        'PUT': update_task,
+        'DELETE': delete_task
+    },
+    '/tasks/batch': {
+        'POST': batch_tasks
+    },
+    '/tasks/search': {
+        'GET': search_tasks
+    },
+    '/tasks/archive': {
+        'GET': get_archived_tasks
+    },
+    '/invites': {
+        'POST': invite_user,
+        'GET': get_project_invites,
+        'PUT': update_invite_status
+    },
+    '/analytics': {
+        'GET': get_analytics
+    },
+    '/activity': {
+        'GET': get_activity
+    },
+    '/changes': {
+        'GET': get_changes
+    },
+    '/users': {
+        'GET': search_users
     }
+}
 
-    try:
-        method = event['httpMethod']
-        path = event['resource']
-        
-        # Handle OPTIONS requests for CORS
-        if method == 'OPTIONS':
-            return {
-                'statusCode': 200,
-                'headers': headers,
-                'body': json.dumps('OK')
-            }
-        
-        # Extract user_id more robustly
-        user_id = None
-        query_params = event.get('queryStringParameters', {}) or {}
-        
-        # Try to get user_id from query parameters first
-        user_id = query_params.get('userId')
-        
-        # If not in query params, try to get from body
-        if not user_id and method in ['POST', 'PUT', 'DELETE']:
-            try:
-                body = json.loads(event.get('body', '{}'))
-                user_id = body.get('userId')
-            except json.JSONDecodeError:
-                return {
-                    'statusCode': 400,
-                    'headers': headers,
-                    'body': json.dumps('Invalid JSON in request body')
-                }
 
-        # Validate user_id
-        if not user_id:
-            return {
-                'statusCode': 401,
-                'headers': headers,
-                'body': json.dumps('Unauthorized: Missing userId')
-            }
+def request_scope(request, call_next):
+    """Per-request state: fresh storage scope and counters, body encoding, metrics"""
+    # Log request details for debugging
+    print(f"Processing {request.method} request to {request.path} for user_id: {request.user_id}")
 
-        # Route requests with validated user_id
-        if path == '/projects':
-            handlers = {
-                'POST': lambda e, uid: create_project(e, uid),
-                'GET': lambda e, uid: get_projects(uid),
-                'PUT': lambda e, uid: update_project(e, uid),
-                'DELETE': lambda e, uid: delete_project(e, uid)
-            }
-        elif path == '/tasks':
-            handlers = {
-                'POST': lambda e, uid: create_task(e, uid),
-                'GET': lambda e, uid: get_tasks(e, uid),
-                'PUT': lambda e, uid: update_task(e, uid),
-                'DELETE': lambda e, uid: delete_task(e, uid)
-            }
-        elif path == '/invites':
-            handlers = {
-                'POST': lambda e, uid: invite_user(e, uid),
-                'GET': lambda e, uid: get_project_invites(uid),
-                'PUT': lambda e, uid: update_invite_status(e, uid)
-            }
-        elif path == '/users':
-            handlers = {
-                'GET': lambda e, uid: search_users(e, uid)
-            }
-        else:
-            return {
-                'statusCode': 404,
-                'headers': headers,
-                'body': json.dumps('Not Found')
-            }
+    begin_request()
+    storage.begin_request()
+    response = call_next(request)
+    # Encoding can still read query pages, so it happens before counting
+    response = encode_response(response, accepts_gzip(request))
 
-        handler = handlers.get(method)
-        if not handler:
-            return {
-                'statusCode': 405,
-                'headers': headers,
-                'body': json.dumps('Method Not Allowed')
-            }
+    # One metrics record per invocation: capacity units, items and calls
+    emit_request_metrics(request.path, request.method, response.get('statusCode'))
+    total_calls = sum(remote_calls().values())
+    response['headers'] = {**response.get('headers', {}), 'X-Remote-Calls': str(total_calls)}
+    return response
 
-        # Log request details for debugging
-        print(f"Processing {method} request to {path} for user_id: {user_id}")
-        
-        # Call handler with validated user_id
-        return handler(event, user_id)
 
-    except Exception as e:
-        print(f"Error processing request: {str(e)}")  # Add logging
-        return {
-            'statusCode': 500,
-            'headers': headers,
-            'body': json.dumps(f'Internal Server Error: {str(e)}')
-        }
+# Built once at import; layers run outermost first
+handle_request = build_pipeline(
+    [handle_errors, cors, decode_body, authenticate, request_scope],
+    Router(ROUTES)
+)
+
+
+def lambda_handler(event, context):
+    # Internal async jobs are not API Gateway requests
+    if 'job' in event:
+        begin_request()
+        result = JOBS[event['job']](event, context)
+        emit_request_metrics(f"job:{event['job']}", 'INVOKE')
+        return result
+
+    return handle_request(RequestContext(event))
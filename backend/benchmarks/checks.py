@@ -0,0 +1,152 @@
+"""Behavior checks of the API contracts, run by harness.py on every engine.
+
+Each check drives app.lambda_handler on a freshly generated dataset and
+raises AssertionError when a contract is broken: conditional GETs (304),
+delta-sync tombstones, per-item batch results, analytics counters kept in
+step with task writes, and /changes waking up on a write. A failed check
+fails the harness run.
+"""
+import io
+import json
+import contextlib
+import threading
+from time import perf_counter
+from datetime import datetime, timedelta
+
+import app
+from functions.storage import storage
+from functions.analytics import VERSION_KEY, rebuild_stat_counts
+from functions.changes import CHANGES_POLL_SECONDS
+
+
+def call(request):
+    """Run one request; returns (status code, decoded body, headers)"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        response = app.lambda_handler(request, None)
+    body = response.get('body')
+    return response['statusCode'], json.loads(body) if body else None, response['headers']
+
+
+def check_not_modified(dataset, event):
+    user_id, project_id = dataset.user_id, dataset.main_project
+    status, _, headers = call(event('GET', '/tasks', user_id, {'project_id': project_id}))
+    etag = headers.get('ETag')
+    assert status == 200 and etag, f'GET /tasks answered {status} with ETag {etag!r}'
+
+    status, _, _ = call(event('GET', '/tasks', user_id, {'project_id': project_id}, headers={'If-None-Match': etag}))
+    assert status == 304, f'unchanged project answered {status} instead of 304'
+
+    task_id = dataset.task_ids[project_id][0]
+    status, _, _ = call(event('PUT', '/tasks', user_id, {'task_id': task_id}, body={
+        'project_id': project_id, 'description': 'Changed by the contract checks'
+    }))
+    assert status == 200, f'PUT /tasks answered {status}'
+    status, _, headers = call(event('GET', '/tasks', user_id, {'project_id': project_id}, headers={'If-None-Match': etag}))
+    assert status == 200 and headers.get('ETag') != etag, f'changed project answered {status} with the old ETag'
+
+
+def check_tombstones(dataset, event):
+    user_id, project_id = dataset.user_id, dataset.main_project
+    since = (datetime.now() - timedelta(minutes=1)).isoformat()
+    task_id = dataset.task_ids[project_id].pop()
+    status, _, _ = call(event('DELETE', '/tasks', user_id, {'task_id': task_id, 'project_id': project_id}))
+    assert status == 200, f'DELETE /tasks answered {status}'
+
+    status, body, _ = call(event('GET', '/tasks', user_id, {'all_projects': 'true', 'since': since}))
+    assert status == 200, f'delta sync answered {status}'
+    deleted = {(item['task_id'], item['project_id']) for item in body['deleted_tasks']}
+    assert (task_id, project_id) in deleted, 'deleted task is missing from deleted_tasks'
+    assert task_id not in {task['task_id'] for task in body['tasks']}, 'deleted task is still listed'
+
+
+def check_batch_results(dataset, event):
+    user_id, project_id = dataset.user_id, dataset.main_project
+    task_id = dataset.task_ids[project_id][1]
+    status, body, _ = call(event('POST', '/tasks/batch', user_id, body={
+        'project_id': project_id,
+        'operations': [
+            {'op': 'update', 'task_id': task_id, 'changes': {'status': 'Done'}},
+            {'op': 'delete', 'task_id': 'missing-task'},
+            {'op': 'update', 'task_id': task_id, 'changes': {'status': 'Backlog'}},
+            {'op': 'create', 'task': {'name': 'No description'}}
+        ]
+    }))
+    assert status == 200, f'POST /tasks/batch answered {status}'
+    codes = [result['statusCode'] for result in body['results']]
+    assert codes == [200, 404, 409, 400], f'per-item status codes were {codes}'
+
+    storage.begin_request()
+    task = storage.load_task(task_id, project_id).get()
+    assert task['status'] == 'Done', 'the successful item was not applied'
+
+
+def check_counters(dataset, event):
+    user_id, project_id = dataset.user_id, dataset.main_project
+    members = dataset.members[project_id]
+    status, body, _ = call(event('POST', '/tasks', user_id, body={
+        'project_id': project_id, 'name': 'Counted task', 'description': 'Created by the contract checks',
+        'assigned_to': members[0]
+    }))
+    assert status == 200, f'POST /tasks answered {status}'
+    created_id = body['task']['task_id']
+    status, _, _ = call(event('PUT', '/tasks', user_id, {'task_id': created_id}, body={
+        'project_id': project_id, 'status': 'In Progress', 'assigned_to': members[-1]
+    }))
+    assert status == 200, f'PUT /tasks answered {status}'
+    status, _, _ = call(event('DELETE', '/tasks', user_id, {
+        'task_id': dataset.task_ids[project_id].pop(), 'project_id': project_id
+    }))
+    assert status == 200, f'DELETE /tasks answered {status}'
+
+    storage.begin_request()
+    tasks = [task for page in storage.task_pages(project_id) for task in page]
+    expected = {key: count for key, count in rebuild_stat_counts(tasks).items() if count}
+    counters = {
+        key: int(count) for key, count in storage.stat_counters(project_id).items()
+        if int(count) and key != VERSION_KEY and not key.startswith('day#')
+    }
+    assert counters == expected, f'counters {counters} do not match the tasks {expected}'
+
+    status, body, _ = call(event('GET', '/analytics', user_id, {'project_id': project_id}))
+    assert status == 200 and body['totals']['total'] == len(tasks), 'analytics total does not match the tasks'
+
+
+def check_changes_wake(dataset, event):
+    user_id, project_id = dataset.user_id, dataset.main_project
+    status, body, _ = call(event('GET', '/changes', user_id))
+    assert status == 200, f'GET /changes answered {status}'
+    cursor = body['cursor']
+
+    task_id = dataset.task_ids[project_id][2]
+    # Not call(): redirecting stdout from two threads could leave it redirected
+    writer = threading.Timer(0.2, app.lambda_handler, [event('PUT', '/tasks', user_id, {'task_id': task_id}, body={
+        'project_id': project_id, 'description': 'Written while /changes waits'
+    }), None])
+    start = perf_counter()
+    writer.start()
+    try:
+        status, body, _ = call(event('GET', '/changes', user_id, {'cursor': cursor, 'wait': '10'}))
+    finally:
+        writer.join()
+    elapsed = perf_counter() - start
+    assert status == 200, f'GET /changes?cursor answered {status}'
+    assert task_id in {task['task_id'] for task in body['tasks']}, 'the written task is missing from the changes'
+    # Polling alone would only notice the write after CHANGES_POLL_SECONDS
+    assert elapsed < CHANGES_POLL_SECONDS, f'/changes answered after {elapsed:.1f} s instead of waking up'
+
+
+# projects, members per project and tasks per project of the checked dataset
+CHECK_DATASET = (2, 3, 20)
+
+CHECKS = [check_not_modified, check_tombstones, check_batch_results, check_counters, check_changes_wake]
+
+
+def run_checks(dataset, event):
+    """[(check name, message)] of the failed checks"""
+    failures = []
+    for check in CHECKS:
+        try:
+            check(dataset, event)
+        except AssertionError as e:
+            failures.append((check.__name__, str(e)))
+    return failures
@@ -0,0 +1,115 @@
+"""Cold-start benchmark for the Lambda handler.
+
+Each sample runs in a fresh interpreter and measures:
+  import     - time to import app (what every cold start pays)
+  preflight  - first OPTIONS request (must not build any AWS client)
+  first_get  - first GET /projects, including client construction; the
+               DynamoDB call itself is answered by botocore's Stubber so no
+               network or credentials are needed
+
+Exits non-zero when the median of a measurement exceeds its budget.
+
+    python benchmarks/cold_start.py --samples 15 --import-budget-ms 400
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child interpreter
+SAMPLE = r'''
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+
+app.lambda_handler({'httpMethod': 'OPTIONS', 'resource': '/projects'}, None)
+preflight = time.perf_counter()
+
+from botocore.stub import Stubber
+from functions import aws
+from functions.aws import get_client
+clients_before = len(aws._clients)
+
+client_start = time.perf_counter()
+stubber = Stubber(get_client('dynamodb'))
+stubber.add_response('query', {'Items': [], 'Count': 0, 'ScannedCount': 0})
+stubber.activate()
+response = app.lambda_handler({
+    'httpMethod': 'GET',
+    'resource': '/projects',
+    'queryStringParameters': {'userId': 'benchmark-user'}
+}, None)
+first_get = time.perf_counter()
+
+print(json.dumps({
+    'import': (imported - start) * 1000,
+    'preflight': (preflight - imported) * 1000,
+    'first_get': (first_get - client_start) * 1000,
+    'clients_at_preflight': clients_before,
+    'status': response['statusCode']
+}))
+'''
+
+
+def run_sample():
+    env = dict(os.environ)
+    env.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    # Dummy credentials keep botocore from probing the instance metadata service
+    env.setdefault('AWS_ACCESS_KEY_ID', 'benchmark')
+    env.setdefault('AWS_SECRET_ACCESS_KEY', 'benchmark')
+    output = subprocess.run(
+        [sys.executable, '-c', SAMPLE],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--samples', type=int, default=10)
+    parser.add_argument('--import-budget-ms', type=float, default=float(os.environ.get('IMPORT_BUDGET_MS', 400)))
+    parser.add_argument('--preflight-budget-ms', type=float, default=float(os.environ.get('PREFLIGHT_BUDGET_MS', 5)))
+    parser.add_argument('--first-get-budget-ms', type=float, default=float(os.environ.get('FIRST_GET_BUDGET_MS', 400)))
+    args = parser.parse_args(argv)
+
+    # One warm-up run so the bytecode cache doesn't count against sample one
+    run_sample()
+    samples = [run_sample() for _ in range(args.samples)]
+
+    failures = []
+    if any(sample['clients_at_preflight'] for sample in samples):
+        failures.append('an AWS client was created before the first data request')
+    if any(sample['status'] != 200 for sample in samples):
+        failures.append('GET /projects did not return 200')
+
+    budgets = {
+        'import': args.import_budget_ms,
+        'preflight': args.preflight_budget_ms,
+        'first_get': args.first_get_budget_ms
+    }
+    print(f"{'measurement':<12}{'p50 ms':>10}{'p90 ms':>10}{'max ms':>10}{'budget':>10}")
+    for name, budget in budgets.items():
+        values = [sample[name] for sample in samples]
+        median = statistics.median(values)
+        print(f"{name:<12}{median:>10.1f}{percentile(values, 90):>10.1f}{max(values):>10.1f}{budget:>10.0f}")
+        if median > budget:
+            failures.append(f'{name} median {median:.1f} ms exceeds budget of {budget:.0f} ms')
+
+    for failure in failures:
+        print(f'FAIL: {failure}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
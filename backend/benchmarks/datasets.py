@@ -0,0 +1,175 @@
+"""Synthetic datasets for the offline benchmark harness.
+
+A dataset centres on one benchmark user who belongs to `projects` projects
+(owning every other one). Each project has `members` members in total and
+`tasks` tasks spread over the statuses, created by and assigned to random
+members. Every project also has one pending invitation for the benchmark
+user, and analytics counters, search postings and an activity log (created
+and last updated events) consistent with its tasks. The main project also
+has `tasks` archived Done tasks in archive segments.
+"""
+import os
+import sys
+import random
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from functions.activity import ACTIVITY_TABLE, activity_event, day_index_items  # noqa: E402
+from functions.analytics import STATS_TABLE, rebuild_stat_counts  # noqa: E402
+from functions.archive import ARCHIVE_AFTER_DAYS, archive_store, segment_tasks  # noqa: E402
+from functions.search import SEARCH_TABLE, posting_key, task_postings  # noqa: E402
+
+STATUSES = ['Backlog', 'In Progress', 'In Testing', 'Done']
+
+# Task descriptions cycle through these, so searches have selective terms
+AREAS = ['login', 'billing', 'search', 'export', 'onboarding', 'payments', 'reports', 'notifications']
+KINDS = ['bug', 'feature', 'cleanup']
+
+# name: (projects per user, members per project, tasks per project)
+SCENARIOS = {
+    'small': (1, 1, 10),
+    'medium': (10, 10, 100),
+    'large': (100, 50, 100),
+    'big-project': (1, 50, 10000)
+}
+
+
+class Dataset:
+    def __init__(self, name, user_id, username, project_ids, task_ids, members):
+        self.name = name
+        self.user_id = user_id
+        self.username = username
+        self.project_ids = project_ids
+        self.task_ids = task_ids          # {project_id: [task_id, ...]}
+        self.members = members            # {project_id: [user_id, ...]}
+
+    @property
+    def main_project(self):
+        """The project with the most tasks"""
+        return max(self.project_ids, key=lambda project_id: len(self.task_ids[project_id]))
+
+
+def generate(fake, name, projects, members, tasks, seed=0):
+    """Seed fake (a benchmarks.fakes.FakeAWS) and return the Dataset"""
+    rng = random.Random(seed)
+    prefix = f'{name}-{projects}-{members}-{tasks}'
+    now = datetime.now()
+
+    # Users: the benchmark user, the others that share its projects, and
+    # one inviter per project
+    user_ids = [f'{prefix}-user-{index:05d}' for index in range(max(members, 1) + 1)]
+    for index, user_id in enumerate(user_ids):
+        fake.cognito.add_user(user_id, f'{prefix}-name-{index:05d}')
+    user_id = user_ids[0]
+
+    project_items, member_items, task_items, stat_items, posting_items, event_items = [], [], [], [], [], []
+    project_ids, task_ids, project_members = [], {}, {}
+    for project_index in range(projects):
+        project_id = f'{prefix}-project-{project_index:04d}'
+        project_ids.append(project_id)
+
+        others = rng.sample(user_ids[1:], min(members - 1, len(user_ids) - 1)) if members > 1 else []
+        owner_id = user_id if project_index % 2 == 0 or not others else others[0]
+        member_ids = [user_id] + others
+        project_members[project_id] = member_ids
+
+        project_items.append({
+            'user_id': owner_id,
+            'project_id': project_id,
+            'name': f'Project {project_index}',
+            'description': f'Synthetic project {project_index} of {name}'
+        })
+        for member_id in member_ids:
+            member_items.append({
+                'project_id': project_id,
+                'user_id': member_id,
+                'status': 'OWNER' if member_id == owner_id else 'ACCEPTED',
+                'joined_at': now.isoformat()
+            })
+
+        project_tasks = []
+        for task_index in range(tasks):
+            created_at = now - timedelta(minutes=rng.randrange(60 * 24 * 30))
+            task = {
+                'task_id': f'{project_id}-task-{task_index:05d}',
+                'project_id': project_id,
+                'user_id': rng.choice(member_ids),
+                'name': f'Task {task_index}',
+                'description': (
+                    f'Synthetic task {task_index} in project {project_index}: '
+                    f'{AREAS[task_index % len(AREAS)]} {KINDS[task_index % len(KINDS)]}'
+                ),
+                'status': rng.choice(STATUSES),
+                'created_at': created_at.isoformat(),
+                'updated_at': (created_at + timedelta(minutes=rng.randrange(600))).isoformat()
+            }
+            if rng.random() < 0.7:
+                task['assigned_to'] = rng.choice(member_ids)
+            project_tasks.append(task)
+        task_items.extend(project_tasks)
+        task_ids[project_id] = [task['task_id'] for task in project_tasks]
+
+        for stat_key, count in rebuild_stat_counts(project_tasks).items():
+            stat_items.append({'project_id': project_id, 'stat_key': stat_key, 'count': count})
+        for task in project_tasks:
+            event_items.append(activity_event(
+                project_id, task['user_id'], 'created', 'task', task['task_id'], task['name'],
+                new_status=STATUSES[0], at=task['created_at']
+            ))
+            event_items.append(activity_event(
+                project_id, task['user_id'], 'updated', 'task', task['task_id'], task['name'],
+                old_status=STATUSES[0], new_status=task['status'], at=task['updated_at']
+            ))
+            for token, weight in task_postings(task).items():
+                posting_items.append({'project_id': project_id, 'posting': posting_key(token, weight, task['task_id'])})
+
+    # One pending invitation per project, to a project the user isn't in
+    invite_items = []
+    for project_index in range(projects):
+        project_id = f'{prefix}-invite-{project_index:04d}'
+        inviter_id = user_ids[-1]
+        project = {
+            'user_id': inviter_id,
+            'project_id': project_id,
+            'name': f'Invited project {project_index}',
+            'description': 'Synthetic invitation'
+        }
+        project_items.append(project)
+        invite_items.append({
+            'project_id': project_id, 'user_id': inviter_id, 'status': 'OWNER', 'joined_at': now.isoformat()
+        })
+        invite_items.append({
+            'project_id': project_id, 'user_id': user_id, 'status': 'PENDING',
+            'invited_by': inviter_id, 'invited_at': now.isoformat(),
+            'project_name': project['name'], 'project_description': project['description'],
+            'inviter_username': f'{prefix}-name-{len(user_ids) - 1:05d}'
+        })
+
+    fake.dynamodb.put_items('Projects', project_items)
+    fake.dynamodb.put_items('ProjectMembers', member_items + invite_items)
+    fake.dynamodb.put_items('Tasks', task_items)
+    fake.dynamodb.put_items(STATS_TABLE, stat_items)
+    fake.dynamodb.put_items(SEARCH_TABLE, posting_items)
+    fake.dynamodb.put_items(ACTIVITY_TABLE, event_items + day_index_items(event_items))
+
+    dataset = Dataset(name, user_id, f'{prefix}-name-00000', project_ids, task_ids, project_members)
+    if project_ids:
+        archived = []
+        for task_index in range(tasks):
+            updated_at = now - timedelta(days=ARCHIVE_AFTER_DAYS, minutes=rng.randrange(60 * 24 * 365))
+            archived.append({
+                'task_id': f'{dataset.main_project}-archived-{task_index:05d}',
+                'project_id': dataset.main_project,
+                'user_id': rng.choice(project_members[dataset.main_project]),
+                'name': f'Archived task {task_index}',
+                'description': f'Synthetic archived task {task_index}',
+                'status': STATUSES[-1],
+                'created_at': (updated_at - timedelta(days=rng.randrange(1, 30))).isoformat(),
+                'updated_at': updated_at.isoformat()
+            })
+        for segment in segment_tasks(archived):
+            archive_store.commit_segment(
+                dataset.main_project, archive_store.begin_segment(dataset.main_project, segment), segment
+            )
+    return dataset
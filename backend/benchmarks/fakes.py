@@ -0,0 +1,895 @@
+"""In-memory DynamoDB, Cognito and S3 stand-ins for offline benchmarks.
+
+The fakes sit behind real boto3 clients: a `before-send` hook answers each
+signed HTTP request from memory instead of sending it. Parameter
+validation, serialization, the botocore event hooks in functions/metrics.py
+and the resource layer therefore all run exactly as they do against AWS.
+
+Table and GSI key schemas are read from terraform/ddb.tf. The expression
+support covers what the backend uses: key conditions, filters and
+conditions (comparisons, IN, BETWEEN, AND/OR/NOT, attribute_exists,
+attribute_not_exists, begins_with, contains), SET/ADD/REMOVE updates and
+projections of top-level attributes. Consumed capacity is estimated from
+item sizes (4 KB read units, 1 KB write units). S3 covers the object
+calls of the task archive: put, get, delete, list and batch delete.
+"""
+import io
+import os
+import re
+import json
+import math
+import time
+import random
+import threading
+from decimal import Decimal
+from urllib.parse import parse_qs, unquote, urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+import boto3
+from botocore.awsrequest import AWSResponse
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+DDB_TF = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'terraform', 'ddb.tf')
+
+# DynamoDB returns at most 1 MB of items per query page
+PAGE_BYTES = 1024 * 1024
+
+_serializer = TypeSerializer()
+_deserializer = TypeDeserializer()
+_MISSING = object()
+
+
+class FakeError(Exception):
+    def __init__(self, code, message, status=400, **fields):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+        self.fields = fields
+
+
+def serialize(item):
+    return {name: _serializer.serialize(value) for name, value in item.items()}
+
+
+def deserialize(item):
+    return {name: _deserializer.deserialize(value) for name, value in item.items()}
+
+
+def item_size(item):
+    return len(json.dumps(serialize(item), default=str))
+
+
+# ------------------------------- Schema ----------------------------------
+
+def _blocks(text, keyword):
+    """Yield the bodies of `keyword ... { ... }` blocks (brace matched)"""
+    for match in re.finditer(keyword, text):
+        start = text.index('{', match.end())
+        depth, index = 0, start
+        while True:
+            if text[index] == '{':
+                depth += 1
+            elif text[index] == '}':
+                depth -= 1
+                if depth == 0:
+                    break
+            index += 1
+        yield text[start + 1:index]
+
+
+def _setting(block, name):
+    match = re.search(rf'^\s*{name}\s*=\s*"([^"]+)"', block, re.M)
+    return match.group(1) if match else None
+
+
+def load_schema(path=DDB_TF):
+    """{table: {'hash', 'range', 'indexes': {name: (hash, range)}}} from terraform"""
+    with open(path) as f:
+        text = f.read()
+    schema = {}
+    for block in _blocks(text, r'resource\s+"aws_dynamodb_table"\s+"\w+"'):
+        indexes = {}
+        for index in _blocks(block, r'global_secondary_index\s*'):
+            indexes[_setting(index, 'name')] = (_setting(index, 'hash_key'), _setting(index, 'range_key'))
+        # Index blocks also have hash_key lines; strip them before reading the table's own
+        own = re.sub(r'global_secondary_index\s*\{[^}]*\}', '', block)
+        schema[_setting(own, 'name')] = {
+            'hash': _setting(own, 'hash_key'),
+            'range': _setting(own, 'range_key'),
+            'indexes': indexes
+        }
+    return schema
+
+
+# ----------------------------- Expressions --------------------------------
+
+_TOKEN = re.compile(r'\s*(#\w+|:\w+|<>|<=|>=|[=<>(),+\-]|[A-Za-z_][\w.]*)')
+
+
+def tokenize(expression):
+    tokens, position = [], 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if not match:
+            raise FakeError('ValidationException', f'Invalid expression: {expression}')
+        tokens.append(match.group(1))
+        position = match.end()
+    return tokens
+
+
+class Parser:
+    """Compiles condition expressions into predicates over deserialized items"""
+
+    def __init__(self, expression, names, values):
+        self.tokens = tokenize(expression)
+        self.position = 0
+        self.names = names or {}
+        self.values = {key: _deserializer.deserialize(value) for key, value in (values or {}).items()}
+        # Top-level `path = :value` terms, used to pick the key partition
+        self.equalities = {}
+
+    def peek(self):
+        return self.tokens[self.position] if self.position < len(self.tokens) else None
+
+    def take(self, expected=None):
+        token = self.peek()
+        if expected is not None and (token or '').upper() != expected:
+            raise FakeError('ValidationException', f'Expected {expected}, got {token}')
+        self.position += 1
+        return token
+
+    def name(self, token):
+        return self.names[token] if token.startswith('#') else token
+
+    def condition(self, top=True):
+        predicate = self.conjunction(top)
+        while (self.peek() or '').upper() == 'OR':
+            self.take()
+            left, right = predicate, self.conjunction(False)
+            predicate = lambda item, l=left, r=right: l(item) or r(item)
+        return predicate
+
+    def conjunction(self, top):
+        predicate = self.negation(top)
+        while (self.peek() or '').upper() == 'AND':
+            self.take()
+            left, right = predicate, self.negation(top)
+            predicate = lambda item, l=left, r=right: l(item) and r(item)
+        return predicate
+
+    def negation(self, top):
+        if (self.peek() or '').upper() == 'NOT':
+            self.take()
+            inner = self.negation(False)
+            return lambda item: not inner(item)
+        return self.primary(top)
+
+    def operand(self):
+        token = self.take()
+        if token.startswith(':'):
+            value = self.values[token]
+            return lambda item: value
+        if token == 'size':
+            self.take('(')
+            path = self.name(self.take())
+            self.take(')')
+            return lambda item: Decimal(len(item[path])) if path in item else _MISSING
+        path = self.name(token)
+        return lambda item: item.get(path, _MISSING)
+
+    def primary(self, top):
+        token = self.peek()
+        if token == '(':
+            self.take()
+            predicate = self.condition(False)
+            self.take(')')
+            return predicate
+        if token in ('attribute_exists', 'attribute_not_exists', 'begins_with', 'contains'):
+            self.take()
+            self.take('(')
+            path = self.name(self.take())
+            if token == 'attribute_exists':
+                self.take(')')
+                return lambda item: path in item
+            if token == 'attribute_not_exists':
+                self.take(')')
+                return lambda item: path not in item
+            self.take(',')
+            argument = self.operand()
+            self.take(')')
+            if token == 'begins_with':
+                return lambda item: isinstance(item.get(path), str) and item[path].startswith(argument(item))
+            return lambda item: path in item and argument(item) in item[path]
+
+        left_token = self.peek()
+        left = self.operand()
+        operator = self.take()
+        if operator.upper() == 'BETWEEN':
+            low = self.operand()
+            self.take('AND')
+            high = self.operand()
+            return lambda item: _compare(left(item), '>=', low(item)) and _compare(left(item), '<=', high(item))
+        if operator.upper() == 'IN':
+            self.take('(')
+            options = [self.operand()]
+            while self.peek() == ',':
+                self.take()
+                options.append(self.operand())
+            self.take(')')
+            return lambda item: any(_compare(left(item), '=', option(item)) for option in options)
+        right_token = self.peek()
+        right = self.operand()
+        if top and operator == '=' and right_token.startswith(':'):
+            self.equalities[self.name(left_token)] = self.values[right_token]
+        return lambda item: _compare(left(item), operator, right(item))
+
+
+def _compare(left, operator, right):
+    if left is _MISSING or right is _MISSING:
+        return operator == '<>'
+    try:
+        if operator == '=':
+            return left == right
+        if operator == '<>':
+            return left != right
+        if operator == '<':
+            return left < right
+        if operator == '<=':
+            return left <= right
+        if operator == '>':
+            return left > right
+        if operator == '>=':
+            return left >= right
+    except TypeError:
+        return False
+    raise FakeError('ValidationException', f'Unknown operator {operator}')
+
+
+def compile_condition(expression, names, values):
+    parser = Parser(expression, names, values)
+    predicate = parser.condition()
+    if parser.peek() is not None:
+        raise FakeError('ValidationException', f'Unexpected token {parser.peek()} in {expression}')
+    return predicate, parser.equalities
+
+
+def apply_update(item, expression, names, values):
+    """Apply a SET/ADD/REMOVE UpdateExpression to a copy of item"""
+    parser = Parser(expression, names, values)
+    item = dict(item)
+    clause = None
+    while parser.peek() is not None:
+        if parser.peek().upper() in ('SET', 'ADD', 'REMOVE', 'DELETE'):
+            clause = parser.take().upper()
+            continue
+        if parser.peek() == ',':
+            parser.take()
+            continue
+        path = parser.name(parser.take())
+        if clause == 'SET':
+            parser.take('=')
+            value = _set_value(parser, item)
+            # a + b / a - b
+            if parser.peek() in ('+', '-'):
+                operator = parser.take()
+                other = _set_value(parser, item)
+                value = value + other if operator == '+' else value - other
+            item[path] = value
+        elif clause == 'ADD':
+            value = parser.operand()(item)
+            current = item.get(path)
+            if isinstance(value, set):
+                item[path] = (current or set()) | value
+            else:
+                item[path] = (current or Decimal(0)) + value
+        elif clause == 'DELETE':
+            value = parser.operand()(item)
+            item[path] = (item.get(path) or set()) - value
+            if not item[path]:
+                del item[path]
+        elif clause == 'REMOVE':
+            item.pop(path, None)
+        else:
+            raise FakeError('ValidationException', f'Invalid update expression: {expression}')
+    return item
+
+
+def _set_value(parser, item):
+    if parser.peek() == 'if_not_exists':
+        parser.take()
+        parser.take('(')
+        path = parser.name(parser.take())
+        parser.take(',')
+        default = parser.operand()(item)
+        parser.take(')')
+        return item.get(path, default)
+    if parser.peek() == 'list_append':
+        parser.take()
+        parser.take('(')
+        first = parser.operand()(item)
+        parser.take(',')
+        second = parser.operand()(item)
+        parser.take(')')
+        return list(first if first is not _MISSING else []) + list(second if second is not _MISSING else [])
+    value = parser.operand()(item)
+    if value is _MISSING:
+        raise FakeError('ValidationException', 'The provided expression refers to an attribute that does not exist')
+    return value
+
+
+def project(item, expression, names):
+    if not expression:
+        return item
+    fields = [names.get(token, token) if token.startswith('#') else token
+              for token in tokenize(expression) if token != ',']
+    return {field: item[field] for field in fields if field in item}
+
+
+# ------------------------------- DynamoDB ---------------------------------
+
+class FakeTable:
+    def __init__(self, name, hash_key, range_key, indexes):
+        self.name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        self.indexes = indexes
+        self.items = {}
+        # Partitions: {index name or None: {hash value: {primary key: item}}}
+        self.partitions = {None: {}, **{index: {} for index in indexes}}
+
+    def key_of(self, item):
+        try:
+            return (item[self.hash_key], item[self.range_key] if self.range_key else None)
+        except KeyError:
+            raise FakeError('ValidationException', 'The provided key element does not match the schema')
+
+    def key_schema(self, index_name=None):
+        if index_name is None:
+            return self.hash_key, self.range_key
+        if index_name not in self.indexes:
+            raise FakeError('ValidationException', f'The table does not have the specified index: {index_name}')
+        return self.indexes[index_name]
+
+    def get(self, key):
+        return self.items.get(self.key_of(key))
+
+    def put(self, item):
+        key = self.key_of(item)
+        old = self.items.get(key)
+        if old is not None:
+            self._unindex(key, old)
+        self.items[key] = item
+        self._index(key, item)
+        return old
+
+    def delete(self, key):
+        key = self.key_of(key)
+        old = self.items.pop(key, None)
+        if old is not None:
+            self._unindex(key, old)
+        return old
+
+    def _index(self, key, item):
+        for index_name in self.partitions:
+            hash_key, range_key = self.key_schema(index_name)
+            if hash_key in item and (range_key is None or range_key in item):
+                self.partitions[index_name].setdefault(item[hash_key], {})[key] = item
+
+    def _unindex(self, key, item):
+        for index_name in self.partitions:
+            hash_key, _ = self.key_schema(index_name)
+            partition = self.partitions[index_name].get(item.get(hash_key))
+            if partition is not None:
+                partition.pop(key, None)
+
+    def sort_key(self, item, index_name):
+        _, range_key = self.key_schema(index_name)
+        primary = self.key_of(item)
+        return (str(item.get(range_key, '')) if range_key else '', str(primary[0]), str(primary[1] or ''))
+
+    def key_attributes(self, item, index_name):
+        names = {self.hash_key, self.range_key, *self.key_schema(index_name)} - {None}
+        return {name: item[name] for name in names if name in item}
+
+
+class FakeDynamoDB:
+    def __init__(self, schema):
+        self.tables = {
+            name: FakeTable(name, spec['hash'], spec['range'], spec['indexes'])
+            for name, spec in schema.items()
+        }
+        self.lock = threading.RLock()
+
+    def table(self, name):
+        if name not in self.tables:
+            raise FakeError('ResourceNotFoundException', f'Requested resource not found: {name}')
+        return self.tables[name]
+
+    # Seeding helper for datasets (plain Python values)
+    def put_items(self, table_name, items):
+        table = self.table(table_name)
+        with self.lock:
+            for item in items:
+                table.put(dict(item))
+
+    def dispatch(self, operation, params):
+        handler = getattr(self, f'op_{operation}', None)
+        if handler is None:
+            raise FakeError('UnknownOperationException', f'{operation} is not supported by the fake')
+        with self.lock:
+            return handler(params)
+
+    # -- capacity ----------------------------------------------------------
+
+    @staticmethod
+    def _capacity(params, table_name, units, index_name=None, read=True):
+        mode = params.get('ReturnConsumedCapacity', 'NONE')
+        if mode == 'NONE':
+            return None
+        consumed = {'TableName': table_name, 'CapacityUnits': units}
+        if read:
+            consumed['ReadCapacityUnits'] = units
+        else:
+            consumed['WriteCapacityUnits'] = units
+        if mode == 'INDEXES':
+            if index_name:
+                consumed['GlobalSecondaryIndexes'] = {index_name: {'CapacityUnits': units}}
+            else:
+                consumed['Table'] = {'CapacityUnits': units}
+        return consumed
+
+    @staticmethod
+    def _read_units(size, consistent=False):
+        return math.ceil(max(size, 1) / 4096) * (1.0 if consistent else 0.5)
+
+    @staticmethod
+    def _write_units(*items):
+        return max(math.ceil(max(item_size(item) if item else 0, 1) / 1024) for item in items)
+
+    def _check(self, params, current):
+        expression = params.get('ConditionExpression')
+        if not expression:
+            return True
+        predicate, _ = compile_condition(
+            expression, params.get('ExpressionAttributeNames'), params.get('ExpressionAttributeValues')
+        )
+        return predicate(current or {})
+
+    @staticmethod
+    def _returned(params, old, new):
+        mode = params.get('ReturnValues', 'NONE')
+        if mode == 'ALL_OLD' and old:
+            return {'Attributes': serialize(old)}
+        if mode == 'ALL_NEW' and new:
+            return {'Attributes': serialize(new)}
+        return {}
+
+    # -- single item operations -------------------------------------------
+
+    def op_GetItem(self, params):
+        table = self.table(params['TableName'])
+        item = table.get(deserialize(params['Key']))
+        response = {}
+        if item is not None:
+            item = project(item, params.get('ProjectionExpression'), params.get('ExpressionAttributeNames') or {})
+            response['Item'] = serialize(item)
+        capacity = self._capacity(params, table.name, self._read_units(item_size(item or {}), params.get('ConsistentRead')))
+        if capacity:
+            response['ConsumedCapacity'] = capacity
+        return response
+
+    def op_PutItem(self, params):
+        table = self.table(params['TableName'])
+        item = deserialize(params['Item'])
+        old = table.get(item)
+        if not self._check(params, old):
+            raise FakeError('ConditionalCheckFailedException', 'The conditional request failed')
+        table.put(item)
+        response = self._returned(params, old, item)
+        capacity = self._capacity(params, table.name, self._write_units(old, item), read=False)
+        if capacity:
+            response['ConsumedCapacity'] = capacity
+        return response
+
+    def op_UpdateItem(self, params):
+        table = self.table(params['TableName'])
+        key = deserialize(params['Key'])
+        old = table.get(key)
+        if not self._check(params, old):
+            raise FakeError('ConditionalCheckFailedException', 'The conditional request failed')
+        new = apply_update(
+            old or key, params['UpdateExpression'],
+            params.get('ExpressionAttributeNames'), params.get('ExpressionAttributeValues')
+        )
+        table.put(new)
+        response = self._returned(params, old, new)
+        capacity = self._capacity(params, table.name, self._write_units(old, new), read=False)
+        if capacity:
+            response['ConsumedCapacity'] = capacity
+        return response
+
+    def op_DeleteItem(self, params):
+        table = self.table(params['TableName'])
+        key = deserialize(params['Key'])
+        old = table.get(key)
+        if not self._check(params, old):
+            raise FakeError('ConditionalCheckFailedException', 'The conditional request failed')
+        table.delete(key)
+        response = self._returned(params, old, None)
+        capacity = self._capacity(params, table.name, self._write_units(old), read=False)
+        if capacity:
+            response['ConsumedCapacity'] = capacity
+        return response
+
+    # -- queries -------------------------------------------------------------
+
+    def op_Query(self, params):
+        table = self.table(params['TableName'])
+        index_name = params.get('IndexName')
+        hash_key, _ = table.key_schema(index_name)
+        names = params.get('ExpressionAttributeNames') or {}
+        values = params.get('ExpressionAttributeValues') or {}
+
+        key_condition, equalities = compile_condition(params['KeyConditionExpression'], names, values)
+        if hash_key not in equalities:
+            raise FakeError('ValidationException', 'Query condition missed key schema element')
+        filter_predicate = None
+        if params.get('FilterExpression'):
+            filter_predicate, _ = compile_condition(params['FilterExpression'], names, values)
+
+        candidates = sorted(
+            (item for item in table.partitions[index_name].get(equalities[hash_key], {}).values() if key_condition(item)),
+            key=lambda item: table.sort_key(item, index_name),
+            reverse=not params.get('ScanIndexForward', True)
+        )
+        if params.get('ExclusiveStartKey'):
+            start = table.sort_key(deserialize(params['ExclusiveStartKey']), index_name)
+            forward = params.get('ScanIndexForward', True)
+            candidates = [
+                item for item in candidates
+                if (table.sort_key(item, index_name) > start) == forward and table.sort_key(item, index_name) != start
+            ]
+
+        limit = params.get('Limit')
+        items, scanned, size, last = [], 0, 0, None
+        for position, item in enumerate(candidates):
+            scanned += 1
+            size += item_size(item)
+            if filter_predicate is None or filter_predicate(item):
+                items.append(project(item, params.get('ProjectionExpression'), names))
+            more = position + 1 < len(candidates)
+            if more and ((limit and scanned >= limit) or size >= PAGE_BYTES):
+                last = table.key_attributes(item, index_name)
+                break
+
+        response = {
+            'Items': [serialize(item) for item in items],
+            'Count': len(items),
+            'ScannedCount': scanned
+        }
+        if last:
+            response['LastEvaluatedKey'] = serialize(last)
+        capacity = self._capacity(params, table.name, self._read_units(size, params.get('ConsistentRead')), index_name)
+        if capacity:
+            response['ConsumedCapacity'] = capacity
+        return response
+
+    def op_Scan(self, params):
+        table = self.table(params['TableName'])
+        names = params.get('ExpressionAttributeNames') or {}
+        filter_predicate = None
+        if params.get('FilterExpression'):
+            filter_predicate, _ = compile_condition(
+                params['FilterExpression'], names, params.get('ExpressionAttributeValues')
+            )
+        items = [
+            project(item, params.get('ProjectionExpression'), names)
+            for item in table.items.values() if filter_predicate is None or filter_predicate(item)
+        ]
+        return {'Items': [serialize(item) for item in items], 'Count': len(items), 'ScannedCount': len(table.items)}
+
+    # -- batches and transactions ------------------------------------------
+
+    def op_BatchGetItem(self, params):
+        request_items = params['RequestItems']
+        if sum(len(request['Keys']) for request in request_items.values()) > 100:
+            raise FakeError('ValidationException', 'Too many items requested for the BatchGetItem call')
+        responses, capacity = {}, []
+        for table_name, request in request_items.items():
+            table = self.table(table_name)
+            found, size = [], 0
+            for key in request['Keys']:
+                item = table.get(deserialize(key))
+                if item is not None:
+                    size += item_size(item)
+                    found.append(serialize(project(
+                        item, request.get('ProjectionExpression'), request.get('ExpressionAttributeNames') or {}
+                    )))
+            responses[table_name] = found
+            consumed = self._capacity(params, table_name, self._read_units(size, request.get('ConsistentRead')))
+            if consumed:
+                capacity.append(consumed)
+        response = {'Responses': responses, 'UnprocessedKeys': {}}
+        if capacity:
+            response['ConsumedCapacity'] = capacity
+        return response
+
+    def op_BatchWriteItem(self, params):
+        request_items = params['RequestItems']
+        if sum(len(requests) for requests in request_items.values()) > 25:
+            raise FakeError('ValidationException', 'Too many items requested for the BatchWriteItem call')
+        capacity = []
+        for table_name, requests in request_items.items():
+            table = self.table(table_name)
+            units = 0
+            for request in requests:
+                if 'PutRequest' in request:
+                    item = deserialize(request['PutRequest']['Item'])
+                    units += self._write_units(table.put(item), item)
+                else:
+                    units += self._write_units(table.delete(deserialize(request['DeleteRequest']['Key'])))
+            consumed = self._capacity(params, table_name, units, read=False)
+            if consumed:
+                capacity.append(consumed)
+        response = {'UnprocessedItems': {}}
+        if capacity:
+            response['ConsumedCapacity'] = capacity
+        return response
+
+    def op_TransactWriteItems(self, params):
+        actions = params['TransactItems']
+        if len(actions) > 100:
+            raise FakeError('ValidationException', 'Member must have length less than or equal to 100')
+
+        reasons, failed = [], False
+        for action in actions:
+            (kind, spec), = action.items()
+            table = self.table(spec['TableName'])
+            key = deserialize(spec['Item']) if kind == 'Put' else deserialize(spec['Key'])
+            if self._check(spec, table.get(key)):
+                reasons.append({'Code': 'None'})
+            else:
+                failed = True
+                reasons.append({'Code': 'ConditionalCheckFailed', 'Message': 'The conditional request failed'})
+        if failed:
+            raise FakeError(
+                'TransactionCanceledException',
+                'Transaction cancelled, please refer cancellation reasons for specific reasons '
+                f"[{', '.join(reason['Code'] for reason in reasons)}]",
+                CancellationReasons=reasons
+            )
+
+        units = {}
+        for action in actions:
+            (kind, spec), = action.items()
+            table = self.table(spec['TableName'])
+            if kind == 'Put':
+                item = deserialize(spec['Item'])
+                old = table.put(item)
+                new = item
+            elif kind == 'Update':
+                key = deserialize(spec['Key'])
+                old = table.get(key)
+                new = apply_update(
+                    old or key, spec['UpdateExpression'],
+                    spec.get('ExpressionAttributeNames'), spec.get('ExpressionAttributeValues')
+                )
+                table.put(new)
+            elif kind == 'Delete':
+                old, new = table.delete(deserialize(spec['Key'])), None
+            else:
+                old, new = table.get(deserialize(spec['Key'])), None
+            # Transactional writes cost twice the standard units
+            units[table.name] = units.get(table.name, 0) + 2 * self._write_units(old, new)
+
+        capacity = [
+            consumed for consumed in (
+                self._capacity(params, table_name, table_units, read=False)
+                for table_name, table_units in units.items()
+            ) if consumed
+        ]
+        return {'ConsumedCapacity': capacity} if capacity else {}
+
+
+# -------------------------------- Cognito ---------------------------------
+
+class FakeCognito:
+    def __init__(self):
+        self.users = []
+        self.lock = threading.Lock()
+
+    def add_user(self, sub, username):
+        with self.lock:
+            self.users.append({
+                'Username': username,
+                'Attributes': [{'Name': 'sub', 'Value': sub}],
+                'Enabled': True,
+                'UserStatus': 'CONFIRMED'
+            })
+
+    def dispatch(self, operation, params):
+        if operation != 'ListUsers':
+            raise FakeError('InvalidParameterException', f'{operation} is not supported by the fake')
+        users = self.users
+        if params.get('Filter'):
+            match = re.match(r'\s*(\w+)\s*(\^?=)\s*"(.*)"\s*$', params['Filter'])
+            if not match:
+                raise FakeError('InvalidParameterException', 'Invalid filter')
+            attribute, operator, value = match.groups()
+
+            def attribute_value(user):
+                if attribute == 'username':
+                    return user['Username']
+                return next((attr['Value'] for attr in user['Attributes'] if attr['Name'] == attribute), None)
+
+            if operator == '^=':
+                users = [user for user in users if (attribute_value(user) or '').startswith(value)]
+            else:
+                users = [user for user in users if attribute_value(user) == value]
+        return {'Users': users[:params.get('Limit', 60)]}
+
+
+class FakeS3:
+    """Buckets of objects; buckets exist as soon as something is put in them"""
+
+    NAMESPACE = 'http://s3.amazonaws.com/doc/2006-03-01/'
+    LIST_LIMIT = 1000
+
+    def __init__(self):
+        self.objects = {}   # {(bucket, key): bytes}
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def _payload(request):
+        body = request.body or b''
+        if hasattr(body, 'read'):
+            body = body.read()
+        if isinstance(body, str):
+            body = body.encode()
+        if (request.headers.get('Content-Encoding') or b'') in ('aws-chunked', b'aws-chunked'):
+            # <hex size>[;extensions]\r\n<data>\r\n ... 0\r\n<trailers>
+            data, position = b'', 0
+            while True:
+                end = body.index(b'\r\n', position)
+                size = int(body[position:end].split(b';')[0], 16)
+                if not size:
+                    break
+                data += body[end + 2:end + 2 + size]
+                position = end + 2 + size + 2
+            body = data
+        return body
+
+    def _xml(self, root, children):
+        return f'<?xml version="1.0" encoding="UTF-8"?><{root} xmlns="{self.NAMESPACE}">{children}</{root}>'.encode()
+
+    def _error(self, status, code, message):
+        return status, f'<?xml version="1.0" encoding="UTF-8"?><Error><Code>{code}</Code><Message>{message}</Message></Error>'.encode()
+
+    @staticmethod
+    def handles(url):
+        host = urlsplit(url).hostname or ''
+        return host.startswith('s3.') or '.s3.' in host
+
+    def dispatch(self, request):
+        """(status, body bytes) for a path- or virtual-hosted-style REST request"""
+        url = urlsplit(request.url)
+        if url.hostname.startswith('s3.'):
+            bucket, _, key = url.path.lstrip('/').partition('/')
+        else:
+            bucket, key = url.hostname.split('.s3.')[0], url.path.lstrip('/')
+        key = unquote(key)
+        query = parse_qs(url.query, keep_blank_values=True)
+        with self.lock:
+            if request.method == 'PUT' and key:
+                self.objects[(bucket, key)] = self._payload(request)
+                return 200, b''
+            if request.method == 'GET' and key:
+                if (bucket, key) not in self.objects:
+                    return self._error(404, 'NoSuchKey', 'The specified key does not exist.')
+                return 200, self.objects[(bucket, key)]
+            if request.method == 'DELETE' and key:
+                self.objects.pop((bucket, key), None)
+                return 204, b''
+            if request.method == 'GET' and query.get('list-type') == ['2']:
+                return 200, self._list(bucket, query)
+            if request.method == 'POST' and 'delete' in query:
+                document = ElementTree.fromstring(self._payload(request))
+                for element in document.iter():
+                    if element.tag.split('}')[-1] == 'Key':
+                        self.objects.pop((bucket, element.text), None)
+                return 200, self._xml('DeleteResult', '')
+        return self._error(400, 'NotImplemented', f'{request.method} {request.url} is not supported by the fake')
+
+    def _list(self, bucket, query):
+        prefix = query.get('prefix', [''])[0]
+        after = query.get('continuation-token', [''])[0]
+        limit = min(int(query.get('max-keys', [self.LIST_LIMIT])[0]), self.LIST_LIMIT)
+        keys = sorted(key for name, key in self.objects if name == bucket and key.startswith(prefix) and key > after)
+        page, truncated = keys[:limit], len(keys) > limit
+        contents = ''.join(
+            f'<Contents><Key>{escape(key)}</Key><Size>{len(self.objects[(bucket, key)])}</Size></Contents>'
+            for key in page
+        )
+        token = f'<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>' if truncated else ''
+        return self._xml('ListBucketResult', (
+            f'<Name>{escape(bucket)}</Name><Prefix>{escape(prefix)}</Prefix><KeyCount>{len(page)}</KeyCount>'
+            f'<MaxKeys>{limit}</MaxKeys><IsTruncated>{str(truncated).lower()}</IsTruncated>{contents}{token}'
+        ))
+
+
+# ------------------------------- Transport --------------------------------
+
+class _Body(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.data = data
+
+    def stream(self, **kwargs):
+        yield self.data
+
+
+class FakeAWS:
+    """Routes signed boto3 requests to the in-memory services.
+
+    latency_ms (+ up to jitter_ms) is slept outside the data lock, so
+    concurrent fan-out requests overlap the way they do against AWS.
+    """
+
+    TARGETS = {
+        'DynamoDB_20120810': 'dynamodb',
+        'AWSCognitoIdentityProviderService': 'cognito'
+    }
+
+    def __init__(self, schema=None, latency_ms=0.0, jitter_ms=0.0, seed=None):
+        self.dynamodb = FakeDynamoDB(schema or load_schema())
+        self.cognito = FakeCognito()
+        self.s3 = FakeS3()
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._random = random.Random(seed)
+
+    def session(self, region_name='us-east-1'):
+        """A boto3 session whose clients are answered by this fake"""
+        session = boto3.session.Session(
+            aws_access_key_id='benchmark',
+            aws_secret_access_key='benchmark',
+            region_name=region_name
+        )
+        session.events.register('before-send', self._send)
+        return session
+
+    def _send(self, request, **kwargs):
+        target = request.headers.get('X-Amz-Target')
+        if isinstance(target, bytes):
+            target = target.decode()
+        prefix, _, operation = (target or '').partition('.')
+        service = self.TARGETS.get(prefix)
+        is_s3 = service is None and self.s3.handles(request.url)
+        if service is None and not is_s3:
+            raise RuntimeError(f'No fake for request {request.method} {request.url}')
+
+        delay = self.latency_ms + (self._random.random() * self.jitter_ms if self.jitter_ms else 0)
+        if delay:
+            time.sleep(delay / 1000)
+
+        if is_s3:
+            status, payload = self.s3.dispatch(request)
+            return AWSResponse(
+                request.url, status, {'Content-Type': 'application/xml', 'Content-Length': str(len(payload))},
+                _Body(payload)
+            )
+
+        params = json.loads(request.body or b'{}')
+        try:
+            status, payload = 200, getattr(self, service).dispatch(operation, params)
+        except FakeError as e:
+            status = e.status
+            payload = {'__type': f'com.amazonaws.{service}#{e.code}', 'message': e.message, **e.fields}
+
+        return AWSResponse(
+            request.url, status,
+            {'Content-Type': 'application/x-amz-json-1.0', 'x-amzn-RequestId': 'fake'},
+            _Body(json.dumps(payload, default=str).encode())
+        )
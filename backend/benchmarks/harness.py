@@ -0,0 +1,331 @@
+"""Offline end-to-end benchmark of app.lambda_handler.
+
+Every route runs against in-memory DynamoDB, Cognito and S3 (see fakes.py)
+with injected per-call latency, on synthetic datasets (see datasets.py).
+For each scenario and route it reports latency percentiles, the remote
+calls per request (X-Remote-Calls) and the estimated capacity units taken
+from the request's metrics record. A route whose call count grows with the
+dataset is an N+1 regression; --max-calls turns that into a failure.
+
+    python benchmarks/harness.py --scenario small --scenario large
+    python benchmarks/harness.py --projects 20 --members 5 --tasks 500 --latency-ms 8
+    python benchmarks/harness.py --scenario large --max-calls "GET /projects=4"
+    python benchmarks/harness.py --storage sqlite --scenario large
+
+With --storage sqlite the same routes run against the embedded SQLite
+engine (a fresh database file per scenario) instead of the fakes.
+
+Before the scenarios, the contract checks of checks.py run on a dataset of
+their own; a broken contract fails the run (--no-checks skips them).
+"""
+import io
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import contextlib
+from time import perf_counter
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+os.environ.setdefault('COGNITO_USER_POOLID', 'us-east-1_benchmark')
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+# Outside Lambda cascades run inline instead of invoking the function
+os.environ.pop('AWS_LAMBDA_FUNCTION_NAME', None)
+# Archive segments go to the fake S3, like the deployed function's, unless
+# the caller picked a directory (throughput.py, whose server has no fakes)
+if 'ARCHIVE_PATH' not in os.environ:
+    os.environ['ARCHIVE_BUCKET'] = 'benchmark-archive'
+
+import app  # noqa: E402
+from functions import aws, storage  # noqa: E402
+from functions.storage_sqlite import SQLiteStorage  # noqa: E402
+from fakes import FakeAWS  # noqa: E402
+from checks import CHECK_DATASET, CHECKS, run_checks  # noqa: E402
+from datasets import SCENARIOS, STATUSES, generate  # noqa: E402
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def event(method, resource, user_id, query=None, body=None, headers=None):
+    request = {
+        'httpMethod': method,
+        'resource': resource,
+        'headers': headers or {},
+        'queryStringParameters': {'userId': user_id, **(query or {})}
+    }
+    if body is not None:
+        request['body'] = json.dumps({'userId': user_id, **body})
+    return request
+
+
+def route_events(dataset, state):
+    """(label, build) pairs in run order; build(iteration) returns an event or None"""
+    user_id = dataset.user_id
+    project_id = dataset.main_project
+    task_ids = dataset.task_ids[project_id]
+    members = dataset.members[project_id]
+
+    def created(response):
+        state['created'].append(json.loads(response['body'])['task']['task_id'])
+
+    def remember_etag(response):
+        state['etag'] = response['headers'].get('ETag')
+
+    def remember_cursor(response):
+        state['cursor'] = json.loads(response['body'])['cursor']
+
+    def remember_export(response):
+        state['export'] = response['body']
+
+    def import_export(i):
+        # The body is NDJSON, so userId goes in the query string
+        return {**event('POST', '/projects/import', user_id), 'body': state['export']} if state.get('export') else None
+
+    def changes(i):
+        # The first request only obtains a cursor
+        query = {'wait': '0', **({'cursor': state['cursor']} if state.get('cursor') else {})}
+        return event('GET', '/changes', user_id, query)
+
+    return [
+        ('GET /projects', lambda i: event('GET', '/projects', user_id), None),
+        ('GET /tasks?project_id', lambda i: event('GET', '/tasks', user_id, {'project_id': project_id}), remember_etag),
+        ('GET /tasks?project_id (304)', lambda i: event(
+            'GET', '/tasks', user_id, {'project_id': project_id}, headers={'If-None-Match': state['etag']}
+        ) if state.get('etag') else None, None),
+        ('GET /tasks?project_id&limit=50', lambda i: event(
+            'GET', '/tasks', user_id, {'project_id': project_id, 'limit': '50'}
+        ), None),
+        ('GET /tasks?project_id&status', lambda i: event(
+            'GET', '/tasks', user_id, {'project_id': project_id, 'status': STATUSES[0]}
+        ), None),
+        ('GET /tasks?all_projects', lambda i: event('GET', '/tasks', user_id, {'all_projects': 'true'}), None),
+        ('GET /tasks?all_projects&since', lambda i: event(
+            'GET', '/tasks', user_id, {'all_projects': 'true', 'since': state['since']}
+        ), None),
+        ('GET /tasks?assigned_to_me', lambda i: event('GET', '/tasks', user_id, {'assigned_to_me': 'true'}), None),
+        ('GET /tasks?created_by_me&limit=50', lambda i: event(
+            'GET', '/tasks', user_id, {'created_by_me': 'true', 'limit': '50'}
+        ), None),
+        ('GET /tasks/search?q', lambda i: event('GET', '/tasks/search', user_id, {'q': 'billing bug'}), None),
+        ('GET /tasks/search?q (prefix)', lambda i: event(
+            'GET', '/tasks/search', user_id, {'q': 'task pay', 'project_id': project_id}
+        ), None),
+        ('GET /tasks/archive?project_id', lambda i: event(
+            'GET', '/tasks/archive', user_id, {'project_id': project_id}
+        ), None),
+        ('GET /tasks/archive?project_id&limit=50', lambda i: event(
+            'GET', '/tasks/archive', user_id, {'project_id': project_id, 'limit': '50'}
+        ), None),
+        ('GET /activity?project_id', lambda i: event('GET', '/activity', user_id, {'project_id': project_id}), None),
+        ('GET /activity?project_id&limit=20', lambda i: event(
+            'GET', '/activity', user_id, {'project_id': project_id, 'limit': '20'}
+        ), None),
+        ('GET /projects/export', lambda i: event(
+            'GET', '/projects/export', user_id, {'project_id': project_id}
+        ), remember_export),
+        ('GET /invites', lambda i: event('GET', '/invites', user_id), None),
+        ('GET /changes?cursor (no change)', changes, remember_cursor),
+        ('GET /analytics', lambda i: event('GET', '/analytics', user_id), None),
+        ('GET /users', lambda i: event('GET', '/users', user_id, {'query': dataset.username[:-3]}), None),
+        ('POST /tasks', lambda i: event('POST', '/tasks', user_id, body={
+            'project_id': project_id,
+            'name': f'Benchmark task {i}',
+            'description': 'Created by the benchmark harness',
+            'assigned_to': members[i % len(members)]
+        }), created),
+        ('PUT /tasks', lambda i: event('PUT', '/tasks', user_id, {'task_id': task_ids[i % len(task_ids)]}, body={
+            'project_id': project_id,
+            'status': STATUSES[i % len(STATUSES)]
+        }) if task_ids else None, None),
+        ('POST /tasks/batch', lambda i: event('POST', '/tasks/batch', user_id, body={
+            'project_id': project_id,
+            'operations': [
+                {'op': 'update', 'task_id': task_id, 'changes': {'status': STATUSES[(i + n) % len(STATUSES)]}}
+                for n, task_id in enumerate(task_ids[i % len(task_ids):][:10])
+            ]
+        }) if task_ids else None, None),
+        ('PUT /projects', lambda i: event('PUT', '/projects', user_id, {'project_id': project_id}, body={
+            'name': f'Project renamed {i}',
+            'description': 'Updated by the benchmark harness'
+        }), None),
+        ('POST /invites', lambda i: event('POST', '/invites', user_id, body={
+            'project_id': project_id,
+            'invitee_id': f'benchmark-invitee-{i}'
+        }), None),
+        ('POST /projects/import', import_export, None),
+        ('DELETE /tasks', lambda i: event('DELETE', '/tasks', user_id, {
+            'task_id': state['created'].pop(),
+            'project_id': project_id
+        }) if state['created'] else None, None),
+        ('GET /changes?cursor (after writes)', changes, None)
+    ]
+
+
+def invoke(request):
+    """Run one request; returns (response, seconds, metrics record)"""
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        start = perf_counter()
+        response = app.lambda_handler(request, None)
+        elapsed = perf_counter() - start
+    record = {}
+    for line in output.getvalue().splitlines():
+        if line.startswith('{"_aws"'):
+            record = json.loads(line)
+    return response, elapsed, record
+
+
+class SQLiteTarget:
+    """Stands in for FakeAWS in generate(), loading the dataset into SQLite"""
+
+    def __init__(self, engine):
+        self.dynamodb = engine
+        self.cognito = self
+        self._engine = engine
+
+    def add_user(self, user_id, username):
+        self._engine.write_usernames({user_id: username})
+
+
+def load_dataset(name, projects, members, tasks, args):
+    """Point the app at fresh fakes (and SQLite database) holding a generated dataset"""
+    fake = FakeAWS(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, seed=0)
+    aws.use_session(fake.session())
+    if args.storage == 'sqlite':
+        engine = SQLiteStorage(os.path.join(tempfile.mkdtemp(prefix='harness-'), f'{name}.db'))
+        storage.use_storage(engine)
+        return generate(SQLiteTarget(engine), name, projects, members, tasks)
+    storage.use_storage(None)
+    return generate(fake, name, projects, members, tasks)
+
+
+def run_scenario(name, projects, members, tasks, args):
+    dataset = load_dataset(name, projects, members, tasks, args)
+    state = {'created': [], 'since': app_now_minus(minutes=60)}
+
+    results = []
+    for label, build, after in route_events(dataset, state):
+        if args.routes and not any(pattern in label for pattern in args.routes):
+            continue
+        samples = []
+        for iteration in range(args.iterations + 1):
+            request = build(iteration)
+            if request is None:
+                break
+            response, elapsed, record = invoke(request)
+            if after and response['statusCode'] == 200:
+                after(response)
+            samples.append({
+                'ms': elapsed * 1000,
+                'calls': int(response['headers'].get('X-Remote-Calls', 0)),
+                'rcu': record.get('ReadCapacityUnits', 0),
+                'wcu': record.get('WriteCapacityUnits', 0),
+                'error': response['statusCode'] >= 400
+            })
+        if not samples:
+            continue
+        # The first request also warms the user directory cache; report it
+        # separately and keep it out of the percentiles
+        first, measured = samples[0], samples[1:] or samples
+        latencies = [sample['ms'] for sample in measured]
+        results.append({
+            'scenario': name,
+            'route': label,
+            'requests': len(measured),
+            'p50_ms': statistics.median(latencies),
+            'p90_ms': percentile(latencies, 90),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': max(latencies),
+            'calls': statistics.median(sample['calls'] for sample in measured),
+            'first_calls': first['calls'],
+            'rcu': statistics.median(sample['rcu'] for sample in measured),
+            'wcu': statistics.median(sample['wcu'] for sample in measured),
+            'errors': sum(sample['error'] for sample in samples)
+        })
+    return results
+
+
+def app_now_minus(minutes):
+    from datetime import datetime, timedelta
+    return (datetime.now() - timedelta(minutes=minutes)).isoformat()
+
+
+def print_results(title, results):
+    print(f'\n{title}')
+    print(f"{'route':<40}{'n':>4}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}"
+          f"{'calls':>7}{'first':>7}{'RCU':>8}{'WCU':>7}{'errors':>8}")
+    for row in results:
+        print(f"{row['route']:<40}{row['requests']:>4}{row['p50_ms']:>9.1f}{row['p90_ms']:>9.1f}"
+              f"{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}{row['calls']:>7g}{row['first_calls']:>7}"
+              f"{row['rcu']:>8g}{row['wcu']:>7g}{row['errors']:>8}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='named dataset (repeatable); default: small and medium')
+    parser.add_argument('--projects', type=int, help='custom scenario: projects of the benchmark user')
+    parser.add_argument('--members', type=int, default=5, help='custom scenario: members per project')
+    parser.add_argument('--tasks', type=int, default=100, help='custom scenario: tasks per project')
+    parser.add_argument('--iterations', type=int, default=20, help='measured requests per route')
+    parser.add_argument('--latency-ms', type=float, default=5.0, help='injected latency per AWS call')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='extra random latency per AWS call')
+    parser.add_argument('--storage', choices=['dynamodb', 'sqlite'], default='dynamodb',
+                        help='storage engine to run against')
+    parser.add_argument('--routes', action='append', help='only run routes containing this text (repeatable)')
+    parser.add_argument('--max-calls', action='append', default=[], metavar='ROUTE=N',
+                        help='fail when the median remote calls of ROUTE exceed N')
+    parser.add_argument('--json', help='also write the results to this file')
+    parser.add_argument('--no-checks', action='store_true', help='skip the contract checks')
+    args = parser.parse_args(argv)
+
+    check_failures = []
+    if not args.no_checks:
+        check_failures = run_checks(load_dataset('checks', *CHECK_DATASET, args), event)
+        print(f'contract checks ({args.storage}): {len(CHECKS) - len(check_failures)} of {len(CHECKS)} passed')
+
+    scenarios = []
+    if args.projects:
+        scenarios.append(('custom', args.projects, args.members, args.tasks))
+    for name in args.scenario or ([] if args.projects else ['small', 'medium']):
+        scenarios.append((name, *SCENARIOS[name]))
+
+    all_results = []
+    for name, projects, members, tasks in scenarios:
+        results = run_scenario(name, projects, members, tasks, args)
+        print_results(
+            f'{name}: {projects} projects x {members} members x {tasks} tasks, ' + (
+                'sqlite' if args.storage == 'sqlite' else f'{args.latency_ms:g} ms (+{args.jitter_ms:g}) per call'
+            ), results
+        )
+        all_results.extend(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(all_results, f, indent=2)
+
+    failures = [row for row in all_results if row['errors']]
+    for row in failures:
+        print(f"FAIL: {row['scenario']} {row['route']} returned {row['errors']} error responses")
+    for name, message in check_failures:
+        failures.append({'check': name})
+        print(f'FAIL: {name}: {message}')
+    for limit in args.max_calls:
+        route, _, maximum = limit.rpartition('=')
+        for row in all_results:
+            if row['route'] == route and row['calls'] > float(maximum):
+                failures.append(row)
+                print(f"FAIL: {row['scenario']} {route} made {row['calls']:g} remote calls (max {maximum})")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Memory and payload size of a full GET /tasks response.
+
+Tasks are synthetic items shaped like the deserialized Tasks table (strings
+plus a Decimal), delivered in query pages of ~1 MB. For each task count the
+benchmark compares:
+  buffered  - every page collected into one list, then one dumps() call
+              (what the handlers did before bodies were streamed)
+  streamed  - StreamedList over the pages, encoded without compression
+  gzip      - StreamedList over the pages, gzip-compressed as it is encoded
+
+Peak memory is measured with tracemalloc and includes the items themselves.
+"lambda bytes" is the body Lambda returns (base64 for gzip, which counts
+against the 6 MB payload limit); "wire bytes" is what reaches the client.
+
+    python benchmarks/response_size.py --counts 1000 10000 50000
+"""
+import os
+import sys
+import base64
+import argparse
+import tracemalloc
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from functions.responses import StreamedList, dumps, encode_response  # noqa: E402
+
+# DynamoDB returns at most 1 MB per query page, roughly this many tasks
+PAGE_SIZE = 2500
+STATUSES = ['Backlog', 'In Progress', 'In Testing', 'Done']
+
+
+def task(index):
+    return {
+        'task_id': f'{index:08x}-7c1e-4b6a-9f0d-3e2a1b4c5d6e',
+        'project_id': '5f0c9a7e-2b1d-4c3e-8a6f-0d9e8c7b6a5f',
+        'user_id': f'user-{index % 17:04d}-0000-4000-8000-000000000000',
+        'assigned_to': f'user-{index % 13:04d}-0000-4000-8000-000000000000',
+        'name': f'Task {index}: update the release checklist',
+        'description': f'Follow-up item {index} from the weekly planning meeting, see notes.',
+        'status': STATUSES[index % len(STATUSES)],
+        'priority': Decimal(index % 5),
+        'created_at': f'2024-03-{index % 28 + 1:02d}T10:{index % 60:02d}:00.000000',
+        'updated_at': f'2024-04-{index % 28 + 1:02d}T16:{index % 60:02d}:00.000000',
+        'creator_username': f'user{index % 17}',
+        'assignee_username': f'user{index % 13}'
+    }
+
+
+def pages(count):
+    for start in range(0, count, PAGE_SIZE):
+        yield [task(index) for index in range(start, min(start + PAGE_SIZE, count))]
+
+
+def buffered(count):
+    items = [item for page in pages(count) for item in page]
+    return {'body': dumps(items)}
+
+
+def streamed(count, gzip_ok):
+    body = StreamedList(item for page in pages(count) for item in page)
+    return encode_response({'statusCode': 200, 'body': body, 'headers': {}}, gzip_ok)
+
+
+def measure(build):
+    tracemalloc.start()
+    response = build()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    body = response['body']
+    wire = len(base64.b64decode(body)) if response.get('isBase64Encoded') else len(body.encode('utf-8'))
+    return peak, len(body), wire
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--counts', type=int, nargs='+', default=[1000, 10000, 50000])
+    args = parser.parse_args(argv)
+
+    print(f"{'tasks':>7}  {'mode':<9}{'peak MB':>10}{'lambda bytes':>14}{'wire bytes':>12}")
+    for count in args.counts:
+        modes = {
+            'buffered': lambda: buffered(count),
+            'streamed': lambda: streamed(count, False),
+            'gzip': lambda: streamed(count, True)
+        }
+        for mode, build in modes.items():
+            peak, lambda_bytes, wire_bytes = measure(build)
+            print(f"{count:>7}  {mode:<9}{peak / 2 ** 20:>10.1f}{lambda_bytes:>14,}{wire_bytes:>12,}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
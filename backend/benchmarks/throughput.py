@@ -0,0 +1,119 @@
+"""Throughput and tail latency of the self-hosted server on this machine.
+
+Seeds a SQLite database with a synthetic dataset (see datasets.py), starts
+`server.py serve` on it with the given workers and threads, and drives it
+with the built-in load generator. Run it with --workers 1, 2, 4... to see
+how requests per second scale per core.
+
+    python benchmarks/throughput.py --scenario medium --workers 2 --threads 8 --clients 16
+    python benchmarks/throughput.py --mix read --duration 30 --processes 2
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+from urllib.parse import urlencode
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+# Archive segments of this run only; the server inherits the setting
+os.environ['ARCHIVE_PATH'] = tempfile.mkdtemp(prefix='throughput-archive-')
+
+from server import print_load, run_load  # noqa: E402
+from functions.storage_sqlite import SQLiteStorage  # noqa: E402
+from harness import SQLiteTarget  # noqa: E402
+from datasets import SCENARIOS, STATUSES, generate  # noqa: E402
+
+
+def request_mix(dataset, mix):
+    """(label, method, target, body) requests of the benchmark user"""
+    user_id = dataset.user_id
+    project_id = dataset.main_project
+
+    def target(path, **query):
+        return f"{path}?{urlencode({**query, 'userId': user_id})}"
+
+    requests = [
+        ('GET /projects', 'GET', target('/projects'), None),
+        ('GET /tasks?project_id', 'GET', target('/tasks', project_id=project_id), None),
+        ('GET /tasks?project_id&limit=50', 'GET', target('/tasks', project_id=project_id, limit='50'), None),
+        ('GET /tasks/search?q', 'GET', target('/tasks/search', q='billing bug'), None),
+        ('GET /tasks/archive?project_id&limit=50', 'GET', target('/tasks/archive', project_id=project_id, limit='50'),
+         None),
+        ('GET /invites', 'GET', target('/invites'), None),
+        ('GET /analytics', 'GET', target('/analytics'), None)
+    ]
+    if mix == 'mixed':
+        requests += [
+            (f'PUT /tasks ({status})', 'PUT', target('/tasks', task_id=task_id), {
+                'project_id': project_id, 'status': status
+            })
+            for task_id, status in zip(dataset.task_ids[project_id], STATUSES)
+        ]
+    return requests
+
+
+def wait_for_url(server, log_path, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f'Server exited with {server.returncode}, see {log_path}')
+        with open(log_path) as log:
+            line = log.readline()
+        if line.startswith('Serving on ') and line.endswith('\n'):
+            return line.split()[2]
+        time.sleep(0.05)
+    raise RuntimeError(f'Server did not start within {timeout}s, see {log_path}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS), default='medium', help='dataset to seed')
+    parser.add_argument('--mix', choices=['read', 'mixed'], default='mixed',
+                        help='read routes only, or with task updates')
+    parser.add_argument('--workers', type=int, default=1, help='server worker processes')
+    parser.add_argument('--threads', type=int, default=8, help='request threads per server worker')
+    parser.add_argument('--clients', type=int, default=8, help='connections per load generator process')
+    parser.add_argument('--processes', type=int, default=1, help='load generator processes')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds to run')
+    parser.add_argument('--json', help='also write the summary to this file')
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(prefix='throughput-'), f'{args.scenario}.db')
+    dataset = generate(SQLiteTarget(SQLiteStorage(path)), args.scenario, *SCENARIOS[args.scenario])
+
+    # The app logs every request to stdout, so the server writes to a file;
+    # its first line is "Serving on http://host:port (...)"
+    log_path = os.path.join(os.path.dirname(path), 'server.log')
+    with open(log_path, 'w') as log:
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(BACKEND_DIR, 'server.py'), 'serve', '--port', '0',
+             '--workers', str(args.workers), '--threads', str(args.threads),
+             '--storage', 'sqlite', '--sqlite-path', path],
+            stdout=log, stderr=subprocess.STDOUT
+        )
+    try:
+        url = wait_for_url(server, log_path)
+        summary = run_load(url, request_mix(dataset, args.mix), args.clients, args.processes, args.duration)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print_load(
+        f'{args.scenario}, {args.mix} mix: server {args.workers} workers x {args.threads} threads, '
+        f'load {args.processes} processes x {args.clients} clients, {args.duration:g}s',
+        summary
+    )
+    print(f"{summary['throughput'] / args.workers:.1f} req/s per server worker")
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+    return 1 if summary['errors'] or summary['starved_clients'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
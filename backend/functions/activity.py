@@ -0,0 +1,91 @@
+import os
+import time
+from uuid import uuid4
+from datetime import date, datetime, timedelta
+
+# Append-only log of project changes, partitioned by project and day
+ACTIVITY_TABLE = 'ActivityLog'
+
+# Events expire after this many days (DynamoDB TTL on expires_at), and
+# timelines read no further back
+ACTIVITY_RETENTION_DAYS = int(os.environ.get('ACTIVITY_RETENTION_DAYS', '90'))
+
+# Day buckets a timeline page reads concurrently per round
+ACTIVITY_SCAN_DAYS = 7
+
+# Event attributes that are storage details rather than part of an event
+STORAGE_ATTRIBUTES = ('bucket', 'expires_at')
+
+# Bucket of a project's day index: one item per day that has events, so a
+# timeline skips empty days instead of querying them
+DAY_INDEX = 'days'
+
+
+def bucket_key(project_id, day):
+    return f'{project_id}#{day}'
+
+
+def day_index_items(events):
+    """Day index entries for the days these events fall on"""
+    days = {(event['project_id'], event['at'][:10]): event['expires_at'] for event in events}
+    return [
+        {'bucket': bucket_key(project_id, DAY_INDEX), 'event_key': day, 'expires_at': expires_at}
+        for (project_id, day), expires_at in days.items()
+    ]
+
+
+def is_day_index(item):
+    return item['bucket'].endswith('#' + DAY_INDEX)
+
+
+def activity_event(project_id, actor, action, entity_type, entity_id,
+                   entity_name=None, old_status=None, new_status=None, at=None):
+    """One compact event; `at` (default: now) is also the sort order"""
+    at = at or datetime.now().isoformat()
+    event = {
+        'bucket': bucket_key(project_id, at[:10]),
+        'event_key': f'{at}#{uuid4().hex[:8]}',
+        'project_id': project_id,
+        'actor': actor,
+        'action': action,
+        'entity_type': entity_type,
+        'entity_id': entity_id,
+        'at': at,
+        'expires_at': int(time.time()) + ACTIVITY_RETENTION_DAYS * 86400
+    }
+    for key, value in (('entity_name', entity_name), ('old_status', old_status), ('new_status', new_status)):
+        if value is not None:
+            event[key] = value
+    return event
+
+
+def task_events(project_id, actor, transitions):
+    """Events for (old_task, new_task) pairs; either side may be None"""
+    events = []
+    for old_task, new_task in transitions:
+        task = new_task or old_task
+        action = 'created' if old_task is None else 'deleted' if new_task is None else 'updated'
+        events.append(activity_event(
+            project_id, actor, action, 'task', task['task_id'],
+            entity_name=task.get('name'),
+            old_status=(old_task or {}).get('status'),
+            new_status=(new_task or {}).get('status')
+        ))
+    return events
+
+
+def timeline_days(start_day=None):
+    """ISO days from start_day (default: today) back to the retention limit, newest first"""
+    today = date.today()
+    day = date.fromisoformat(start_day) if start_day else today
+    oldest = today - timedelta(days=ACTIVITY_RETENTION_DAYS)
+    days = []
+    while day >= oldest:
+        days.append(day.isoformat())
+        day -= timedelta(days=1)
+    return days
+
+
+def public_event(event):
+    """An event as returned by the API, without its storage attributes"""
+    return {key: value for key, value in event.items() if key not in STORAGE_ATTRIBUTES}
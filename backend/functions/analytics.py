@@ -0,0 +1,171 @@
+import os
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from functions.scatter import query_all_pages
+
+# Pre-aggregated task counters, one item per (project_id, stat_key)
+STATS_TABLE = 'ProjectStats'
+STATS_DAY_RETENTION_DAYS = int(os.environ.get('STATS_DAY_RETENTION_DAYS', '35'))
+
+# Bumped by every write that changes what a project's reads return; GET
+# handlers derive their ETags from it
+VERSION_KEY = 'version'
+
+# TransactWriteItems accepts at most 100 items
+TRANSACT_LIMIT = 100
+
+# stat_key layout:
+#   total                        tasks in the project
+#   status#<status>              tasks currently in a status
+#   assignee#<user_id>           tasks currently assigned to a user
+#   day#<date>#created           tasks created that day
+#   day#<date>#status#<status>   tasks that moved into a status that day
+#   version                      write counter of the project (not a task stat)
+
+
+def task_stat_deltas(old_task, new_task, day=None):
+    """Counter changes for one task write; either side may be None (create/delete)"""
+    day = day or datetime.now().date().isoformat()
+    deltas = Counter()
+    old_task = old_task or {}
+    new_task = new_task or {}
+
+    if not old_task and new_task:
+        deltas['total'] += 1
+        deltas[f'day#{day}#created'] += 1
+    elif old_task and not new_task:
+        deltas['total'] -= 1
+
+    old_status, new_status = old_task.get('status'), new_task.get('status')
+    if old_status != new_status:
+        if old_status:
+            deltas[f'status#{old_status}'] -= 1
+        if new_status:
+            deltas[f'status#{new_status}'] += 1
+            deltas[f'day#{day}#status#{new_status}'] += 1
+
+    old_assignee, new_assignee = old_task.get('assigned_to'), new_task.get('assigned_to')
+    if old_assignee != new_assignee:
+        if old_assignee:
+            deltas[f'assignee#{old_assignee}'] -= 1
+        if new_assignee:
+            deltas[f'assignee#{new_assignee}'] += 1
+
+    return deltas
+
+
+def transition_deltas(transitions):
+    """Counter changes of (old_task, new_task) pairs of one project, the
+    project version bump included
+    """
+    deltas = Counter({VERSION_KEY: 1})
+    for old_task, new_task in transitions:
+        deltas.update(task_stat_deltas(old_task, new_task))
+    return deltas
+
+
+def stat_updates(project_id, deltas):
+    """TransactWriteItems Update items that ADD the non-zero deltas"""
+    updates = []
+    day_expires = int(time.time()) + STATS_DAY_RETENTION_DAYS * 86400
+    for stat_key, delta in sorted(deltas.items()):
+        if not delta:
+            continue
+        update = {
+            'TableName': STATS_TABLE,
+            'Key': {'project_id': {'S': project_id}, 'stat_key': {'S': stat_key}},
+            'UpdateExpression': 'ADD #count :delta',
+            'ExpressionAttributeNames': {'#count': 'count'},
+            'ExpressionAttributeValues': {':delta': {'N': str(delta)}}
+        }
+        if stat_key.startswith('day#'):
+            # Daily counters only feed the trend charts, so let them expire
+            update['UpdateExpression'] += ' SET expires_at = :expires'
+            update['ExpressionAttributeValues'][':expires'] = {'N': str(day_expires)}
+        updates.append({'Update': update})
+    return updates
+
+
+def apply_stat_deltas(client, project_id, deltas):
+    """Apply counter deltas with atomic ADDs, all counters of a chunk in one transaction"""
+    updates = stat_updates(project_id, deltas)
+    for start in range(0, len(updates), TRANSACT_LIMIT):
+        client.transact_write_items(TransactItems=updates[start:start + TRANSACT_LIMIT])
+
+
+def first_trend_day(days):
+    """ISO date of the oldest day in a `days`-day trend"""
+    return (datetime.now().date() - timedelta(days=days - 1)).isoformat()
+
+
+def read_project_stats(client, project_id, days=7):
+    """Summarise one project's counters, with a trend for the last `days` days"""
+    first_day = first_trend_day(days)
+    # Everything from the first trend day onwards sorts after the older day
+    # counters: recent day#..., status#... and total
+    counters = list(query_all_pages(
+        client,
+        TableName=STATS_TABLE,
+        KeyConditionExpression='project_id = :project_id AND stat_key >= :first',
+        ExpressionAttributeValues={
+            ':project_id': {'S': project_id},
+            ':first': {'S': f'day#{first_day}'}
+        }
+    ))
+    counters.extend(query_all_pages(
+        client,
+        TableName=STATS_TABLE,
+        KeyConditionExpression='project_id = :project_id AND begins_with(stat_key, :prefix)',
+        ExpressionAttributeValues={
+            ':project_id': {'S': project_id},
+            ':prefix': {'S': 'assignee#'}
+        }
+    ))
+
+    return summarize_stats(project_id, counters, first_day, days)
+
+
+def summarize_stats(project_id, counters, first_day, days):
+    """Summary of one project's counter items ({'stat_key', 'count'}) from first_day on"""
+    summary = {
+        'project_id': project_id,
+        'total': 0,
+        'by_status': {},
+        'by_assignee': {},
+        'trend': {}
+    }
+    for counter in counters:
+        count = int(counter.get('count', 0))
+        parts = counter['stat_key'].split('#')
+        if parts[0] == 'total':
+            summary['total'] = count
+        elif parts[0] == 'status' and count:
+            summary['by_status'][parts[1]] = count
+        elif parts[0] == 'assignee' and count:
+            summary['by_assignee'][parts[1]] = count
+        elif parts[0] == 'day' and count:
+            day = summary['trend'].setdefault(parts[1], {'created': 0, 'by_status': {}})
+            if parts[2] == 'created':
+                day['created'] = count
+            else:
+                day['by_status'][parts[3]] = count
+
+    start = datetime.strptime(first_day, '%Y-%m-%d').date()
+    summary['trend'] = [
+        {'date': date, **summary['trend'].get(date, {'created': 0, 'by_status': {}})}
+        for date in ((start + timedelta(days=i)).isoformat() for i in range(days))
+    ]
+    return summary
+
+
+def rebuild_stat_counts(tasks):
+    """Absolute counters for a full task list (used to backfill or repair a project)"""
+    counts = Counter()
+    for task in tasks:
+        counts['total'] += 1
+        if task.get('status'):
+            counts[f"status#{task['status']}"] += 1
+        if task.get('assigned_to'):
+            counts[f"assignee#{task['assigned_to']}"] += 1
+    return counts
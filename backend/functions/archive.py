@@ -0,0 +1,196 @@
+import os
+import gzip
+import json
+import shutil
+import tempfile
+from uuid import uuid4
+from datetime import datetime, timedelta
+from botocore.exceptions import ClientError
+from functions.aws import LazyClient
+from functions.responses import ResponseEncoder
+
+# Done tasks not updated for this many days leave the live Tasks table for
+# archive segments
+ARCHIVE_AFTER_DAYS = int(os.environ.get('ARCHIVE_AFTER_DAYS', '90'))
+
+# S3 bucket of the segments (deployed); without one they are kept in the
+# ARCHIVE_PATH directory (self-hosted and local runs)
+ARCHIVE_BUCKET = os.environ.get('ARCHIVE_BUCKET')
+ARCHIVE_PATH = os.environ.get('ARCHIVE_PATH', os.path.join(tempfile.gettempdir(), 'task-archive'))
+
+# Tasks per segment: one gzip JSON document each
+ARCHIVE_SEGMENT_TASKS = int(os.environ.get('ARCHIVE_SEGMENT_TASKS', '500'))
+
+SEGMENT_SUFFIX = '.json.gz'
+
+# Suffix of a segment whose tasks are still being removed from the live table
+PENDING_SUFFIX = '.pending'
+
+_encoder = ResponseEncoder(separators=(',', ':'))
+
+
+def archive_cutoff(now=None):
+    """updated_at before which a Done task is archived"""
+    return ((now or datetime.now()) - timedelta(days=ARCHIVE_AFTER_DAYS)).isoformat()
+
+
+def segment_tasks(tasks):
+    """Chunks of ARCHIVE_SEGMENT_TASKS tasks, most recently updated first"""
+    tasks = sorted(tasks, key=lambda task: (task.get('updated_at') or '', task['task_id']), reverse=True)
+    return [tasks[start:start + ARCHIVE_SEGMENT_TASKS] for start in range(0, len(tasks), ARCHIVE_SEGMENT_TASKS)]
+
+
+class SegmentStore:
+    """Immutable archive segments, one directory per project.
+
+    Segment ids start with the archiving time, so listing them in reverse
+    order gives the newest archive run first. A segment is written as
+    pending, its tasks are removed from the live table, and only then is it
+    published under its final name with the tasks that were removed.
+
+    `shared` tells whether every invocation sees the same segments; a
+    container's own /tmp is neither shared nor durable.
+    """
+
+    def __init__(self, root, shared=True):
+        self.root = root
+        self.shared = shared
+
+    # ----- storage: one blob per key "<project_id>/<name>" -----
+
+    def _put(self, key, data):
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside and renamed, so readers never see a partial segment
+        temporary = f'{path}.{uuid4().hex[:8]}.tmp'
+        with open(temporary, 'wb') as stream:
+            stream.write(data)
+        os.replace(temporary, path)
+
+    def _get(self, key):
+        try:
+            with open(os.path.join(self.root, key), 'rb') as stream:
+                return stream.read()
+        except FileNotFoundError:
+            return None
+
+    def _remove(self, key):
+        try:
+            os.remove(os.path.join(self.root, key))
+        except FileNotFoundError:
+            pass
+
+    def _names(self, project_id):
+        directory = os.path.join(self.root, project_id)
+        return os.listdir(directory) if os.path.isdir(directory) else []
+
+    def delete_project(self, project_id):
+        shutil.rmtree(os.path.join(self.root, project_id), ignore_errors=True)
+
+    # ----- segments -----
+
+    def _key(self, project_id, segment_id):
+        return f'{project_id}/{segment_id}{SEGMENT_SUFFIX}'
+
+    def _write(self, key, tasks):
+        self._put(key, gzip.compress(_encoder.encode(tasks).encode('utf-8')))
+
+    def _read(self, key):
+        data = self._get(key)
+        return None if data is None else json.loads(gzip.decompress(data).decode('utf-8'))
+
+    def begin_segment(self, project_id, tasks):
+        """Write a pending segment; returns its id"""
+        segment_id = f"{datetime.now().strftime('%Y%m%dT%H%M%S%f')}-{uuid4().hex[:8]}"
+        self._write(self._key(project_id, segment_id) + PENDING_SUFFIX, tasks)
+        return segment_id
+
+    def commit_segment(self, project_id, segment_id, tasks):
+        """Publish a pending segment holding `tasks` (none: drop it)"""
+        key = self._key(project_id, segment_id)
+        if tasks:
+            self._write(key, tasks)
+        self._remove(key + PENDING_SUFFIX)
+
+    def pending_segments(self, project_id):
+        """[(segment_id, tasks)] of archive runs that did not finish"""
+        suffix = SEGMENT_SUFFIX + PENDING_SUFFIX
+        pending = []
+        for name in sorted(self._names(project_id)):
+            if name.endswith(suffix):
+                tasks = self._read(f'{project_id}/{name}')
+                if tasks is not None:
+                    pending.append((name[:-len(suffix)], tasks))
+        return pending
+
+    def segments(self, project_id):
+        """Published segment ids, newest first"""
+        return sorted(
+            (name[:-len(SEGMENT_SUFFIX)] for name in self._names(project_id) if name.endswith(SEGMENT_SUFFIX)),
+            reverse=True
+        )
+
+    def read_segment(self, project_id, segment_id):
+        """A segment's tasks, or None if it no longer exists"""
+        return self._read(self._key(project_id, segment_id))
+
+
+class S3SegmentStore(SegmentStore):
+    """Segments as objects "<project_id>/<segment_id>.json.gz" in an S3
+    bucket; a PUT replaces an object atomically, so nothing is written aside
+    """
+
+    # DeleteObjects accepts at most 1000 keys per call
+    DELETE_LIMIT = 1000
+
+    def __init__(self, bucket):
+        super().__init__(f's3://{bucket}')
+        self.bucket = bucket
+        self.client = LazyClient('s3')
+
+    def _put(self, key, data):
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType='application/gzip')
+
+    def _get(self, key):
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=key)['Body'].read()
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('NoSuchKey', '404'):
+                return None
+            raise
+
+    def _remove(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def _keys(self, project_id):
+        params = {'Bucket': self.bucket, 'Prefix': f'{project_id}/'}
+        while True:
+            response = self.client.list_objects_v2(**params)
+            for entry in response.get('Contents', []):
+                yield entry['Key']
+            if not response.get('IsTruncated'):
+                return
+            params['ContinuationToken'] = response['NextContinuationToken']
+
+    def _names(self, project_id):
+        return [key[len(project_id) + 1:] for key in self._keys(project_id)]
+
+    def delete_project(self, project_id):
+        keys = list(self._keys(project_id))
+        for start in range(0, len(keys), self.DELETE_LIMIT):
+            self.client.delete_objects(Bucket=self.bucket, Delete={
+                'Objects': [{'Key': key} for key in keys[start:start + self.DELETE_LIMIT]],
+                'Quiet': True
+            })
+
+
+def _default_store():
+    if ARCHIVE_BUCKET:
+        return S3SegmentStore(ARCHIVE_BUCKET)
+    # Inside Lambda a directory only counts as shared when it was configured
+    # explicitly (e.g. an EFS mount); the default is the container's /tmp
+    shared = 'ARCHIVE_PATH' in os.environ or not os.environ.get('AWS_LAMBDA_FUNCTION_NAME')
+    return SegmentStore(ARCHIVE_PATH, shared)
+
+
+archive_store = _default_store()
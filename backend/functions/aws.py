@@ -0,0 +1,81 @@
+import os
+import threading
+import boto3
+from botocore.config import Config
+from functions.metrics import instrument
+
+# HTTP connections each client keeps open for reuse. botocore's default of
+# 10 is plenty for one Lambda invocation; a self-hosted server with many
+# request threads raises it (see server.py)
+AWS_MAX_POOL_CONNECTIONS = int(os.environ.get('AWS_MAX_POOL_CONNECTIONS', '10'))
+
+# Process-wide AWS clients, built on first use so a cold start (or an OPTIONS
+# preflight) doesn't pay for loading service models it never needs
+_clients = {}
+_resource = None
+_session = None
+_lock = threading.Lock()
+
+
+def use_session(session):
+    """Build clients from this boto3 session from now on (benchmarks, local runs)"""
+    global _session, _resource
+    with _lock:
+        _session = session
+        _clients.clear()
+        _resource = None
+
+
+def _get_session():
+    return _session or boto3._get_default_session()
+
+
+def get_client(service_name):
+    """Shared low-level client for a service (thread-safe, instrumented)"""
+    client = _clients.get(service_name)
+    if client is None:
+        with _lock:
+            client = _clients.get(service_name)
+            if client is None:
+                client = instrument(_get_session().client(
+                    service_name, config=Config(max_pool_connections=AWS_MAX_POOL_CONNECTIONS)
+                ))
+                _clients[service_name] = client
+    return client
+
+
+def get_dynamodb_resource():
+    global _resource
+    if _resource is None:
+        with _lock:
+            if _resource is None:
+                resource = _get_session().resource(
+                    'dynamodb', config=Config(max_pool_connections=AWS_MAX_POOL_CONNECTIONS)
+                )
+                instrument(resource.meta.client)
+                _resource = resource
+    return _resource
+
+
+class LazyClient:
+    """Module-level stand-in for a client; the real one is created on first call"""
+
+    def __init__(self, service_name):
+        self.service_name = service_name
+
+    def __getattr__(self, attr):
+        return getattr(get_client(self.service_name), attr)
+
+
+class LazyTable:
+    """Module-level stand-in for a boto3 Table; `name` never builds the resource"""
+
+    def __init__(self, name):
+        self.name = name
+        self._table = None
+
+    def __getattr__(self, attr):
+        resource = get_dynamodb_resource()
+        if self._table is None or self._table.meta.client is not resource.meta.client:
+            self._table = resource.Table(self.name)
+        return getattr(self._table, attr)
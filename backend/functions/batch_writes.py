@@ -0,0 +1,85 @@
+import os
+import time
+import random
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from boto3.dynamodb.types import TypeSerializer
+
+# BatchWriteItem accepts at most 25 requests per call
+BATCH_WRITE_LIMIT = 25
+BATCH_WRITE_CONCURRENCY = int(os.environ.get('BATCH_WRITE_CONCURRENCY', '4'))
+BATCH_WRITE_MAX_ATTEMPTS = int(os.environ.get('BATCH_WRITE_MAX_ATTEMPTS', '8'))
+
+_serializer = TypeSerializer()
+
+# Separate from the read fan-out pool so a writer running inside a fan-out
+# task can never wait on its own pool
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class UnprocessedItemsError(Exception):
+    """Raised when DynamoDB keeps returning UnprocessedItems after every retry"""
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=BATCH_WRITE_CONCURRENCY,
+                thread_name_prefix='batch-write'
+            )
+        return _executor
+
+
+def serialize_item(item):
+    return {key: _serializer.serialize(value) for key, value in item.items()}
+
+
+def put_request(item):
+    return {'PutRequest': {'Item': serialize_item(item)}}
+
+
+def delete_request(key):
+    return {'DeleteRequest': {'Key': serialize_item(key)}}
+
+
+def batch_write(client, table_name, requests):
+    """Send write requests in chunks of 25, several chunks at a time.
+
+    UnprocessedItems are retried with jittered exponential backoff; if a chunk
+    still has leftovers after BATCH_WRITE_MAX_ATTEMPTS the error is raised.
+    Returns the number of requests written.
+    """
+    requests = list(requests)
+    chunks = [
+        requests[start:start + BATCH_WRITE_LIMIT]
+        for start in range(0, len(requests), BATCH_WRITE_LIMIT)
+    ]
+    if len(chunks) == 1:
+        _write_chunk(client, table_name, chunks[0])
+    elif chunks:
+        executor = _get_executor()
+        futures = [
+            executor.submit(contextvars.copy_context().run, _write_chunk, client, table_name, chunk)
+            for chunk in chunks
+        ]
+        for future in futures:
+            future.result()
+    return len(requests)
+
+
+def _write_chunk(client, table_name, chunk):
+    pending = {table_name: chunk}
+    for attempt in range(BATCH_WRITE_MAX_ATTEMPTS):
+        if attempt:
+            time.sleep(min(0.05 * 2 ** attempt, 2.0) * random.random())
+        response = client.batch_write_item(RequestItems=pending)
+        pending = response.get('UnprocessedItems') or None
+        if not pending:
+            return
+    raise UnprocessedItemsError(
+        f"{len(pending.get(table_name, []))} writes to {table_name} still unprocessed"
+    )
@@ -0,0 +1,53 @@
+import os
+import threading
+
+# GET /changes blocks at most this long (and never longer than the
+# client's wait=) before answering that nothing changed
+CHANGES_WAIT_SECONDS = int(os.environ.get('CHANGES_WAIT_SECONDS', '20'))
+
+# While blocked, stored versions are re-read this often to catch writes
+# made by other processes; writes made by this one wake it up at once
+CHANGES_POLL_SECONDS = float(os.environ.get('CHANGES_POLL_SECONDS', '2'))
+
+
+def user_scope(user_id):
+    """Version scope of a user's project and invite lists (shares the
+    'user#' prefix with the user tombstone scope)
+    """
+    return f'user#{user_id}'
+
+
+class Notifier:
+    """In-process wake-ups for /changes, keyed by version scope.
+
+    Writers publish() the scopes whose version they bumped; waiters take a
+    snapshot() of the scopes they watch before reading the stored versions
+    and wait() on it, so a publish between the read and the wait is not lost.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._generations = {}
+
+    def snapshot(self, scopes):
+        with self._condition:
+            return {scope: self._generations.get(scope, 0) for scope in scopes}
+
+    def publish(self, scopes):
+        with self._condition:
+            for scope in scopes:
+                self._generations[scope] = self._generations.get(scope, 0) + 1
+            self._condition.notify_all()
+
+    def wait(self, snapshot, timeout):
+        """Block until a scope of the snapshot is published or timeout passes;
+        returns whether one was published
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: any(self._generations.get(scope, 0) != seen for scope, seen in snapshot.items()),
+                timeout
+            )
+
+
+notifier = Notifier()
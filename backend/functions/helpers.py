@@ -1,10 +1,24 @@
+import os
 import json
-import boto3
+import time
 from uuid import uuid4
-from datetime import datetime
+from itertools import chain
+from collections import Counter
+from datetime import datetime, timedelta, timezone
 from botocore.exceptions import ClientError
-from boto3.dynamodb.conditions import Key
-import os  # Add this import
+from functions.activity import activity_event, public_event, task_events
+from functions.analytics import VERSION_KEY, rebuild_stat_counts, transition_deltas
+from functions.archive import archive_cutoff, archive_store, segment_tasks
+from functions.changes import CHANGES_POLL_SECONDS, CHANGES_WAIT_SECONDS, notifier, user_scope
+from functions.pagination import (
+    PaginationError, decode_cursor, encode_cursor, parse_fields, parse_limit
+)
+from functions.http import CORS_HEADERS
+from functions.responses import NDJSONStream, StreamedList, cache_headers, etag_matches, make_etag
+from functions.search import parse_query, posting_changes, rank, task_postings
+from functions.storage import PROJECT_DELETING, PROJECT_DELETING_ERROR, WriteRejected, storage
+from functions.transfer import ImportRejected, export_records, import_task_batches, validate_import
+from functions.user_directory import get_user_details, get_usernames, remember_users
 
 # Constants
 TASK_STATUSES = {
@@ -14,28 +28,79 @@ TASK_STATUSES = {
     'DONE': 'Done'
 }
 
-# CORS Headers
-CORS_HEADERS = {
-    'Access-Control-Allow-Headers': 'Content-Type',
-    'Access-Control-Allow-Origin': '*',
-    'Access-Control-Allow-Methods': '*'
-}
+# Task attributes a client update never overwrites
+TASK_READ_ONLY_FIELDS = ['task_id', 'project_id', 'user_id', 'userId', 'created_at', 'updated_at']
+
+# Project and inviter details stored on invite rows by invite_user
+INVITE_DETAILS = ('project_name', 'project_description', 'inviter_username')
+
+# Limit for POST /tasks/batch
+BATCH_MAX_OPERATIONS = 500
+
+# Default page size of GET /tasks/search
+SEARCH_PAGE_SIZE = 20
+
+ARCHIVE_NOT_SHARED = 'Archive store is not shared: set ARCHIVE_BUCKET, or ARCHIVE_PATH to a shared mount'
+
+# All reads and writes go through the storage engine selected by
+# STORAGE_BACKEND (DynamoDB or SQLite, see functions/storage.py)
+
+def read_project_versions(project_ids):
+    """{project_id: version}; a project that was never written is at version 0"""
+    handles = [storage.load_project_version(project_id) for project_id in project_ids]
+    return {project_id: handle.get() for project_id, handle in zip(project_ids, handles)}
+
+def bump_project_versions(project_ids):
+    """Invalidate the ETags of reads that include these projects and wake
+    /changes requests watching them
+    """
+    for project_id in project_ids:
+        storage.apply_stat_deltas(project_id, {VERSION_KEY: 1})
+    notifier.publish(project_ids)
 
-# DynamoDB setup
-dynamodb = boto3.resource('dynamodb')
-project_table = dynamodb.Table('Projects')
-task_table = dynamodb.Table('Tasks')
-project_members_table = dynamodb.Table('ProjectMembers')
+def bump_user_versions(user_ids):
+    """Signal that these users' project or invite lists changed"""
+    bump_project_versions([user_scope(user_id) for user_id in user_ids])
+
+def versioned_headers(etag, incomplete=()):
+    """Headers for a versioned read; partial results and unversioned reads carry no ETag"""
+    if incomplete or not etag:
+        return incomplete_headers(incomplete)
+    return {**CORS_HEADERS, **cache_headers(etag)}
+
+# Status code of each WriteRejected reason
+REJECTED_STATUS = {'forbidden': 403, 'not_found': 404, 'exists': 400, 'conflict': 409, 'deleting': 409}
+
+def rejected(error, messages):
+    """Response for a WriteRejected; messages maps its reason to the body text"""
+    return {
+        'statusCode': REJECTED_STATUS[error.reason],
+        'body': json.dumps(messages.get(error.reason, 'Concurrent update, please retry')),
+        'headers': CORS_HEADERS
+    }
+
+def not_modified(etag):
+    return {
+        'statusCode': 304,
+        'body': '',
+        'headers': versioned_headers(etag)
+    }
+
+# Delta sync: how long deletions are remembered, and how far synced_at is
+# moved back to cover index propagation delay
+TOMBSTONE_RETENTION_DAYS = int(os.environ.get('TOMBSTONE_RETENTION_DAYS', '30'))
+DELTA_OVERLAP_SECONDS = int(os.environ.get('DELTA_OVERLAP_SECONDS', '5'))
+
+# Cascade delete: a worker stops this long before its Lambda timeout to
+# re-queue itself
+CASCADE_TIME_MARGIN_MS = int(os.environ.get('CASCADE_TIME_MARGIN_MS', '10000'))
 
-# Cognito setup
-cognito = boto3.client('cognito-idp')
-USER_POOL_ID = os.environ.get('COGNITO_USER_POOLID')  # Update this line
 
 # ------------------------- Task CRUD Functions --------------------------
 
-def create_task(event, user_id):
+def create_task(request, user_id):
     try:
-        body = json.loads(event['body'])
+        body = request.body
         project_id = body['project_id']
         
         # Create task
@@ -61,12 +126,7 @@ def create_task(event, user_id):
         # Only add assigned_to if it has a value
         if assigned_to:
             # Verify user is member of project
-            member = project_members_table.get_item(
-                Key={
-                    'project_id': project_id,
-                    'user_id': assigned_to
-                }
-            ).get('Item')
+            member = storage.load_member(project_id, assigned_to).get()
             
             if not member or member['status'] not in ['OWNER', 'ACCEPTED']:
                 return {
@@ -80,13 +140,17 @@ def create_task(event, user_id):
             assignee_details = get_user_details(assigned_to)
             task_item['assignee_username'] = assignee_details['username']
         
-        task_table.put_item(Item=task_item)
+        # Conditional on the project not being deleted, so a cascade that
+        # already went through its tasks leaves no orphan behind
+        try:
+            storage.put_task(task_item)
+        except WriteRejected as e:
+            return rejected(e, {'deleting': PROJECT_DELETING_ERROR})
+        record_task_writes(project_id, user_id, [(None, task_item)])
         
         return {
             'statusCode': 200,
-            'body': json.dumps({
-                'task': task_item
-            }),
+            'body': {'task': task_item},
             'headers': CORS_HEADERS
         }
         
@@ -97,61 +161,63 @@ def create_task(event, user_id):
             'headers': CORS_HEADERS
         }
 
-def get_user_details(user_id):
-    """Helper function to get user details from Cognito"""
+def get_tasks(request, user_id):
     try:
-        # Query for user using sub (user_id)
-        response = cognito.list_users(
-            UserPoolId=USER_POOL_ID,
-            Filter=f'sub = "{user_id}"'
-        )
-        
-        if not response.get('Users'):
-            return {'user_id': user_id, 'username': user_id}
-            
-        user = response['Users'][0]  # Get the first (and should be only) user
-        username = user.get('Username')  # This is the actual username
-            
-        return {
-            'user_id': user_id,  # Keep the sub ID as user_id
-            'username': username  # Use the actual Cognito username
-        }
-    except ClientError:
-        return {'user_id': user_id, 'username': user_id}
+        query_params = request.query
+        project_id = query_params.get('project_id', None)
+        all_projects = query_params.get('all_projects', 'false')
 
-def get_tasks(event, user_id):
-    try:
-        project_id = event.get('queryStringParameters', {}).get('project_id', None)
-        all_projects = event.get('queryStringParameters', {}).get('all_projects', 'false')
+        # Optional status filter and field projection, pushed into the query
+        statuses = [status.strip() for status in query_params.get('status', '').split(',') if status.strip()]
+        fields = parse_fields(query_params.get('fields'))
+        paged = 'limit' in query_params or 'cursor' in query_params
+        since = query_params.get('since')
+
+        # Tasks assigned to or created by the caller, across their projects
+        roles = [
+            role for role, param in (('assigned', 'assigned_to_me'), ('created', 'created_by_me'))
+            if query_params.get(param, 'false').lower() == 'true'
+        ]
+        if roles:
+            if len(roles) > 1 or project_id or all_projects.lower() == 'true' or since:
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps('assigned_to_me and created_by_me combine only with status, fields, limit and cursor'),
+                    'headers': CORS_HEADERS
+                }
+            return get_user_tasks(query_params, user_id, roles[0], statuses, fields, paged)
 
         if all_projects.lower() == 'true':
+            if paged:
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps('limit and cursor require project_id'),
+                    'headers': CORS_HEADERS
+                }
+
             # Get all projects where user is a member (including ACCEPTED members)
-            member_projects = project_members_table.query(
-                IndexName='user-projects-index',
-                KeyConditionExpression=Key('user_id').eq(user_id),
-                FilterExpression='#status IN (:owner, :member)',
-                ExpressionAttributeNames={'#status': 'status'},
-                ExpressionAttributeValues={':owner': 'OWNER', ':member': 'ACCEPTED'}
-            )
+            member_projects = storage.member_projects(user_id)
 
-            all_tasks = []
-            for member in member_projects['Items']:
-                project_id = member['project_id']
-                # Get tasks for each project
-                project_tasks = task_table.query(
-                    IndexName='project-id-index',
-                    KeyConditionExpression=Key('project_id').eq(project_id)
+            if since:
+                return get_task_changes(
+                    [member['project_id'] for member in member_projects], since, user_id
                 )
-                all_tasks.extend(project_tasks.get('Items', []))
+
+            # Unchanged projects and membership: the client's copy is current
+            project_ids = [member['project_id'] for member in member_projects]
+            etag = make_etag('tasks', sorted(query_params.items()), read_project_versions(project_ids))
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+            # Every project's tasks, paged to completion
+            all_tasks, incomplete = storage.tasks_for_projects(project_ids, statuses, fields)
 
         elif project_id:
-            # Verify user is a member of the project (OWNER or ACCEPTED)
-            member = project_members_table.get_item(
-                Key={
-                    'project_id': project_id,
-                    'user_id': user_id
-                }
-            ).get('Item')
+            # Verify user is a member of the project (OWNER or ACCEPTED); the
+            # project version comes back in the same batch
+            member_handle = storage.load_member(project_id, user_id)
+            storage.load_project_version(project_id)
+            member = member_handle.get()
 
             if not member or member['status'] not in ['OWNER', 'ACCEPTED']:
                 return {
@@ -160,12 +226,38 @@ def get_tasks(event, user_id):
                     'headers': CORS_HEADERS
                 }
 
-            # Get ALL tasks for the project, regardless of who created them
-            response = task_table.query(
-                KeyConditionExpression=Key('project_id').eq(project_id),
-                IndexName='project-id-index'
-            )
-            all_tasks = response.get('Items', [])
+            if since:
+                return get_task_changes([project_id], since)
+
+            etag = make_etag('tasks', sorted(query_params.items()), read_project_versions([project_id]))
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+            if paged:
+                # One page per request; the cursor wraps the engine's start key
+                scope = f"{project_id}|{','.join(statuses)}"
+                tasks, last_key = storage.task_page(
+                    project_id, statuses, fields,
+                    parse_limit(query_params.get('limit')),
+                    decode_cursor(query_params.get('cursor'), scope)
+                )
+                enrich_tasks(tasks, fields)
+                return {
+                    'statusCode': 200,
+                    'body': {
+                        'items': tasks,
+                        'next_cursor': encode_cursor(last_key, scope)
+                    },
+                    'headers': versioned_headers(etag)
+                }
+
+            # Get ALL tasks for the project, regardless of who created them;
+            # pages are enriched and encoded as they are read
+            return {
+                'statusCode': 200,
+                'body': stream_project_tasks(project_id, statuses, fields),
+                'headers': versioned_headers(etag)
+            }
         else:
             return {
                 'statusCode': 400,
@@ -173,18 +265,17 @@ def get_tasks(event, user_id):
                 'headers': CORS_HEADERS
             }
 
-        # Enrich tasks with user details
-        for task in all_tasks:
-            if task.get('user_id'):  # Creator
-                creator_details = get_user_details(task['user_id'])
-                task['creator_username'] = creator_details['username']
-            if task.get('assigned_to'):  # Assignee
-                assignee_details = get_user_details(task['assigned_to'])
-                task['assignee_username'] = assignee_details['username']
+        enrich_tasks(all_tasks, fields)
 
         return {
             'statusCode': 200,
-            'body': json.dumps(all_tasks),
+            'body': StreamedList(all_tasks),
+            'headers': versioned_headers(etag, incomplete)
+        }
+    except PaginationError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps(str(e)),
             'headers': CORS_HEADERS
         }
     except ClientError as e:
@@ -194,10 +285,165 @@ def get_tasks(event, user_id):
             'headers': CORS_HEADERS
         }
 
-def update_task(event, user_id):
+def get_user_tasks(query_params, user_id, role, statuses, fields, paged):
+    """Tasks assigned to (role 'assigned') or created by (role 'created') the caller.
+
+    Reads the per-user task index, so the cost follows the number of the
+    caller's tasks rather than the size of their projects. A status filter
+    does not lower it: the index has no status key, so every task of the
+    caller is read and filtered. Tasks of projects the caller no longer
+    belongs to are left out.
+    """
+    member_projects = {member['project_id'] for member in storage.member_projects(user_id)}
+
+    if paged:
+        # One page per request; a page can come back short after the status
+        # or membership filter, so clients follow next_cursor until it is null
+        scope = f"{role}|{user_id}|{','.join(statuses)}"
+        tasks, last_key = storage.user_task_page(
+            user_id, role, statuses, fields,
+            parse_limit(query_params.get('limit')),
+            decode_cursor(query_params.get('cursor'), scope)
+        )
+        return {
+            'statusCode': 200,
+            'body': {
+                'items': enrich_tasks([task for task in tasks if task['project_id'] in member_projects], fields),
+                'next_cursor': encode_cursor(last_key, scope)
+            },
+            'headers': CORS_HEADERS
+        }
+
+    tasks = [
+        task for page in storage.user_task_pages(user_id, role, statuses, fields)
+        for task in page if task['project_id'] in member_projects
+    ]
+    return {
+        'statusCode': 200,
+        'body': StreamedList(enrich_tasks(tasks, fields)),
+        'headers': CORS_HEADERS
+    }
+
+def stream_project_tasks(project_id, statuses=None, fields=None):
+    """A project's tasks as a StreamedList, enriched one page at a time.
+
+    The first page is read here so query errors surface in the handler; the
+    remaining pages are read while the response body is encoded.
+    """
+    pages = storage.task_pages(project_id, statuses, fields)
+    first_page = next(pages)
+    return StreamedList(
+        task for page in chain([first_page], pages) for task in enrich_tasks(page, fields)
+    )
+
+def get_task_changes(project_ids, since, user_id=None):
+    """Delta sync: tasks updated after `since` plus tombstones for deletions.
+
+    The engine reads by updated_at and tombstone key, so the cost is
+    proportional to the number of changes rather than to project size.
+    """
+    try:
+        since_time = datetime.fromisoformat(since.replace('Z', '+00:00'))
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'body': json.dumps('since must be an ISO 8601 timestamp'),
+            'headers': CORS_HEADERS
+        }
+    if since_time.tzinfo:
+        # Stored timestamps are naive UTC (Lambda runs in UTC)
+        since_time = since_time.astimezone(timezone.utc).replace(tzinfo=None)
+
+    now = datetime.now()
+    if since_time < now - timedelta(days=TOMBSTONE_RETENTION_DAYS):
+        return {
+            'statusCode': 410,
+            'body': json.dumps('since is older than the deletion history; reload all tasks'),
+            'headers': CORS_HEADERS
+        }
+    since_key = since_time.isoformat()
+    synced_at = (now - timedelta(seconds=DELTA_OVERLAP_SECONDS)).isoformat()
+
+    tasks, deleted_tasks, deleted_projects, incomplete = read_task_changes(project_ids, since_key, user_id)
+    return {
+        'statusCode': 200,
+        'body': {
+            'tasks': StreamedList(tasks),
+            'deleted_tasks': deleted_tasks,
+            'deleted_projects': deleted_projects,
+            'synced_at': synced_at
+        },
+        'headers': incomplete_headers(incomplete)
+    }
+
+def read_task_changes(project_ids, since_key, user_id=None):
+    """(tasks, deleted_tasks, deleted_projects, incomplete) of changes after since_key"""
+    changes, incomplete = storage.task_changes(project_ids, since_key)
+    if user_id:
+        # Whole-project deletions are recorded against each former member
+        changes.extend(('deleted', item) for item in storage.tombstones(user_scope(user_id), since_key))
+
+    tasks = enrich_tasks([item for kind, item in changes if kind == 'task'])
+    deleted_tasks = []
+    deleted_projects = []
+    for kind, item in changes:
+        if kind != 'deleted':
+            continue
+        if item['entity_type'] == 'project':
+            deleted_projects.append({'project_id': item['project_id'], 'deleted_at': item['deleted_at']})
+        else:
+            deleted_tasks.append({
+                'task_id': item['entity_id'],
+                'project_id': item['project_id'],
+                'deleted_at': item['deleted_at']
+            })
+    return tasks, deleted_tasks, deleted_projects, incomplete
+
+def record_tombstones(scopes, entity_type, entity_ids, project_id):
+    """Remember deletions so delta sync clients can drop the entities"""
+    deleted_at = datetime.now().isoformat()
+    expires_at = int(time.time()) + TOMBSTONE_RETENTION_DAYS * 86400
+    storage.record_tombstones([
+        {
+            'scope': scope,
+            'tombstone_key': f'{deleted_at}#{entity_id}',
+            'entity_type': entity_type,
+            'entity_id': entity_id,
+            'project_id': project_id,
+            'deleted_at': deleted_at,
+            'expires_at': expires_at
+        }
+        for scope in scopes for entity_id in entity_ids
+    ])
+
+def enrich_tasks(tasks, fields=None):
+    """Add creator/assignee usernames with one deduplicated directory lookup"""
+    with_creator = not fields or 'creator_username' in fields
+    with_assignee = not fields or 'assignee_username' in fields
+    if not (with_creator or with_assignee):
+        return tasks
+
+    usernames = get_usernames(
+        [task.get('user_id') for task in tasks if with_creator] +
+        [task.get('assigned_to') for task in tasks if with_assignee]
+    )
+    for task in tasks:
+        if with_creator and task.get('user_id'):  # Creator
+            task['creator_username'] = usernames[task['user_id']]
+        if with_assignee and task.get('assigned_to'):  # Assignee
+            task['assignee_username'] = usernames[task['assigned_to']]
+    return tasks
+
+def incomplete_headers(incomplete):
+    """CORS headers, plus the projects that missed the fan-out latency budget"""
+    if not incomplete:
+        return CORS_HEADERS
+    return {**CORS_HEADERS, 'X-Incomplete-Projects': ','.join(incomplete)}
+
+def update_task(request, user_id):
     try:
-        body = json.loads(event['body'])
-        task_id = event['queryStringParameters'].get('task_id')
+        body = request.body
+        task_id = request.query.get('task_id')
         project_id = body.get('project_id')
         
         if not task_id or not project_id:
@@ -207,46 +453,19 @@ def update_task(event, user_id):
                 'headers': CORS_HEADERS
             }
         
-        # Verify project membership with proper status check
-        member = project_members_table.get_item(
-            Key={
-                'project_id': project_id,
-                'user_id': user_id
-            }
-        ).get('Item')
-        
-        if not member or member['status'] not in ['OWNER', 'ACCEPTED']:
-            return {
-                'statusCode': 403,
-                'body': json.dumps('Not authorized to update tasks in this project'),
-                'headers': CORS_HEADERS
-            }
-
-        # Update task
-        update_expr = []
-        expr_values = {':updated_at': datetime.now().isoformat()}
-        expr_names = {'#updated_at': 'updated_at'}
-
-        for key, value in body.items():
-            if key not in ['task_id', 'project_id', 'user_id']:
-                update_expr.append(f'#{key} = :{key}')
-                expr_values[f':{key}'] = value
-                expr_names[f'#{key}'] = key
-
-        update_expression = "SET " + ", ".join(update_expr) + ", #updated_at = :updated_at"
-
-        response = task_table.update_item(
-            Key={
-                'task_id': task_id,
-                'project_id': project_id
-            },
-            UpdateExpression=update_expression,
-            ExpressionAttributeNames=expr_names,
-            ExpressionAttributeValues=expr_values,
-            ReturnValues='ALL_NEW'
-        )
-        
-        updated_task = response['Attributes']
+        # Membership check and update are one conditional write; the previous
+        # status/assignee feed the analytics counters, and the new state is
+        # the old one with the changes applied
+        changes = task_update(body)
+        try:
+            old_task = storage.update_task(task_id, project_id, changes, user_id)
+        except WriteRejected as e:
+            return rejected(e, {
+                'forbidden': 'Not authorized to update tasks in this project',
+                'not_found': 'Task not found'
+            })
+        updated_task = {**old_task, **changes}
+        record_task_writes(project_id, user_id, [(old_task, updated_task)])
         
         # Add user details to response
         if updated_task.get('assigned_to'):
@@ -255,7 +474,7 @@ def update_task(event, user_id):
 
         return {
             'statusCode': 200,
-            'body': json.dumps(updated_task),
+            'body': updated_task,
             'headers': CORS_HEADERS
         }
     except Exception as e:
@@ -265,10 +484,77 @@ def update_task(event, user_id):
             'headers': CORS_HEADERS
         }
 
-def delete_task(event, user_id):
+def applied_task_changes(changes):
+    """The client-writable attributes among these changes"""
+    return {key: value for key, value in changes.items() if key not in TASK_READ_ONLY_FIELDS}
+
+def record_task_writes(project_id, user_id, transitions):
+    """Derived data of (old_task, new_task) pairs written by user_id: the
+    search index and the activity log. The engine writes the analytics
+    counters and the project version with the tasks.
+    """
+    update_search_index(project_id, transitions)
+    record_activity(task_events(project_id, user_id, transitions))
+    notifier.publish([project_id])
+
+def record_activity(events):
+    """Append to the activity log; a failure is logged rather than failing the write"""
+    if not events:
+        return
     try:
-        task_id = event['queryStringParameters'].get('task_id')
-        project_id = event['queryStringParameters'].get('project_id')
+        storage.append_activity(events)
+    except Exception as e:
+        print(f"Activity log append failed: {e}")
+
+def record_task_stats(project_id, transitions):
+    """Update the analytics counters for (old_task, new_task) pairs of one
+    project written by put_tasks(), the one task write that leaves them out.
+
+    A failure is logged rather than failing the write, and a rebuild_stats
+    job is started to recompute the project from its tasks. The project
+    version is bumped in the same transaction.
+    """
+    try:
+        storage.apply_stat_deltas(project_id, transition_deltas(transitions))
+    except ClientError as e:
+        print(f"Analytics counter update failed for {project_id}: {e.response['Error']['Message']}")
+        # Clients would keep serving stale copies if the version stood still
+        bump_project_versions([project_id])
+        repair_stats(project_id)
+
+def repair_stats(project_id):
+    """Recompute a project's counters in an asynchronous invocation of this
+    function, or inline when not running inside Lambda
+    """
+    from app import start_job  # app imports this module
+    try:
+        if not start_job('rebuild_stats', project_id=project_id):
+            run_rebuild_stats({'project_id': project_id}, None)
+    except ClientError as e:
+        print(f"Counter repair of {project_id} failed, run the rebuild_stats job: {e.response['Error']['Message']}")
+
+def update_search_index(project_id, transitions):
+    """Keep the task search index in step with (old_task, new_task) pairs of one project.
+
+    Like the counters, the index is derived data: a failure is logged and the
+    rebuild_search job re-indexes the project from its tasks.
+    """
+    puts, deletes = posting_changes(transitions)
+    if not puts and not deletes:
+        return
+    try:
+        storage.write_postings(project_id, puts, deletes)
+    except Exception as e:
+        print(f"Search index update failed for {project_id}: {e}")
+
+def task_update(changes):
+    """The attributes a task update SETs for these client changes, updated_at included"""
+    return {**applied_task_changes(changes), 'updated_at': datetime.now().isoformat()}
+
+def delete_task(request, user_id):
+    try:
+        task_id = request.query.get('task_id')
+        project_id = request.query.get('project_id')
         
         if not task_id or not project_id:
             return {
@@ -277,82 +563,359 @@ def delete_task(event, user_id):
                 'headers': CORS_HEADERS
             }
 
-        # First verify user is project member
-        member = project_members_table.get_item(
-            Key={
-                'project_id': project_id,
-                'user_id': user_id
+        # Delete the task; membership and existence are conditions of the delete
+        try:
+            old_task = storage.delete_task(task_id, project_id, user_id)
+        except WriteRejected as e:
+            return rejected(e, {
+                'forbidden': 'Not authorized to delete tasks in this project',
+                'not_found': 'Task not found'
+            })
+        record_tombstones([project_id], 'task', [task_id], project_id)
+        record_task_writes(project_id, user_id, [(old_task, None)])
+
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'message': 'Task deleted successfully'}),
+            'headers': CORS_HEADERS
+        }
+    except ClientError as e:
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f"Error deleting task: {e.response['Error']['Message']}"),
+            'headers': CORS_HEADERS
+        }
+
+def batch_tasks(request, user_id):
+    """Apply many task creates, updates and deletes within one project.
+
+    Membership is checked once, assignees are validated with one batched read
+    and the writes go to the engine together (DynamoDB: TransactWriteItems of
+    up to 100 operations). Each operation gets its own result; a failed
+    condition only fails that item.
+    """
+    try:
+        body = request.body
+        project_id = body.get('project_id')
+        operations = body.get('operations')
+
+        if not project_id or not isinstance(operations, list) or not operations:
+            return {
+                'statusCode': 400,
+                'body': json.dumps('Missing project_id or operations'),
+                'headers': CORS_HEADERS
             }
-        ).get('Item')
-        
+        if len(operations) > BATCH_MAX_OPERATIONS:
+            return {
+                'statusCode': 400,
+                'body': json.dumps(f'At most {BATCH_MAX_OPERATIONS} operations per batch'),
+                'headers': CORS_HEADERS
+            }
+
+        # The caller's and every assignee's membership come back in one batch
+        member_handle = storage.load_member(project_id, user_id)
+        assignee_handles = {}
+        for operation in operations:
+            fields = operation.get('task') if operation.get('op') == 'create' else operation.get('changes')
+            if isinstance(fields, dict) and fields.get('assigned_to'):
+                assignee_handles[fields['assigned_to']] = storage.load_member(project_id, fields['assigned_to'])
+
+        # Current state of updated/deleted tasks, for the analytics counters,
+        # search index and activity log
+        task_handles = {
+            operation['task_id']: storage.load_task(operation['task_id'], project_id)
+            for operation in operations
+            if operation.get('op') in ('update', 'delete') and operation.get('task_id')
+        }
+
+        # Authorize once for the whole batch
+        member = member_handle.get()
+
         if not member or member['status'] not in ['OWNER', 'ACCEPTED']:
             return {
                 'statusCode': 403,
-                'body': json.dumps('Not authorized to delete tasks in this project'),
+                'body': json.dumps('Not authorized to modify tasks in this project'),
                 'headers': CORS_HEADERS
             }
 
-        # Check if the task exists
-        task = task_table.get_item(
-            Key={
-                'task_id': task_id,
-                'project_id': project_id
+        valid_assignees = set()
+        for assignee, handle in assignee_handles.items():
+            assignee_member = handle.get()
+            if assignee_member and assignee_member['status'] in ['OWNER', 'ACCEPTED']:
+                valid_assignees.add(assignee)
+        usernames = get_usernames(list(valid_assignees))
+
+        results = [None] * len(operations)
+        writes = []
+        created = {}
+        updated = {}
+        deleted = []
+        seen = set()
+        current_time = datetime.now().isoformat()
+
+        for index, operation in enumerate(operations):
+            op = operation.get('op')
+            result = {'index': index, 'op': op}
+            results[index] = result
+
+            if op == 'create':
+                fields = operation.get('task') or {}
+                if not fields.get('name') or 'description' not in fields:
+                    result.update(statusCode=400, error='Missing name or description')
+                    continue
+                task_item = {
+                    'task_id': str(uuid4()),
+                    'project_id': project_id,
+                    'user_id': user_id,
+                    'name': fields['name'],
+                    'description': fields['description'],
+                    'status': fields.get('status', TASK_STATUSES['BACKLOG']),
+                    'created_at': current_time,
+                    'updated_at': current_time
+                }
+                if fields.get('assigned_to'):
+                    if fields['assigned_to'] not in valid_assignees:
+                        result.update(statusCode=400, error='Cannot assign task to non-project member')
+                        continue
+                    task_item['assigned_to'] = fields['assigned_to']
+                    task_item['assignee_username'] = usernames[fields['assigned_to']]
+                result['task_id'] = task_item['task_id']
+                created[index] = task_item
+                writes.append((index, 'create', task_item, None))
+                continue
+
+            task_id = operation.get('task_id')
+            result['task_id'] = task_id
+            if op not in ('update', 'delete') or not task_id:
+                result.update(statusCode=400, error='Each operation needs op (create, update, delete) and task_id')
+                continue
+            if task_id in seen:
+                # A transaction can't touch the same item twice
+                result.update(statusCode=409, error='Task appears more than once in this batch')
+                continue
+            seen.add(task_id)
+
+            if op == 'update':
+                changes = operation.get('changes')
+                if not isinstance(changes, dict) or not changes:
+                    result.update(statusCode=400, error='Missing changes')
+                    continue
+                if changes.get('assigned_to') and changes['assigned_to'] not in valid_assignees:
+                    result.update(statusCode=400, error='Cannot assign task to non-project member')
+                    continue
+                if changes.get('assigned_to'):
+                    changes = {**changes, 'assignee_username': usernames[changes['assigned_to']]}
+                updated[index] = changes
+                writes.append((index, 'update', (task_id, task_update(changes)), task_handles[task_id].get()))
+            else:
+                deleted.append(index)
+                writes.append((index, 'delete', task_id, task_handles[task_id].get()))
+
+        storage.write_tasks(project_id, writes, results)
+
+        def succeeded(index):
+            return results[index].get('statusCode') == 200
+
+        transitions = []
+        for index, task_item in created.items():
+            if succeeded(index):
+                results[index]['task'] = task_item
+                transitions.append((None, task_item))
+        for index, changes in updated.items():
+            old_task = task_handles[results[index]['task_id']].get()
+            if succeeded(index) and old_task:
+                transitions.append((old_task, {**old_task, **applied_task_changes(changes)}))
+        deleted_ids = []
+        for index in deleted:
+            old_task = task_handles[results[index]['task_id']].get()
+            if succeeded(index):
+                deleted_ids.append(results[index]['task_id'])
+                if old_task:
+                    transitions.append((old_task, None))
+
+        if deleted_ids:
+            record_tombstones([project_id], 'task', deleted_ids, project_id)
+        if transitions:
+            record_task_writes(project_id, user_id, transitions)
+
+        return {
+            'statusCode': 200,
+            'body': {'results': results},
+            'headers': CORS_HEADERS
+        }
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'body': json.dumps(str(e)),
+            'headers': CORS_HEADERS
+        }
+
+def get_archived_tasks(request, user_id):
+    """A project's archived tasks, most recently archived segment first.
+
+    The cursor is a position (segment, offset) in the project's segments;
+    segments are immutable and new ones sort first, so it stays valid
+    while more tasks are archived.
+    """
+    try:
+        query_params = request.query
+        project_id = query_params.get('project_id')
+
+        if not project_id:
+            return {
+                'statusCode': 400,
+                'body': json.dumps('Missing project_id'),
+                'headers': CORS_HEADERS
             }
-        ).get('Item')
-        
-        if not task:
+
+        member = storage.load_member(project_id, user_id).get()
+        if not member or member['status'] not in ['OWNER', 'ACCEPTED']:
             return {
-                'statusCode': 404,
-                'body': json.dumps('Task not found'),
+                'statusCode': 403,
+                'body': json.dumps('Not authorized to view tasks in this project'),
                 'headers': CORS_HEADERS
             }
 
-        # Delete the task
-        task_table.delete_item(
-            Key={
-                'task_id': task_id,
-                'project_id': project_id
+        scope = f'archive|{project_id}'
+        limit = parse_limit(query_params.get('limit'))
+        position = decode_cursor(query_params.get('cursor'), scope)
+        segments = archive_store.segments(project_id)
+        index, offset = 0, 0
+        if position:
+            if position.get('segment') not in segments or not isinstance(position.get('offset'), int):
+                raise PaginationError('Invalid cursor')
+            index, offset = segments.index(position['segment']), position['offset']
+
+        tasks = []
+        while index < len(segments) and len(tasks) < limit:
+            segment = archive_store.read_segment(project_id, segments[index]) or []
+            page = segment[offset:offset + limit - len(tasks)]
+            tasks.extend(page)
+            offset += len(page)
+            if offset >= len(segment):
+                index, offset = index + 1, 0
+
+        next_position = {'segment': segments[index], 'offset': offset} if index < len(segments) else None
+        return {
+            'statusCode': 200,
+            'body': {
+                'items': StreamedList(enrich_tasks(tasks)),
+                'next_cursor': encode_cursor(next_position, scope)
+            },
+            'headers': CORS_HEADERS
+        }
+    except PaginationError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps(str(e)),
+            'headers': CORS_HEADERS
+        }
+    except ClientError as e:
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f"Error retrieving archived tasks: {e.response['Error']['Message']}"),
+            'headers': CORS_HEADERS
+        }
+
+def search_tasks(request, user_id):
+    """Ranked search over the names and descriptions of the caller's tasks.
+
+    Reads the inverted index, not the tasks: only the postings of the query
+    terms are read, and only the tasks on the returned page are loaded. Every
+    term must match; the last one also matches as a prefix while it is
+    being typed. Pages are offsets into the ranking, scoped to the query.
+    """
+    try:
+        query_params = request.query
+        project_id = query_params.get('project_id')
+        terms, prefix = parse_query(query_params.get('q'))
+
+        if not terms:
+            return {
+                'statusCode': 400,
+                'body': json.dumps('Missing search query (q)'),
+                'headers': CORS_HEADERS
             }
-        )
 
+        if project_id:
+            member = storage.load_member(project_id, user_id).get()
+            if not member or member['status'] not in ['OWNER', 'ACCEPTED']:
+                return {
+                    'statusCode': 403,
+                    'body': json.dumps('Not authorized to search tasks in this project'),
+                    'headers': CORS_HEADERS
+                }
+            project_ids = [project_id]
+        else:
+            project_ids = [member['project_id'] for member in storage.member_projects(user_id)]
+
+        scope = f"search|{project_id or ''}|{' '.join(terms)}|{prefix}"
+        limit = parse_limit(query_params.get('limit'), SEARCH_PAGE_SIZE)
+        start = decode_cursor(query_params.get('cursor'), scope) or {'offset': 0}
+        offset = start.get('offset')
+        if not isinstance(offset, int) or offset < 0:
+            raise PaginationError('Invalid cursor')
+
+        postings, incomplete = storage.search_postings(project_ids, terms, prefix)
+        ranked = rank(postings, terms, prefix)
+
+        # Point reads of the page's tasks go out in one batch; a task deleted
+        # since it was indexed is skipped
+        page = ranked[offset:offset + limit]
+        handles = [storage.load_task(task_id, pid) for (pid, task_id), _ in page]
+        tasks = []
+        for (_, score), handle in zip(page, handles):
+            task = handle.get()
+            if task:
+                tasks.append({**task, 'score': round(score, 3)})
+
+        next_offset = offset + limit
         return {
             'statusCode': 200,
-            'body': json.dumps({'message': 'Task deleted successfully'}),
+            'body': {
+                'items': enrich_tasks(tasks),
+                'total': len(ranked),
+                'next_cursor': encode_cursor({'offset': next_offset}, scope) if next_offset < len(ranked) else None
+            },
+            'headers': incomplete_headers(incomplete)
+        }
+    except PaginationError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps(str(e)),
             'headers': CORS_HEADERS
         }
     except ClientError as e:
         return {
             'statusCode': 500,
-            'body': json.dumps(f"Error deleting task: {e.response['Error']['Message']}"),
+            'body': json.dumps(f"Error searching tasks: {e.response['Error']['Message']}"),
             'headers': CORS_HEADERS
         }
 
 # ------------------------- Project CRUD Functions --------------------------
 
-def create_project(event, user_id):
+def create_project(request, user_id):
     try:
-        body = json.loads(event['body'])
+        body = request.body
         project_id = str(uuid4())
 
-        # Create project
-        project_table.put_item(
-            Item={
+        # Create project, with the creator as a project member with OWNER status
+        storage.create_project(
+            {
                 'project_id': project_id,
                 'user_id': user_id,
                 'name': body['name'],
                 'description': body['description'],
-            }
-        )
-
-        # Add creator as a project member with OWNER status
-        project_members_table.put_item(
-            Item={
+            },
+            {
                 'project_id': project_id,
                 'user_id': user_id,
                 'status': 'OWNER',
                 'joined_at': datetime.now().isoformat()
             }
         )
+        bump_user_versions([user_id])
+        record_activity([activity_event(project_id, user_id, 'created', 'project', project_id, body['name'])])
 
         return {
             'statusCode': 200,
@@ -367,62 +930,22 @@ def create_project(event, user_id):
         }
 
 # 1. Fix get_projects function to handle GSI errors
-def get_projects(user_id):
+def get_projects(request, user_id):
     try:
         # Get all projects where user is a member
-        member_projects = project_members_table.query(
-            IndexName='user-projects-index',
-            KeyConditionExpression=Key('user_id').eq(user_id),
-            FilterExpression='#status IN (:owner, :member)',
-            ExpressionAttributeNames={'#status': 'status'},
-            ExpressionAttributeValues={':owner': 'OWNER', ':member': 'ACCEPTED'}
-        )
+        member_projects = storage.member_projects(user_id)
 
-        projects = []
-        for member in member_projects['Items']:
-            project_id = member['project_id']
-            
-            # Get project details
-            owner_response = project_table.query(
-                IndexName='project-id-index',
-                KeyConditionExpression=Key('project_id').eq(project_id),
-                Limit=1
-            )
-            
-            if owner_response['Items']:
-                project = owner_response['Items'][0]
-                # Get all members for this project
-                members_response = project_members_table.query(
-                    KeyConditionExpression=Key('project_id').eq(project_id),
-                    FilterExpression='#status IN (:owner, :member)',
-                    ExpressionAttributeNames={'#status': 'status'},
-                    ExpressionAttributeValues={':owner': 'OWNER', ':member': 'ACCEPTED'}
-                )
+        roles = {member['project_id']: member['status'] for member in member_projects}
+        etag = make_etag('projects', sorted(roles.items()), read_project_versions(list(roles)))
+        if etag_matches(request, etag):
+            return not_modified(etag)
 
-                # Enrich member information with Cognito details
-                members = []
-                for member_item in members_response['Items']:
-                    member_details = get_user_details(member_item['user_id'])
-                    members.append({
-                        'user_id': member_item['user_id'],
-                        'username': member_details['username'],
-                        'status': member_item['status']
-                    })
-
-                # Add member information to project
-                project['members'] = members
-                project['role'] = member['status']
-                
-                # Add owner details
-                owner_details = get_user_details(project['user_id'])
-                project['owner_username'] = owner_details['username']
-                
-                projects.append(project)
+        projects, incomplete = load_project_listing(roles)
 
         return {
             'statusCode': 200,
-            'body': json.dumps(projects),
-            'headers': CORS_HEADERS
+            'body': StreamedList(projects),
+            'headers': versioned_headers(etag, incomplete)
         }
     except ClientError as e:
         return {
@@ -431,59 +954,248 @@ def get_projects(user_id):
             'headers': CORS_HEADERS
         }
 
-def update_project(event, user_id):
+def load_project_listing(roles):
+    """Projects of {project_id: role} as listed by GET /projects; returns (projects, incomplete)"""
+    projects, incomplete = storage.load_projects(list(roles))
+    for project in projects:
+        project['role'] = roles[project['project_id']]
+
+    # Enrich members and owners with usernames in a single pass
+    usernames = get_usernames(
+        [project['user_id'] for project in projects] +
+        [m['user_id'] for project in projects for m in project['members']]
+    )
+    for project in projects:
+        for project_member in project['members']:
+            project_member['username'] = usernames[project_member['user_id']]
+        project['owner_username'] = usernames[project['user_id']]
+    return projects, incomplete
+
+def update_project(request, user_id):
     try:
-        body = json.loads(event['body'])
-        project_id = event['queryStringParameters'].get('project_id')
+        body = request.body
+        project_id = request.query.get('project_id')
         
-        # First verify user has permission to update project
-        member = project_members_table.get_item(
-            Key={
-                'project_id': project_id,
-                'user_id': user_id
-            }
-        ).get('Item')
+        # Membership check, update and version bump are one write
+        try:
+            storage.update_project(project_id, user_id, {
+                'name': body['name'],
+                'description': body['description']
+            })
+        except WriteRejected as e:
+            return rejected(e, {
+                'forbidden': 'Not authorized to update this project',
+                'not_found': 'Project not found'
+            })
+
+        # Pending invites show the project name and description; like the
+        # counters they are derived data, so a failure doesn't fail the update
+        try:
+            storage.update_pending_invites(project_id, {
+                'project_name': body['name'],
+                'project_description': body['description']
+            })
+        except ClientError as e:
+            print(f"Invite refresh failed for {project_id}: {e.response['Error']['Message']}")
+        # storage.update_project bumped the version
+        notifier.publish([project_id])
+        record_activity([activity_event(project_id, user_id, 'updated', 'project', project_id, body['name'])])
         
-        if not member or member['status'] not in ['OWNER', 'ACCEPTED']:
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'message': 'Project updated successfully'}),
+            'headers': CORS_HEADERS
+        }
+    except Exception as e:
+        return {
+            'statusCode': 500,
+            'body': json.dumps(str(e)),
+            'headers': CORS_HEADERS
+        }
+
+def delete_project(request, user_id):
+    try:
+        project_id = request.query.get('project_id')
+        
+        # First verify user is project owner
+        member = storage.load_member(project_id, user_id).get()
+        
+        if not member or member['status'] != 'OWNER':
             return {
                 'statusCode': 403,
-                'body': json.dumps('Not authorized to update this project'),
+                'body': json.dumps('Only project owner can delete project'),
                 'headers': CORS_HEADERS
             }
 
-        # Get project to verify it exists and get owner's user_id
-        project_response = project_table.query(
-            IndexName='project-id-index',
-            KeyConditionExpression=Key('project_id').eq(project_id),
-            Limit=1
+        # Mark the project as deleting so it disappears from listings right
+        # away; if the record is already gone an earlier cascade got this
+        # far, so resume it
+        storage.mark_project_deleting(user_id, project_id, PROJECT_DELETING, datetime.now().isoformat())
+
+        record_tombstones(
+            [user_scope(member_item['user_id']) for member_item in storage.project_members(project_id)],
+            'project', [project_id], project_id
         )
-        
-        if not project_response['Items']:
+        bump_project_versions([project_id])
+        # The project's events are left to expire with the activity log
+        record_activity([activity_event(project_id, user_id, 'deleted', 'project', project_id)])
+
+        # Members and tasks are removed in the background (or inline when
+        # not running inside Lambda)
+        from app import start_job  # app imports this module
+        if start_job('cascade_delete', project_id=project_id, owner_id=user_id):
+            return {
+                'statusCode': 202,
+                'body': json.dumps({'message': 'Project deletion started'}),
+                'headers': CORS_HEADERS
+            }
+
+        cascade_delete_project(project_id, user_id)
+        return {
+            'statusCode': 200,
+            'body': json.dumps({'message': 'Project deleted successfully'}),
+            'headers': CORS_HEADERS
+        }
+    except ClientError as e:
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f"Error deleting project: {e.response['Error']['Message']}"),
+            'headers': CORS_HEADERS
+        }
+
+def export_project(request, user_id):
+    """A project's metadata, members and tasks as NDJSON (see functions/transfer.py).
+
+    Tasks are read page by page while the body is encoded, so only one page
+    is held at a time; with gzip the encoded body is compressed as it grows.
+    """
+    try:
+        project_id = request.query.get('project_id')
+
+        if not project_id:
+            return {
+                'statusCode': 400,
+                'body': json.dumps('Missing project_id'),
+                'headers': CORS_HEADERS
+            }
+
+        member = storage.load_member(project_id, user_id).get()
+        if not member or member['status'] not in ['OWNER', 'ACCEPTED']:
+            return {
+                'statusCode': 403,
+                'body': json.dumps('Not authorized to export this project'),
+                'headers': CORS_HEADERS
+            }
+
+        project = storage.find_project(project_id)
+        if not project or project.get('status') == PROJECT_DELETING:
             return {
                 'statusCode': 404,
                 'body': json.dumps('Project not found'),
                 'headers': CORS_HEADERS
             }
-        
-        owner_id = project_response['Items'][0]['user_id']
-        
-        # Update project using owner's user_id
-        project_table.update_item(
-            Key={
-                'user_id': owner_id,  # Must use owner's user_id due to table structure
-                'project_id': project_id
+
+        # The first page is read here so query errors surface in the handler
+        pages = storage.task_pages(project_id)
+        first_page = next(pages)
+        return {
+            'statusCode': 200,
+            'body': NDJSONStream(export_records(
+                project, storage.project_members(project_id), chain.from_iterable(chain([first_page], pages))
+            )),
+            'headers': {
+                **CORS_HEADERS,
+                'Content-Type': 'application/x-ndjson',
+                'Content-Disposition': f'attachment; filename="project-{project_id}.ndjson"'
+            }
+        }
+    except ClientError as e:
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f"Error exporting project: {e.response['Error']['Message']}"),
+            'headers': CORS_HEADERS
+        }
+
+def import_project(request, user_id):
+    """Create a project from a GET /projects/export document (NDJSON body,
+    so userId comes from the query string). Bodies over REQUEST_MAX_BYTES
+    get a 413, so large documents are sent with Content-Encoding: gzip.
+
+    The whole document is validated before anything is written. The caller
+    owns the new project and the other exported members are invited to it.
+    Tasks get new ids and are written IMPORT_BATCH_TASKS at a time together
+    with their counters and search postings, so memory stays flat however
+    many there are. If a write fails part way, the partial project is left
+    for the caller to delete. The response reports counts and throughput.
+    """
+    started = time.monotonic()
+    try:
+        text = request.text
+        try:
+            project, member_ids, _ = validate_import(text, set(TASK_STATUSES.values()))
+        except ImportRejected as e:
+            return {
+                'statusCode': 400,
+                'body': json.dumps(str(e)),
+                'headers': CORS_HEADERS
+            }
+
+        project_id = str(uuid4())
+        current_time = datetime.now().isoformat()
+        storage.create_project(
+            {
+                'project_id': project_id,
+                'user_id': user_id,
+                'name': project['name'],
+                'description': project.get('description', ''),
             },
-            UpdateExpression="SET #name = :name, description = :desc",
-            ExpressionAttributeNames={"#name": "name"},
-            ExpressionAttributeValues={
-                ":name": body['name'],
-                ":desc": body['description']
+            {
+                'project_id': project_id,
+                'user_id': user_id,
+                'status': 'OWNER',
+                'joined_at': current_time
             }
         )
-        
+
+        # The project is new and owned by the caller, so the invites need
+        # neither the owner check nor the existing-membership check
+        invitees = sorted(member_ids - {user_id})
+        if invitees:
+            inviter = get_user_details(user_id)
+            for invitee_id in invitees:
+                storage.put_member({
+                    'project_id': project_id,
+                    'user_id': invitee_id,
+                    'status': 'PENDING',
+                    'invited_by': user_id,
+                    'invited_at': current_time,
+                    'project_name': project['name'],
+                    'project_description': project.get('description', ''),
+                    'inviter_username': inviter['username']
+                })
+
+        imported = 0
+        for tasks in import_task_batches(text, project_id, user_id, current_time):
+            storage.put_tasks(tasks)
+            transitions = [(None, task) for task in tasks]
+            record_task_stats(project_id, transitions)
+            update_search_index(project_id, transitions)
+            imported += len(tasks)
+
+        notifier.publish([project_id])
+        bump_user_versions([user_id] + invitees)
+        record_activity([activity_event(project_id, user_id, 'imported', 'project', project_id, project['name'])])
+
+        seconds = time.monotonic() - started
         return {
             'statusCode': 200,
-            'body': json.dumps({'message': 'Project updated successfully'}),
+            'body': json.dumps({
+                'project_id': project_id,
+                'tasks': imported,
+                'invited': len(invitees),
+                'seconds': round(seconds, 3),
+                'tasks_per_second': round(imported / seconds, 1) if seconds else None
+            }),
             'headers': CORS_HEADERS
         }
     except Exception as e:
@@ -493,113 +1205,425 @@ def update_project(event, user_id):
             'headers': CORS_HEADERS
         }
 
-def delete_project(event, user_id):
+def run_cascade_delete(job, context):
+    """Async job entry point; re-queues itself if the invocation runs short on time"""
+    deadline = None
+    if context is not None:
+        remaining = context.get_remaining_time_in_millis() - CASCADE_TIME_MARGIN_MS
+        deadline = time.monotonic() + remaining / 1000
+
+    finished = cascade_delete_project(job['project_id'], job['owner_id'], deadline)
+    if not finished:
+        print(f"Cascade delete of {job['project_id']} out of time, resuming in a new invocation")
+        from app import start_job  # app imports this module
+        start_job('cascade_delete', project_id=job['project_id'], owner_id=job['owner_id'])
+    return {'project_id': job['project_id'], 'finished': finished}
+
+def cascade_delete_project(project_id, owner_id, deadline=None):
+    """Delete a project's members, tasks, counters, search postings and record.
+
+    The engine re-reads what is left at every step, so the cascade is
+    idempotent and can be resumed after a timeout. The owner's membership is
+    removed last so the owner can still re-issue the DELETE. Returns False if
+    the deadline was hit. Archive segments go once the live data is gone.
+    """
+    finished = storage.delete_project_data(project_id, owner_id, deadline)
+    if finished:
+        archive_store.delete_project(project_id)
+    return finished
+
+def run_archive_tasks(job, context):
+    """Async job: archive a project's old Done tasks. Without a project_id
+    (the daily schedule) one job is started per project, or every project
+    is archived inline when not running inside Lambda. Nothing happens
+    unless the archive store is shared by every invocation.
+    """
+    if not archive_store.shared:
+        print(f"Archiving skipped: {ARCHIVE_NOT_SHARED}")
+        return {'skipped': ARCHIVE_NOT_SHARED}
+
+    if job.get('project_id'):
+        return {'project_id': job['project_id'], 'archived': archive_project(job['project_id'])}
+
+    from app import start_job  # app imports this module
+    projects = 0
+    for project_id in storage.project_ids():
+        if not start_job('archive_tasks', project_id=project_id):
+            archive_project(project_id)
+        projects += 1
+    return {'projects': projects}
+
+def archive_project(project_id):
+    """Move a project's tasks that have been Done for ARCHIVE_AFTER_DAYS
+    (by updated_at) from the live table to archive segments; returns how many.
+
+    Each segment is written as pending, its tasks are removed from the live
+    table (a task updated since it was read stays live), and the segment is
+    then published with the tasks that were removed. A pending segment left
+    by an interrupted run is finished with those of its tasks that are gone.
+    """
+    # Tasks moved into a store only this container sees would be lost
+    if not archive_store.shared:
+        raise RuntimeError(ARCHIVE_NOT_SHARED)
+
+    archived = 0
+    for segment_id, tasks in archive_store.pending_segments(project_id):
+        handles = [storage.load_task(task['task_id'], project_id) for task in tasks]
+        removed = [task for task, handle in zip(tasks, handles) if handle.get() is None]
+        archive_store.commit_segment(project_id, segment_id, removed)
+        record_archived_tasks(project_id, removed)
+        archived += len(removed)
+
+    cutoff = archive_cutoff()
+    candidates = [
+        task for task in chain.from_iterable(storage.task_pages(project_id, [TASK_STATUSES['DONE']]))
+        if task.get('updated_at') and task['updated_at'] < cutoff
+    ]
+    for tasks in segment_tasks(candidates):
+        segment_id = archive_store.begin_segment(project_id, tasks)
+        removed = storage.remove_archived_tasks(project_id, tasks)
+        archive_store.commit_segment(project_id, segment_id, removed)
+        record_archived_tasks(project_id, removed)
+        archived += len(removed)
+    return archived
+
+def record_archived_tasks(project_id, tasks):
+    """Archived tasks leave the board: tombstones for delta sync and
+    /changes clients and the search index (the engine removed them from the
+    counters and bumped the project version)
+    """
+    if not tasks:
+        return
+    record_tombstones([project_id], 'task', [task['task_id'] for task in tasks], project_id)
+    update_search_index(project_id, [(task, None) for task in tasks])
+    notifier.publish([project_id])
+
+def get_analytics(request, user_id):
+    """Task counters per project, status, assignee and day, read from ProjectStats"""
     try:
-        project_id = event['queryStringParameters'].get('project_id')
-        
-        # First verify user is project owner
-        member = project_members_table.get_item(
-            Key={
-                'project_id': project_id,
-                'user_id': user_id
+        query_params = request.query
+        project_id = query_params.get('project_id')
+        try:
+            days = min(max(int(query_params.get('days', 7)), 1), 30)
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'body': json.dumps('days must be an integer'),
+                'headers': CORS_HEADERS
             }
-        ).get('Item')
-        
-        if not member or member['status'] != 'OWNER':
+
+        if project_id:
+            member = storage.load_member(project_id, user_id).get()
+            if not member or member['status'] not in ['OWNER', 'ACCEPTED']:
+                return {
+                    'statusCode': 403,
+                    'body': json.dumps('Not authorized to view analytics for this project'),
+                    'headers': CORS_HEADERS
+                }
+            project_ids = [project_id]
+        else:
+            member_projects = storage.member_projects(user_id)
+            project_ids = [member['project_id'] for member in member_projects]
+
+        projects, incomplete = storage.project_stats(project_ids, days)
+
+        totals = {'total': 0, 'by_status': Counter()}
+        for project in projects:
+            totals['total'] += project['total']
+            totals['by_status'].update(project['by_status'])
+
+        usernames = get_usernames(
+            [assignee for project in projects for assignee in project['by_assignee']]
+        )
+        for project in projects:
+            project['by_assignee'] = [
+                {'user_id': assignee, 'username': usernames[assignee], 'count': count}
+                for assignee, count in project['by_assignee'].items()
+            ]
+
+        return {
+            'statusCode': 200,
+            'body': {
+                'projects': projects,
+                'totals': {'total': totals['total'], 'by_status': dict(totals['by_status'])}
+            },
+            'headers': incomplete_headers(incomplete)
+        }
+    except ClientError as e:
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f"Error retrieving analytics: {e.response['Error']['Message']}"),
+            'headers': CORS_HEADERS
+        }
+
+def get_activity(request, user_id):
+    """A project's activity log, newest first, one page per request"""
+    try:
+        query_params = request.query
+        project_id = query_params.get('project_id')
+
+        if not project_id:
+            return {
+                'statusCode': 400,
+                'body': json.dumps('Missing project_id'),
+                'headers': CORS_HEADERS
+            }
+
+        member = storage.load_member(project_id, user_id).get()
+        if not member or member['status'] not in ['OWNER', 'ACCEPTED']:
             return {
                 'statusCode': 403,
-                'body': json.dumps('Only project owner can delete project'),
+                'body': json.dumps('Not authorized to view activity for this project'),
                 'headers': CORS_HEADERS
             }
 
-        # Delete all project members
-        members_response = project_members_table.query(
-            KeyConditionExpression=Key('project_id').eq(project_id)
+        # The cursor wraps the engine's position (day bucket and event key)
+        scope = f'activity|{project_id}'
+        events, last_key = storage.activity_page(
+            project_id,
+            parse_limit(query_params.get('limit')),
+            decode_cursor(query_params.get('cursor'), scope)
         )
-        
-        for member_item in members_response['Items']:
-            project_members_table.delete_item(
-                Key={
-                    'project_id': project_id,
-                    'user_id': member_item['user_id']
-                }
-            )
+        events = [public_event(event) for event in events]
+        usernames = get_usernames([event['actor'] for event in events])
+        for event in events:
+            event['actor_username'] = usernames[event['actor']]
 
-        # Delete all tasks in the project
-        tasks_response = task_table.query(
-            IndexName='project-id-index',
-            KeyConditionExpression=Key('project_id').eq(project_id)
-        )
-        
-        for task in tasks_response['Items']:
-            task_table.delete_item(
-                Key={
-                    'task_id': task['task_id'],
-                    'project_id': project_id
-                }
+        return {
+            'statusCode': 200,
+            'body': {
+                'items': events,
+                'next_cursor': encode_cursor(last_key, scope)
+            },
+            'headers': CORS_HEADERS
+        }
+    except PaginationError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps(str(e)),
+            'headers': CORS_HEADERS
+        }
+    except ClientError as e:
+        return {
+            'statusCode': 500,
+            'body': json.dumps(f"Error retrieving activity: {e.response['Error']['Message']}"),
+            'headers': CORS_HEADERS
+        }
+
+def get_changes(request, user_id):
+    """Long poll for changes to the caller's projects, tasks and invites.
+
+    The cursor holds the version of every scope the caller watches: their
+    projects, the projects they are invited to and their own user scope
+    (project and invite lists). The request blocks until one of those
+    versions moves or `wait` seconds pass, then returns only the changed
+    entities and a new cursor. Without a cursor it answers at once with a
+    cursor for the current state, for a client that just loaded its data.
+    """
+    try:
+        query_params = request.query
+        scope = f'changes|{user_id}'
+        position = decode_cursor(query_params.get('cursor'), scope)
+        if position is not None and not valid_changes_position(position):
+            raise PaginationError('Invalid cursor')
+        try:
+            wait = min(max(float(query_params.get('wait', CHANGES_WAIT_SECONDS)), 0), CHANGES_WAIT_SECONDS)
+        except ValueError:
+            return {
+                'statusCode': 400,
+                'body': json.dumps('wait must be a number of seconds'),
+                'headers': CORS_HEADERS
+            }
+
+        synced_at = (datetime.now() - timedelta(seconds=DELTA_OVERLAP_SECONDS)).isoformat()
+        if position is None:
+            roles, pending = storage.member_projects(user_id), storage.pending_invites(user_id)
+            members = [member['project_id'] for member in roles]
+            watched = [user_scope(user_id), *members, *(item['project_id'] for item in pending)]
+            return changes_response(
+                scope, synced_at, read_project_versions(watched), members, make_etag('invites', invite_rows(pending))
             )
 
-        # Finally delete the project
-        project_table.delete_item(
-            Key={
-                'project_id': project_id,
-                'user_id': user_id
+        since_key, known = position['since'], position['versions']
+        if since_key < (datetime.now() - timedelta(days=TOMBSTONE_RETENTION_DAYS)).isoformat():
+            return {
+                'statusCode': 410,
+                'body': json.dumps('cursor is older than the deletion history; reload all data'),
+                'headers': CORS_HEADERS
             }
+
+        # The cursor is not signed: only what the caller watches now is
+        # polled, whatever other scopes the client put in it
+        watching = {user_scope(user_id)}
+        watching.update(member['project_id'] for member in storage.member_projects(user_id))
+        watching.update(item['project_id'] for item in storage.pending_invites(user_id))
+        known = {key: version for key, version in known.items() if key in watching}
+
+        deadline = time.monotonic() + wait
+        while True:
+            # Snapshot before reading so a write in between still wakes us
+            wake = notifier.snapshot(list(known))
+            # Fresh reads: the request loader would serve the cached versions
+            storage.begin_request()
+            versions = read_project_versions(list(known))
+            changed = {key for key in known if versions[key] != known[key]}
+            remaining = deadline - time.monotonic()
+            if changed or remaining <= 0:
+                break
+            notifier.wait(wake, min(CHANGES_POLL_SECONDS, remaining))
+        if not changed:
+            return changes_response(scope, since_key, known, position['members'], position['invites'])
+
+        # Versions are read before the data, so a write racing with this
+        # response is delivered (again) by the next one rather than lost
+        roles = {member['project_id']: member['status'] for member in storage.member_projects(user_id)}
+        pending = storage.pending_invites(user_id)
+        watched = [user_scope(user_id), *roles, *(item['project_id'] for item in pending)]
+        versions.update(read_project_versions([key for key in watched if key not in versions]))
+        versions = {key: versions[key] for key in watched}
+
+        previous = set(position['members'])
+        joined = [project_id for project_id in roles if project_id not in previous]
+        refreshed = [project_id for project_id in roles if project_id in changed or project_id in joined]
+        projects, incomplete = load_project_listing({project_id: roles[project_id] for project_id in refreshed})
+        incomplete = set(incomplete)
+        listed = {project['project_id'] for project in projects}
+        # Left, rejected and deleted projects (the latter are unlisted while
+        # their cascade delete runs)
+        removed = [project_id for project_id in previous if project_id not in roles] + [
+            project_id for project_id in refreshed if project_id not in listed and project_id not in incomplete
+        ]
+
+        tasks, deleted_tasks, _, task_incomplete = read_task_changes(
+            [project_id for project_id in refreshed if project_id in previous], since_key
         )
+        joined_tasks, joined_incomplete = storage.tasks_for_projects(joined)
+        tasks += enrich_tasks(joined_tasks)
+        incomplete.update(task_incomplete, joined_incomplete)
+        for project_id in incomplete:
+            # Left at the old version (or unwatched) so the next poll retries it
+            if project_id in known:
+                versions[project_id] = known[project_id]
+            else:
+                versions.pop(project_id, None)
 
+        # Invites are listed whole, and only when their rows changed
+        invites_tag = make_etag('invites', invite_rows(pending))
+        invites = invite_listing(pending) if invites_tag != position['invites'] else None
+
+        return changes_response(
+            scope, since_key if incomplete else synced_at, versions,
+            [project_id for project_id in roles if project_id in versions], invites_tag,
+            {
+                'projects': projects,
+                'removed_projects': removed,
+                'tasks': tasks,
+                'deleted_tasks': deleted_tasks,
+                'invites': invites
+            },
+            incomplete
+        )
+    except PaginationError as e:
         return {
-            'statusCode': 200,
-            'body': json.dumps({'message': 'Project deleted successfully'}),
+            'statusCode': 400,
+            'body': json.dumps(str(e)),
             'headers': CORS_HEADERS
         }
     except ClientError as e:
         return {
             'statusCode': 500,
-            'body': json.dumps(f"Error deleting project: {e.response['Error']['Message']}"),
+            'body': json.dumps(f"Error retrieving changes: {e.response['Error']['Message']}"),
             'headers': CORS_HEADERS
         }
 
-def get_project_invites(user_id):
+def valid_changes_position(position):
+    """True if a decoded /changes cursor has the shape changes_response() writes"""
+    versions = position.get('versions')
+    return (
+        set(position) == {'since', 'versions', 'members', 'invites'}
+        and isinstance(position['since'], str)
+        and isinstance(versions, dict)
+        and all(type(version) is int for version in versions.values())
+        and isinstance(position['members'], list)
+        and all(isinstance(project_id, str) for project_id in position['members'])
+        and (position['invites'] is None or isinstance(position['invites'], str))
+    )
+
+def changes_response(scope, since, versions, members, invites_tag, changes=None, incomplete=()):
+    """GET /changes body: the changes (none if not given) and the next cursor"""
+    changes = changes or {'projects': [], 'removed_projects': [], 'tasks': [], 'deleted_tasks': [], 'invites': None}
+    position = {
+        'since': since,
+        'versions': {key: int(version) for key, version in versions.items()},
+        'members': members,
+        'invites': invites_tag
+    }
+    return {
+        'statusCode': 200,
+        'body': {
+            'changed': any(changes.values()) or changes['invites'] is not None,
+            **changes,
+            'cursor': encode_cursor(position, scope)
+        },
+        'headers': incomplete_headers(sorted(incomplete))
+    }
+
+def run_rebuild_stats(job, context):
+    """Async job: recompute a project's counters from its tasks (backfill or repair)"""
+    project_id = job['project_id']
+    target = rebuild_stat_counts(chain.from_iterable(storage.task_pages(project_id)))
+
+    current = Counter()
+    for stat_key, count in storage.stat_counters(project_id).items():
+        if not stat_key.startswith('day#') and stat_key != VERSION_KEY:
+            current[stat_key] = int(count)
+
+    # ADD the difference so concurrent task writes are not lost
+    deltas = Counter()
+    for stat_key in set(target) | set(current):
+        deltas[stat_key] = target[stat_key] - current[stat_key]
+    storage.apply_stat_deltas(project_id, deltas)
+    return {'project_id': project_id, 'counters': dict(target)}
+
+def run_rebuild_search(job, context):
+    """Async job: re-index a project's tasks for search (backfill or repair)"""
+    project_id = job['project_id']
+    target = {}
+    for task in chain.from_iterable(storage.task_pages(project_id)):
+        for token, weight in task_postings(task).items():
+            target[(task['task_id'], token)] = weight
+
+    current = storage.project_postings(project_id)
+    storage.write_postings(
+        project_id,
+        {key: weight for key, weight in target.items() if current.get(key) != weight},
+        {key: weight for key, weight in current.items() if target.get(key) != weight}
+    )
+    return {'project_id': project_id, 'postings': len(target)}
+
+def get_project_invites(request, user_id):
+    """Pending invitations of the caller, read from the invite rows alone.
+
+    invite_user stores the project name and description and the inviter's
+    username on each row (and update_project keeps them current), so
+    listing is one query with no lookups.
+    """
     try:
         # Query invitations by user_id
-        response = project_members_table.query(
-            IndexName='user-projects-index',
-            KeyConditionExpression=Key('user_id').eq(user_id),
-            FilterExpression='#status = :status',
-            ExpressionAttributeNames={'#status': 'status'},
-            ExpressionAttributeValues={':status': 'PENDING'}
-        )
-        
-        invites = []
-        for item in response['Items']:
-            try:
-                # Try to get project details with error handling
-                project_response = project_table.get_item(
-                    Key={
-                        'project_id': item['project_id'],
-                        'user_id': item['invited_by']
-                    }
-                )
-                project = project_response.get('Item', {})
-                
-                # Only add valid invites for existing projects
-                if project:
-                    # Get inviter details
-                    inviter_details = get_user_details(item['invited_by'])
-                    
-                    invites.append({
-                        **item,
-                        'project_name': project.get('name', 'Unknown Project'),
-                        'project_description': project.get('description', ''),
-                        'inviter_username': inviter_details['username']
-                    })
-            except ClientError:
-                continue  # Skip invalid invites
-        
+        pending = storage.pending_invites(user_id)
+
+        # The rows carry everything the response shows, so they alone decide it
+        legacy = [item for item in pending if INVITE_DETAILS[0] not in item]
+        etag = make_etag('invites', invite_rows(pending), read_project_versions([item['project_id'] for item in legacy]))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        invites = invite_listing(pending)
+
         return {
             'statusCode': 200,
-            'body': json.dumps(invites),
-            'headers': CORS_HEADERS
+            'body': invites,
+            'headers': versioned_headers(etag)
         }
     except Exception as e:
         return {
@@ -608,52 +1632,90 @@ def get_project_invites(user_id):
             'headers': CORS_HEADERS
         }
 
-def invite_user(event, user_id):
+def invite_rows(pending):
+    """The values of pending invite rows that a listing shows"""
+    return sorted(
+        tuple(str(item.get(key)) for key in ('project_id', 'invited_by', 'invited_at', *INVITE_DETAILS))
+        for item in pending
+    )
+
+def invite_listing(pending):
+    """Pending invite rows as listed by GET /invites"""
+    return (
+        [item for item in pending if INVITE_DETAILS[0] in item] +
+        enrich_legacy_invites([item for item in pending if INVITE_DETAILS[0] not in item])
+    )
+
+def enrich_legacy_invites(pending):
+    """Look up the details of invites created before they were stored on the row"""
+    if not pending:
+        return []
+
+    inviter_usernames = get_usernames(
+        [item.get('invited_by') for item in pending]
+    )
+
+    # Queue every project lookup so they are fetched in one batch
+    project_handles = [
+        storage.load_project(item['invited_by'], item['project_id'])
+        for item in pending
+    ]
+
+    invites = []
+    for item, project_handle in zip(pending, project_handles):
+        project = project_handle.get()
+
+        # Only add valid invites for existing projects
+        if project:
+            invites.append({
+                **item,
+                'project_name': project.get('name', 'Unknown Project'),
+                'project_description': project.get('description', ''),
+                'inviter_username': inviter_usernames[item['invited_by']]
+            })
+    return invites
+
+def invite_user(request, user_id):
     try:
-        body = json.loads(event['body'])
+        body = request.body
         project_id = body['project_id']
         invitee_id = body['invitee_id']
         
-        # Check if user is project owner
-        member = project_members_table.get_item(
-            Key={
-                'project_id': project_id,
-                'user_id': user_id
-            }
-        ).get('Item')
-        
-        if not member or member['status'] != 'OWNER':
-            return {
-                'statusCode': 403,
-                'body': json.dumps('Only project owner can send invitations'),
-                'headers': CORS_HEADERS
-            }
-        
-        # Check if user is already a member
-        existing_member = project_members_table.get_item(
-            Key={
-                'project_id': project_id,
-                'user_id': invitee_id
-            }
-        ).get('Item')
-        
-        if existing_member:
+        if invitee_id == user_id:
             return {
                 'statusCode': 400,
                 'body': json.dumps('User is already a member or has a pending invitation'),
                 'headers': CORS_HEADERS
             }
 
-        # Add member to project
-        project_members_table.put_item(
-            Item={
+        # The invite row carries what the invitee's listing shows; only an
+        # owner can invite, so the project key is (user_id, project_id)
+        project_handle = storage.load_project(user_id, project_id)
+        inviter = get_user_details(user_id)
+        project = project_handle.get() or {}
+
+        # Owner check, existing-membership check and insert are one write
+        try:
+            storage.invite_member({
                 'project_id': project_id,
                 'user_id': invitee_id,
                 'status': 'PENDING',
                 'invited_by': user_id,
-                'invited_at': datetime.now().isoformat()
-            }
-        )
+                'invited_at': datetime.now().isoformat(),
+                'project_name': project.get('name', 'Unknown Project'),
+                'project_description': project.get('description', ''),
+                'inviter_username': inviter['username']
+            })
+        except WriteRejected as e:
+            return rejected(e, {
+                'forbidden': 'Only project owner can send invitations',
+                'exists': 'User is already a member or has a pending invitation'
+            })
+        # invite_member bumped the project version; the invitee isn't
+        # watching the project yet
+        notifier.publish([project_id])
+        bump_user_versions([invitee_id])
+        record_activity([activity_event(project_id, user_id, 'invited', 'member', invitee_id)])
         
         return {
             'statusCode': 200,
@@ -667,9 +1729,9 @@ def invite_user(event, user_id):
             'headers': CORS_HEADERS
         }
 
-def update_invite_status(event, user_id):
+def update_invite_status(request, user_id):
     try:
-        body = json.loads(event['body'])
+        body = request.body
         project_id = body['project_id']
         status = body['status']  # 'ACCEPTED' or 'REJECTED'
         
@@ -681,34 +1743,18 @@ def update_invite_status(event, user_id):
             }
         
         # Update invitation status
-        project_members_table.update_item(
-            Key={
-                'project_id': project_id,
-                'user_id': user_id
-            },
-            UpdateExpression='SET #status = :status, accepted_at = :time',
-            ExpressionAttributeNames={'#status': 'status'},
-            ExpressionAttributeValues={
-                ':status': status,
-                ':time': datetime.now().isoformat()
-            }
-        )
+        storage.set_member_status(project_id, user_id, status, datetime.now().isoformat())
 
         # If accepted, ensure user is added to project members (if not already)
         if status == 'ACCEPTED':
-            try:
-                project_members_table.put_item(
-                    Item={
-                        'project_id': project_id,
-                        'user_id': user_id,
-                        'status': 'ACCEPTED',
-                        'joined_at': datetime.now().isoformat()
-                    },
-                    ConditionExpression='attribute_not_exists(project_id) AND attribute_not_exists(user_id)'
-                )
-            except ClientError as e:
-                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
-                    raise e
+            storage.add_member({
+                'project_id': project_id,
+                'user_id': user_id,
+                'status': 'ACCEPTED',
+                'joined_at': datetime.now().isoformat()
+            })
+        bump_project_versions([project_id])
+        record_activity([activity_event(project_id, user_id, status.lower(), 'member', user_id)])
         
         return {
             'statusCode': 200,
@@ -722,29 +1768,15 @@ def update_invite_status(event, user_id):
             'headers': CORS_HEADERS
         }
 
-def search_users(event, user_id):
+def search_users(request, user_id):
     try:
-        query = event.get('queryStringParameters', {}).get('query', '')
-        
-        # Search by username
-        response = cognito.list_users(
-            UserPoolId=USER_POOL_ID,
-            Filter=f'username ^= "{query}"',  # Search by actual username
-            Limit=10
-        )
+        query = request.query.get('query', '')
         
-        users = []
-        for user in response.get('Users', []):
-            # Get the sub (user_id) from attributes
-            sub = next((attr['Value'] for attr in user.get('Attributes', []) 
-                       if attr['Name'] == 'sub'), None)
-            
-            if sub and sub != user_id:  # Don't include the requesting user
-                user_data = {
-                    'user_id': sub,  # Use the sub as user_id
-                    'username': user.get('Username')  # Use the actual username
-                }
-                users.append(user_data)
+        # Search by username; don't include the requesting user
+        users = [user for user in storage.search_users(query, 10) if user['user_id'] != user_id]
+
+        # Search results already carry sub -> username, so seed the directory
+        remember_users({user['user_id']: user['username'] for user in users})
         
         return {
             'statusCode': 200,
@@ -0,0 +1,181 @@
+import os
+import json
+import zlib
+import base64
+from functools import partial
+
+# CORS Headers
+CORS_HEADERS = {
+    'Access-Control-Allow-Headers': 'Content-Type, Content-Encoding, If-None-Match',
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': '*',
+    'Access-Control-Expose-Headers': 'ETag, X-Remote-Calls, X-Incomplete-Projects'
+}
+
+# Methods whose userId may come from the JSON body
+BODY_METHODS = ('POST', 'PUT', 'DELETE')
+
+# Request bodies as sent: Lambda refuses invocation payloads over 6 MB
+# before the function runs, and base64 in the event grows a body by 4/3
+REQUEST_MAX_BYTES = int(os.environ.get('REQUEST_MAX_BYTES', str(4 * 1024 * 1024)))
+
+# Request bodies once a Content-Encoding: gzip body is decompressed
+REQUEST_MAX_TEXT_BYTES = int(os.environ.get('REQUEST_MAX_TEXT_BYTES', str(32 * 1024 * 1024)))
+
+_UNPARSED = object()
+
+
+class BodyRejected(Exception):
+    """A request body that is too large or cannot be decoded"""
+
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+def _gunzip(data):
+    # Bounded, so a small body cannot expand past REQUEST_MAX_TEXT_BYTES
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        text = decompressor.decompress(data, REQUEST_MAX_TEXT_BYTES)
+    except zlib.error:
+        raise BodyRejected(400, 'Invalid gzip request body')
+    if decompressor.unconsumed_tail:
+        raise BodyRejected(413, f'Request body is over {REQUEST_MAX_TEXT_BYTES} bytes uncompressed')
+    if not decompressor.eof:
+        raise BodyRejected(400, 'Truncated gzip request body')
+    return text
+
+
+def message_response(status_code, message):
+    return {
+        'statusCode': status_code,
+        'headers': CORS_HEADERS,
+        'body': json.dumps(message)
+    }
+
+
+class RequestContext:
+    """An API Gateway proxy event, parsed once and passed to every handler"""
+
+    __slots__ = ('event', 'method', 'path', 'query', 'headers', 'user_id', '_text', '_body')
+
+    def __init__(self, event):
+        self.event = event
+        self.method = event.get('httpMethod')
+        self.path = event.get('resource')
+        self.query = event.get('queryStringParameters') or {}
+        self.headers = {name.lower(): value for name, value in (event.get('headers') or {}).items()}
+        self.user_id = None
+        self._text = None
+        self._body = _UNPARSED
+
+    @property
+    def text(self):
+        """The body text ('' when there is none), decoded on first access.
+
+        Raises BodyRejected for a body over REQUEST_MAX_BYTES or one that
+        cannot be decoded.
+        """
+        if self._text is None:
+            raw = self.event.get('body') or ''
+            # Binary media types are enabled for gzip responses, so API
+            # Gateway may hand request bodies over base64-encoded
+            if raw and self.event.get('isBase64Encoded'):
+                raw = base64.b64decode(raw)
+            gzipped = (self.header('content-encoding') or '').strip().lower() == 'gzip'
+            if len(raw) > REQUEST_MAX_BYTES:
+                hint = '' if gzipped else ', send it with Content-Encoding: gzip'
+                raise BodyRejected(413, f'Request body is over {REQUEST_MAX_BYTES} bytes{hint}')
+            if isinstance(raw, bytes):
+                # API Gateway may already have decompressed it
+                if gzipped and raw[:2] == b'\x1f\x8b':
+                    raw = _gunzip(raw)
+                try:
+                    raw = raw.decode('utf-8')
+                except UnicodeDecodeError:
+                    raise BodyRejected(400, 'Request body is not UTF-8')
+            self._text = raw
+        return self._text
+
+    @property
+    def body(self):
+        """The JSON body ({} when there is none), decoded on first access"""
+        if self._body is _UNPARSED:
+            raw = self.text
+            self._body = json.loads(raw) if raw else {}
+        return self._body
+
+    def header(self, name):
+        return self.headers.get(name.lower())
+
+
+class Router:
+    """Route table built once at import: {resource: {method: handler}}"""
+
+    def __init__(self, routes):
+        self.routes = routes
+
+    def __call__(self, request):
+        methods = self.routes.get(request.path)
+        if methods is None:
+            return message_response(404, 'Not Found')
+        handler = methods.get(request.method)
+        if handler is None:
+            return message_response(405, 'Method Not Allowed')
+        return handler(request, request.user_id)
+
+
+def build_pipeline(middleware, endpoint):
+    """Wrap endpoint in middleware (outermost first); each layer is called as
+    layer(request, call_next) and may return early or post-process the response.
+    """
+    handler = endpoint
+    for layer in reversed(middleware):
+        handler = partial(layer, call_next=handler)
+    return handler
+
+
+# ------------------------------ Middleware -------------------------------
+
+def handle_errors(request, call_next):
+    try:
+        return call_next(request)
+    except BodyRejected as e:
+        return message_response(e.status_code, e.message)
+    except json.JSONDecodeError:
+        return message_response(400, 'Invalid JSON in request body')
+    except Exception as e:
+        print(f"Error processing request: {str(e)}")  # Add logging
+        return message_response(500, f'Internal Server Error: {str(e)}')
+
+
+def cors(request, call_next):
+    # Preflight requests are answered before anything else runs
+    if request.method == 'OPTIONS':
+        return message_response(200, 'OK')
+    response = call_next(request)
+    response['headers'] = {**CORS_HEADERS, **(response.get('headers') or {})}
+    return response
+
+
+def decode_body(request, call_next):
+    # Size limits and decompression apply before any handler reads the body
+    if request.method in BODY_METHODS:
+        request.text
+    return call_next(request)
+
+
+def authenticate(request, call_next):
+    # Try to get user_id from query parameters first, then from the body
+    user_id = request.query.get('userId')
+    if not user_id and request.method in BODY_METHODS:
+        body = request.body
+        user_id = body.get('userId') if isinstance(body, dict) else None
+
+    if not user_id:
+        return message_response(401, 'Unauthorized: Missing userId')
+
+    request.user_id = user_id
+    return call_next(request)
@@ -0,0 +1,122 @@
+import time
+import random
+import threading
+from functions.batch_writes import serialize_item
+from functions.scatter import BATCH_GET_LIMIT, BATCH_GET_MAX_ATTEMPTS, UnprocessedKeysError, deserialize_item
+
+# Cached result for keys that were looked up and don't exist
+_MISSING = object()
+
+
+class Deferred:
+    """Handle returned by RequestLoader.load; get() resolves the queued batch"""
+
+    __slots__ = ('_loader', '_cache_key')
+
+    def __init__(self, loader, cache_key):
+        self._loader = loader
+        self._cache_key = cache_key
+
+    def get(self):
+        return self._loader._resolve(self._cache_key)
+
+
+class RequestLoader:
+    """DataLoader-style coalescing of single-key reads into BatchGetItem.
+
+    Handlers queue keys with load(table, key) and only block when they call
+    get() on a handle. At that point every key queued so far, across all
+    tables, is fetched in as few BatchGetItem calls as possible (100 keys
+    each). Results, including misses, are cached for the loader's lifetime:
+    Storage.begin_request() gives every request a fresh loader.
+    """
+
+    def __init__(self, client):
+        self._client = client
+        self._cache = {}
+        self._queue = {}
+        self._lock = threading.RLock()
+
+    def reset(self):
+        with self._lock:
+            self._cache.clear()
+            self._queue.clear()
+
+    def load(self, table_name, key):
+        cache_key = (table_name, tuple(sorted(key.items())))
+        with self._lock:
+            if cache_key not in self._cache:
+                self._queue.setdefault(table_name, {})[cache_key] = key
+        return Deferred(self, cache_key)
+
+    def load_many(self, table_name, keys):
+        return [self.load(table_name, key) for key in keys]
+
+    def get(self, table_name, key):
+        return self.load(table_name, key).get()
+
+    def get_many(self, table_name, keys):
+        handles = self.load_many(table_name, keys)
+        return [handle.get() for handle in handles]
+
+    def prime(self, table_name, key, item):
+        """Seed the cache with an item the caller already has (e.g. just written)"""
+        with self._lock:
+            self._cache[(table_name, tuple(sorted(key.items())))] = item if item is not None else _MISSING
+
+    def clear(self, table_name, key):
+        """Forget a cached key after the item was changed"""
+        with self._lock:
+            self._cache.pop((table_name, tuple(sorted(key.items()))), None)
+
+    def _resolve(self, cache_key):
+        with self._lock:
+            if cache_key not in self._cache:
+                if cache_key not in self._queue.get(cache_key[0], {}):
+                    # Cleared after it was queued; queue it again
+                    self._queue.setdefault(cache_key[0], {})[cache_key] = dict(cache_key[1])
+                self.dispatch()
+            item = self._cache.get(cache_key, _MISSING)
+        return None if item is _MISSING else item
+
+    def dispatch(self):
+        """Fetch every queued key now"""
+        with self._lock:
+            queue, self._queue = self._queue, {}
+            pending = [
+                (table_name, cache_key, key)
+                for table_name, keys in queue.items()
+                for cache_key, key in keys.items()
+            ]
+            for start in range(0, len(pending), BATCH_GET_LIMIT):
+                self._fetch(pending[start:start + BATCH_GET_LIMIT])
+
+    def _fetch(self, chunk):
+        request = {}
+        key_names = {}
+        for table_name, cache_key, key in chunk:
+            request.setdefault(table_name, {'Keys': []})['Keys'].append(serialize_item(key))
+            key_names[table_name] = sorted(key)
+
+        found = {}
+        for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(min(0.05 * 2 ** attempt, 1.0) * random.random())
+            response = self._client.batch_get_item(RequestItems=request)
+            for table_name, items in response.get('Responses', {}).items():
+                for raw in items:
+                    item = deserialize_item(raw)
+                    key = tuple((name, item.get(name)) for name in key_names[table_name])
+                    found[(table_name, key)] = item
+            request = response.get('UnprocessedKeys') or None
+            if not request:
+                break
+        else:
+            # Nothing of the chunk is cached, so a later get() tries again
+            raise UnprocessedKeysError(
+                f"{sum(len(keys['Keys']) for keys in request.values())} reads still unprocessed"
+            )
+
+        # Only cache once the whole chunk succeeded; anything not returned is missing
+        for _, cache_key, _ in chunk:
+            self._cache[cache_key] = found.get(cache_key, _MISSING)
@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import threading
+from collections import Counter
+from contextvars import ContextVar
+
+
+class RequestMetrics:
+    """Counters of one request: remote calls keyed by "service.Operation",
+    and DynamoDB consumption (capacity units per table/index, items read
+    and written). Fan-out threads run in a copy of the request's context,
+    so they record into the same object.
+    """
+
+    def __init__(self):
+        self.calls = Counter()
+        self.capacity = Counter()
+        self.lock = threading.Lock()
+
+
+# Per request rather than module level so a self-hosted server can run
+# requests on several threads at once
+_current = ContextVar('request_metrics', default=None)
+
+# CloudWatch namespace for the per-invocation embedded metric format record
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'TaskManager')
+
+READ_OPERATIONS = {'GetItem', 'BatchGetItem', 'Query', 'Scan', 'TransactGetItems'}
+
+
+def instrument(client):
+    """Count every API call a boto3 client makes (retries are not double counted).
+
+    DynamoDB clients also request ReturnConsumedCapacity on every operation
+    that supports it, and record the units and item counts of each response.
+    """
+    events = client.meta.events
+    events.register('before-call', _record_call)
+    if client.meta.service_model.service_name == 'dynamodb':
+        events.register('provide-client-params.dynamodb', _request_capacity)
+        events.register('after-call.dynamodb', _record_capacity)
+    return client
+
+
+def _metrics():
+    metrics = _current.get()
+    if metrics is None:
+        metrics = RequestMetrics()
+        _current.set(metrics)
+    return metrics
+
+
+def _record_call(model, **kwargs):
+    name = f"{model.service_model.service_name}.{model.name}"
+    metrics = _metrics()
+    with metrics.lock:
+        metrics.calls[name] += 1
+
+
+def _request_capacity(params, model, context, **kwargs):
+    if 'ReturnConsumedCapacity' in model.input_shape.members:
+        params.setdefault('ReturnConsumedCapacity', 'INDEXES')
+    # after-call only sees the response, so note how many items are written
+    if model.name == 'BatchWriteItem':
+        context['items_requested'] = sum(len(requests) for requests in params.get('RequestItems', {}).values())
+    elif model.name == 'TransactWriteItems':
+        context['items_requested'] = len(params.get('TransactItems', []))
+
+
+def _record_capacity(parsed, model, context, **kwargs):
+    if 'Error' in parsed:
+        return
+    operation = model.name
+    usage = Counter()
+
+    consumed = parsed.get('ConsumedCapacity') or []
+    for entry in consumed if isinstance(consumed, list) else [consumed]:
+        kind = 'read' if operation in READ_OPERATIONS else 'write'
+        usage[f'{kind}_units'] += entry.get('CapacityUnits', 0)
+        usage[f"{kind}_units#{entry.get('TableName')}"] += entry.get('CapacityUnits', 0)
+        for index_name, index in entry.get('GlobalSecondaryIndexes', {}).items():
+            usage[f"{kind}_units#{entry.get('TableName')}/{index_name}"] += index.get('CapacityUnits', 0)
+
+    if operation in ('Query', 'Scan'):
+        usage['items_read'] += parsed.get('Count', 0)
+    elif operation == 'GetItem':
+        usage['items_read'] += 1 if parsed.get('Item') else 0
+    elif operation in ('BatchGetItem', 'TransactGetItems'):
+        responses = parsed.get('Responses', {})
+        usage['items_read'] += (
+            sum(len(items) for items in responses.values()) if isinstance(responses, dict) else len(responses)
+        )
+    elif operation in ('PutItem', 'UpdateItem', 'DeleteItem'):
+        usage['items_written'] += 1
+    elif operation == 'BatchWriteItem':
+        unprocessed = sum(len(requests) for requests in (parsed.get('UnprocessedItems') or {}).values())
+        usage['items_written'] += context.get('items_requested', 0) - unprocessed
+    elif operation == 'TransactWriteItems':
+        usage['items_written'] += context.get('items_requested', 0)
+
+    metrics = _metrics()
+    with metrics.lock:
+        metrics.capacity.update(usage)
+
+
+def begin_request():
+    """Start counting a new request in the current context"""
+    _current.set(RequestMetrics())
+
+
+def remote_calls():
+    """Snapshot of the calls made so far in this invocation"""
+    metrics = _metrics()
+    with metrics.lock:
+        return dict(metrics.calls)
+
+
+def consumed_capacity():
+    """Snapshot of the DynamoDB units and item counts of this invocation"""
+    metrics = _metrics()
+    with metrics.lock:
+        return dict(metrics.capacity)
+
+
+def capacity_by_table(capacity):
+    """{'read': {table or table/index: units}, 'write': {...}}"""
+    by_table = {'read': {}, 'write': {}}
+    for key, units in capacity.items():
+        if '#' in key:
+            kind, table = key.split('#', 1)
+            by_table[kind.split('_')[0]][table] = round(units, 2)
+    return by_table
+
+
+def emit_request_metrics(route, method, status_code=None):
+    """Print one CloudWatch embedded metric format record for this invocation.
+
+    Dimensions are route and method; per-table and per-index units are
+    included as properties so they can be queried in Logs Insights.
+    """
+    calls = remote_calls()
+    capacity = consumed_capacity()
+    metrics = {
+        'ReadCapacityUnits': round(capacity.get('read_units', 0), 2),
+        'WriteCapacityUnits': round(capacity.get('write_units', 0), 2),
+        'ItemsRead': capacity.get('items_read', 0),
+        'ItemsWritten': capacity.get('items_written', 0),
+        'DynamoDBCalls': sum(count for name, count in calls.items() if name.startswith('dynamodb.')),
+        'CognitoCalls': sum(count for name, count in calls.items() if name.startswith('cognito-idp.')),
+        'RemoteCalls': sum(calls.values())
+    }
+    record = {
+        '_aws': {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [{
+                'Namespace': METRICS_NAMESPACE,
+                'Dimensions': [['Route', 'Method']],
+                'Metrics': [{'Name': name, 'Unit': 'Count'} for name in metrics]
+            }]
+        },
+        'Route': route,
+        'Method': method,
+        'StatusCode': status_code,
+        **metrics,
+        'Calls': calls,
+        'CapacityByTable': capacity_by_table(capacity)
+    }
+    print(json.dumps(record))
+    return record
@@ -0,0 +1,71 @@
+import re
+import json
+import base64
+
+# Page size bounds for opt-in pagination
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+_FIELD_NAME = re.compile(r'^[A-Za-z0-9_]+$')
+
+
+class PaginationError(ValueError):
+    """Raised for malformed limit, cursor or fields parameters (maps to a 400)"""
+
+
+def encode_cursor(last_evaluated_key, scope):
+    """Wrap a low-level LastEvaluatedKey in an opaque, URL-safe token.
+
+    The scope (e.g. the project id) is embedded so a cursor from one listing
+    can't be replayed against another.
+    """
+    if not last_evaluated_key:
+        return None
+    payload = json.dumps({'s': scope, 'k': last_evaluated_key}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, scope):
+    """Turn a cursor back into an ExclusiveStartKey (None for the first page)"""
+    if not cursor:
+        return None
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except (ValueError, TypeError):
+        raise PaginationError('Invalid cursor')
+    if not isinstance(payload, dict) or payload.get('s') != scope or not isinstance(payload.get('k'), dict):
+        raise PaginationError('Cursor does not belong to this listing')
+    return payload['k']
+
+
+def parse_limit(value, default=DEFAULT_PAGE_SIZE):
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        raise PaginationError('limit must be an integer')
+    if limit < 1:
+        raise PaginationError('limit must be positive')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_fields(value):
+    """Split a comma separated fields= parameter into attribute names"""
+    if not value:
+        return None
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    for field in fields:
+        if not _FIELD_NAME.match(field):
+            raise PaginationError(f'Invalid field name: {field}')
+    return fields
+
+
+def projection_params(fields):
+    """Build ProjectionExpression/ExpressionAttributeNames for a list of fields"""
+    names = {f'#f{i}': field for i, field in enumerate(fields)}
+    return {
+        'ProjectionExpression': ', '.join(names),
+        'ExpressionAttributeNames': names
+    }
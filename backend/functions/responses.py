@@ -0,0 +1,157 @@
+import io
+import os
+import gzip
+import json
+import base64
+import hashlib
+from decimal import Decimal
+
+# Bodies shorter than this are not worth compressing
+GZIP_MIN_BYTES = int(os.environ.get('GZIP_MIN_BYTES', '1024'))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+
+
+class StreamedList:
+    """A JSON array whose items come from an iterator (e.g. query pages).
+
+    Handlers put one in a response body instead of a list; the items are
+    consumed once, while encode_response() writes the body.
+    """
+
+    __slots__ = ('_items',)
+
+    def __init__(self, items):
+        self._items = items
+
+    def __iter__(self):
+        return iter(self._items)
+
+
+class NDJSONStream(StreamedList):
+    """A newline-delimited JSON body: one JSON document per item and line"""
+
+    __slots__ = ()
+
+
+class ResponseEncoder(json.JSONEncoder):
+    """JSON encoder for DynamoDB items: Decimal numbers and sets"""
+
+    def default(self, value):
+        if isinstance(value, Decimal):
+            return int(value) if value == value.to_integral_value() else float(value)
+        if isinstance(value, (set, frozenset)):
+            return sorted(value)
+        if isinstance(value, StreamedList):
+            return list(value)
+        return super().default(value)
+
+
+_encoder = ResponseEncoder(separators=(',', ':'))
+_etag_encoder = ResponseEncoder(separators=(',', ':'), sort_keys=True)
+
+
+def dumps(value):
+    return _encoder.encode(value)
+
+
+def iter_json(value):
+    """Yield the JSON text of a body in chunks, one per StreamedList item"""
+    if isinstance(value, NDJSONStream):
+        for item in value:
+            yield _encoder.encode(item) + '\n'
+    elif isinstance(value, StreamedList):
+        yield '['
+        for index, item in enumerate(value):
+            yield (',' if index else '') + _encoder.encode(item)
+        yield ']'
+    elif isinstance(value, dict) and any(isinstance(item, StreamedList) for item in value.values()):
+        yield '{'
+        for index, (key, item) in enumerate(value.items()):
+            yield (',' if index else '') + _encoder.encode(str(key)) + ':'
+            yield from iter_json(item)
+        yield '}'
+    else:
+        yield _encoder.encode(value)
+
+
+def accepts_gzip(request):
+    """True when the request's Accept-Encoding allows gzip"""
+    accept = request.header('Accept-Encoding')
+    for coding in (accept or '').split(','):
+        name, _, params = coding.partition(';')
+        if name.strip().lower() not in ('gzip', '*'):
+            continue
+        quality = params.strip()
+        if quality.startswith('q='):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
+
+
+def make_etag(*parts):
+    """Weak ETag over the values a response was built from.
+
+    Weak because the same data may be sent gzip-compressed or not.
+    """
+    digest = hashlib.sha1(_etag_encoder.encode(parts).encode('utf-8')).hexdigest()[:24]
+    return f'W/"{digest}"'
+
+
+def _opaque_tag(tag):
+    """An entity tag without its weak W/ prefix"""
+    return tag[2:] if tag.startswith('W/') else tag
+
+
+def etag_matches(request, etag):
+    """True when the request's If-None-Match lists `etag` (weak comparison)"""
+    header = request.header('If-None-Match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    opaque = _opaque_tag(etag)
+    return any(_opaque_tag(tag.strip()) == opaque for tag in header.split(','))
+
+
+def cache_headers(etag):
+    """Let browsers keep the response but revalidate it on every request"""
+    return {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+
+def encode_response(response, gzip_ok=False):
+    """Encode a handler response body for API Gateway.
+
+    String bodies pass through (compressed when large enough). Any other body
+    is encoded here; with gzip the chunks are compressed as they are produced,
+    so neither the full item list nor the uncompressed document is held in
+    memory at once.
+    """
+    body = response.get('body')
+    if body is None:
+        return response
+    if isinstance(body, str):
+        if not gzip_ok or len(body) < GZIP_MIN_BYTES:
+            return response
+        chunks = [body]
+    else:
+        chunks = iter_json(body)
+        if not gzip_ok:
+            response['body'] = ''.join(chunks)
+            return response
+
+    buffer = io.BytesIO()
+    with gzip.open(buffer, 'wt', compresslevel=GZIP_LEVEL, encoding='utf-8') as stream:
+        for chunk in chunks:
+            stream.write(chunk)
+
+    response['body'] = base64.b64encode(buffer.getvalue()).decode('ascii')
+    response['isBase64Encoded'] = True
+    response['headers'] = {
+        **response.get('headers', {}),
+        'Content-Encoding': 'gzip',
+        'Vary': 'Accept-Encoding'
+    }
+    return response
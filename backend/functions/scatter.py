@@ -0,0 +1,139 @@
+import os
+import time
+import random
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from boto3.dynamodb.types import TypeDeserializer
+from functions.batch_writes import BATCH_WRITE_MAX_ATTEMPTS
+
+# BatchGetItem accepts at most 100 keys per call
+BATCH_GET_LIMIT = 100
+
+# Fan-out settings
+FANOUT_MAX_WORKERS = int(os.environ.get('FANOUT_MAX_WORKERS', '8'))
+FANOUT_BUDGET_SECONDS = float(os.environ.get('FANOUT_BUDGET_SECONDS', '20'))
+
+_deserializer = TypeDeserializer()
+
+# UnprocessedKeys are retried as often as UnprocessedItems
+BATCH_GET_MAX_ATTEMPTS = BATCH_WRITE_MAX_ATTEMPTS
+
+# The pool is module level so warm invocations reuse its threads
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class UnprocessedKeysError(Exception):
+    """Raised when DynamoDB keeps returning UnprocessedKeys after every retry"""
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=FANOUT_MAX_WORKERS,
+                thread_name_prefix='fanout'
+            )
+        return _executor
+
+
+def deserialize_item(item):
+    return {key: _deserializer.deserialize(value) for key, value in item.items()}
+
+
+def query_pages(client, **kwargs):
+    """Yield each page of a low-level DynamoDB query as a list of deserialized items"""
+    while True:
+        response = client.query(**kwargs)
+        yield [deserialize_item(item) for item in response.get('Items', [])]
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return
+        kwargs['ExclusiveStartKey'] = last_key
+
+
+def query_all_pages(client, **kwargs):
+    """Yield every item of a low-level DynamoDB query, following LastEvaluatedKey.
+
+    Uses the thread-safe low-level client so it can run inside the fan-out
+    pool; items are deserialized to the same shape the resource layer returns.
+    """
+    for page in query_pages(client, **kwargs):
+        yield from page
+
+
+def batch_get_items(client, table_name, keys, projection=None):
+    """Fetch many items by primary key with BatchGetItem.
+
+    Keys are plain dicts of strings; chunks of 100 are sent per call and
+    UnprocessedKeys are retried with jittered exponential backoff; if a chunk
+    still has leftovers after BATCH_GET_MAX_ATTEMPTS the error is raised.
+    Returns the deserialized items in no particular order.
+    """
+    items = []
+    unique_keys = list({tuple(sorted(key.items())): key for key in keys}.values())
+    for start in range(0, len(unique_keys), BATCH_GET_LIMIT):
+        request = {'Keys': [
+            {name: {'S': value} for name, value in key.items()}
+            for key in unique_keys[start:start + BATCH_GET_LIMIT]
+        ]}
+        if projection:
+            request['ProjectionExpression'] = projection
+        pending = {table_name: request}
+        for attempt in range(BATCH_GET_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(min(0.05 * 2 ** attempt, 1.0) * random.random())
+            response = client.batch_get_item(RequestItems=pending)
+            items.extend(
+                deserialize_item(item)
+                for item in response.get('Responses', {}).get(table_name, [])
+            )
+            pending = response.get('UnprocessedKeys') or None
+            if not pending:
+                break
+        else:
+            raise UnprocessedKeysError(
+                f"{len(pending[table_name]['Keys'])} reads from {table_name} still unprocessed"
+            )
+    return items
+
+
+def scatter_gather(keys, fetch, budget_seconds=None):
+    """Run fetch(key) for every key on the shared pool and merge the results.
+
+    Results are merged in completion order. Keys whose fetch has not finished
+    when the latency budget runs out are returned as incomplete, so one slow
+    partition can't hold the whole response past the budget.
+    Returns (merged_items, incomplete_keys).
+    """
+    keys = list(dict.fromkeys(keys))
+    if budget_seconds is None:
+        budget_seconds = FANOUT_BUDGET_SECONDS
+    if not keys:
+        return [], []
+
+    executor = get_executor()
+    # Each fetch runs in a copy of the caller's context, so its calls are
+    # counted (and its point reads loaded) for the caller's request
+    futures = {
+        executor.submit(contextvars.copy_context().run, lambda k=key: list(fetch(k))): key for key in keys
+    }
+
+    merged = []
+    done = set()
+    deadline = time.monotonic() + budget_seconds
+    try:
+        for future in as_completed(futures, timeout=max(deadline - time.monotonic(), 0)):
+            merged.extend(future.result())
+            done.add(futures[future])
+    except FuturesTimeout:
+        for future in futures:
+            if futures[future] not in done:
+                future.cancel()
+
+    incomplete = [key for key in keys if key not in done]
+    if incomplete:
+        print(f"Fan-out budget of {budget_seconds}s exceeded; incomplete: {incomplete}")
+    return merged, incomplete
@@ -0,0 +1,122 @@
+import re
+import math
+from collections import Counter
+
+# Inverted index over task names and descriptions, one item per
+# (project_id, posting); see posting_key() for the layout
+SEARCH_TABLE = 'TaskSearch'
+
+# A name hit counts as much as this many description hits
+NAME_WEIGHT = 3
+MAX_WEIGHT = 9999
+
+# Tokens shorter than this are not indexed; longer ones are truncated
+MIN_TOKEN_LENGTH = 2
+MAX_TOKEN_LENGTH = 32
+
+# Query limits: terms considered, and postings read per term and project.
+# Postings are stored best-first, so a term matching more tasks than the
+# cap keeps its highest-weight ones
+MAX_QUERY_TERMS = 8
+MAX_POSTINGS_PER_TERM = 1000
+
+# A prefix match of the last query term ranks below a whole-token match
+PREFIX_FACTOR = 0.5
+
+STOPWORDS = frozenset('a an and are as at be by for from in is it of on or the to with'.split())
+
+_WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Lower-cased index tokens of a text, in order (duplicates kept)"""
+    return [
+        word[:MAX_TOKEN_LENGTH] for word in _WORD.findall((text or '').lower())
+        if len(word) >= MIN_TOKEN_LENGTH and word not in STOPWORDS
+    ]
+
+
+def task_postings(task):
+    """{token: weight} of one task; a deleted task (None) has none"""
+    if not task:
+        return {}
+    weights = Counter()
+    for token in tokenize(task.get('name')):
+        weights[token] += NAME_WEIGHT
+    for token in tokenize(task.get('description')):
+        weights[token] += 1
+    return {token: min(weight, MAX_WEIGHT) for token, weight in weights.items()}
+
+
+def posting_changes(transitions):
+    """Index changes for (old_task, new_task) pairs; either side may be None.
+
+    Returns (puts, deletes), both {(task_id, token): weight}. A token whose
+    weight changed is in both: the old posting goes, the new one is written.
+    """
+    puts, deletes = {}, {}
+    for old_task, new_task in transitions:
+        task_id = (new_task or old_task)['task_id']
+        old, new = task_postings(old_task), task_postings(new_task)
+        for token, weight in old.items():
+            if new.get(token) != weight:
+                deletes[(task_id, token)] = weight
+        for token, weight in new.items():
+            if old.get(token) != weight:
+                puts[(task_id, token)] = weight
+    return puts, deletes
+
+
+def posting_key(token, weight, task_id):
+    """<token>#<inverted weight>#<task_id>: a term's postings sort best-first"""
+    return f'{token}#{MAX_WEIGHT - weight:04d}#{task_id}'
+
+
+def parse_posting(posting):
+    """(token, weight, task_id) of a posting_key()"""
+    token, inverted, task_id = posting.split('#', 2)
+    return token, MAX_WEIGHT - int(inverted), task_id
+
+
+def parse_query(text):
+    """Distinct query terms, and whether the last one is matched as a prefix.
+
+    The last word is a prefix while it is being typed, i.e. unless the
+    query ends with a space.
+    """
+    text = text or ''
+    terms = list(dict.fromkeys(tokenize(text)))[:MAX_QUERY_TERMS]
+    return terms, bool(terms) and not text[-1:].isspace()
+
+
+def rank(postings, terms, prefix):
+    """[((project_id, task_id), score)] of tasks matching every term, best first.
+
+    postings are (project_id, task_id, token, weight) tuples read for the
+    terms. A term's contribution is the task's weight for it scaled by how
+    rare the term is among the candidates (idf).
+    """
+    matches = {}
+    for project_id, task_id, token, weight in postings:
+        for index, term in enumerate(terms):
+            if token == term:
+                score = weight
+            elif prefix and index == len(terms) - 1 and token.startswith(term):
+                score = weight * PREFIX_FACTOR
+            else:
+                continue
+            matched = matches.setdefault((project_id, task_id), {})
+            matched[term] = max(matched.get(term, 0), score)
+
+    candidates = len(matches)
+    document_frequency = Counter(term for matched in matches.values() for term in matched)
+    ranked = []
+    for key, matched in matches.items():
+        if len(matched) < len(terms):
+            continue
+        score = sum(
+            weight * math.log(1 + candidates / document_frequency[term]) for term, weight in matched.items()
+        )
+        ranked.append((key, score))
+    ranked.sort(key=lambda entry: (-entry[1], entry[0]))
+    return ranked
@@ -0,0 +1,351 @@
+import os
+import threading
+
+# Which engine backs the API: 'dynamodb' (default, AWS) or 'sqlite'
+# (self-hosted; SQLITE_PATH selects the database file)
+STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'dynamodb')
+
+# Status of projects being torn down; they are hidden from listings
+PROJECT_DELETING = 'DELETING'
+
+# Error of task writes to a project that is being torn down (or gone)
+PROJECT_DELETING_ERROR = 'Project does not exist or is being deleted'
+
+# Membership statuses allowed to read and write a project's data
+MEMBER_STATUSES = ('OWNER', 'ACCEPTED')
+
+
+class WriteRejected(Exception):
+    """An authorized write did not happen because one of its conditions failed.
+
+    reason is 'forbidden' (the caller's membership), 'not_found' (the target
+    item), 'exists' (an item that must not exist yet), 'conflict' (the
+    target kept changing concurrently) or 'deleting' (the project is being
+    deleted, or is gone).
+    """
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class Resolved:
+    """Handle for a value that is already known (same get() as loader handles)"""
+
+    __slots__ = ('_value',)
+
+    def __init__(self, value):
+        self._value = value
+
+    def get(self):
+        return self._value
+
+
+class Mapped:
+    """Handle whose get() applies func to another handle's value"""
+
+    __slots__ = ('_handle', '_func')
+
+    def __init__(self, handle, func):
+        self._handle = handle
+        self._func = func
+
+    def get(self):
+        return self._func(self._handle.get())
+
+
+def task_projection(fields):
+    """Task attributes to read for a field selection (None: all of them).
+
+    Keys are always projected; enrichment needs the user id attributes.
+    """
+    if not fields:
+        return None
+    projected = set(fields) | {'task_id', 'project_id'}
+    if 'creator_username' in fields:
+        projected.add('user_id')
+    if 'assignee_username' in fields:
+        projected.add('assigned_to')
+    return sorted(projected)
+
+
+class Storage:
+    """Data access used by the request handlers.
+
+    Items are plain dicts shaped like the DynamoDB items (numbers may be
+    Decimal). load_* methods return handles whose get() gives the item or
+    None, so engines that batch point reads can queue several before the
+    first get(). Methods returning (items, incomplete) may skip projects
+    that missed a latency budget and list them in incomplete.
+    """
+
+    name = None
+
+    def begin_request(self):
+        """Drop request-scoped state (called before every API request)"""
+
+    # ----- members -----
+
+    def load_member(self, project_id, user_id):
+        raise NotImplementedError
+
+    def member_projects(self, user_id):
+        """OWNER and ACCEPTED membership rows of a user"""
+        raise NotImplementedError
+
+    def project_members(self, project_id):
+        """OWNER and ACCEPTED membership rows of a project"""
+        raise NotImplementedError
+
+    def pending_invites(self, user_id):
+        """PENDING membership rows of a user"""
+        raise NotImplementedError
+
+    def put_member(self, member):
+        raise NotImplementedError
+
+    def add_member(self, member):
+        """Insert a membership row unless one exists; returns whether it was added"""
+        raise NotImplementedError
+
+    def invite_member(self, invite):
+        """Insert a PENDING membership row and bump the project version, if
+        invite['invited_by'] owns the project and the invitee has no row yet;
+        raises WriteRejected ('forbidden', 'exists') otherwise
+        """
+        raise NotImplementedError
+
+    def set_member_status(self, project_id, user_id, status, changed_at):
+        raise NotImplementedError
+
+    def update_pending_invites(self, project_id, changes):
+        """SET the given attributes on a project's PENDING membership rows"""
+        raise NotImplementedError
+
+    # ----- projects -----
+
+    def create_project(self, project, owner_member):
+        raise NotImplementedError
+
+    def load_project(self, owner_id, project_id):
+        raise NotImplementedError
+
+    def find_project(self, project_id):
+        """A project record by id alone, or None"""
+        raise NotImplementedError
+
+    def project_ids(self):
+        """Yield the id of every project (background jobs)"""
+        raise NotImplementedError
+
+    def load_projects(self, project_ids):
+        """Projects (with a 'members' list) in the given order; returns (projects, incomplete).
+
+        Projects that are being deleted or don't exist are left out.
+        """
+        raise NotImplementedError
+
+    def update_project(self, project_id, member_id, changes):
+        """SET the given attributes and bump the project version, if member_id
+        is a member and the project exists; raises WriteRejected ('forbidden',
+        'not_found') otherwise
+        """
+        raise NotImplementedError
+
+    def mark_project_deleting(self, owner_id, project_id, status, deleting_at):
+        """Set the project's status unless the record is already gone"""
+        raise NotImplementedError
+
+    def delete_project_data(self, project_id, owner_id, deadline=None):
+        """Remove a project's members, tasks, counters, search postings and
+        record, the owner's membership last. Idempotent; returns False if
+        `deadline` (time.monotonic) passed before it finished.
+        """
+        raise NotImplementedError
+
+    # ----- tasks -----
+
+    def load_task(self, task_id, project_id):
+        raise NotImplementedError
+
+    def put_task(self, task):
+        """Write a new task; its counters and the project version change in
+        the same transaction (as for every task write below but put_tasks).
+        Raises WriteRejected('deleting') if the project is being deleted.
+        """
+        raise NotImplementedError
+
+    def put_tasks(self, tasks):
+        """Write many new tasks without membership checks or counters (bulk import)"""
+        raise NotImplementedError
+
+    def update_task(self, task_id, project_id, changes, member_id):
+        """SET the given attributes if member_id is a member and the task
+        exists; returns the task as it was before. Raises WriteRejected
+        ('forbidden', 'not_found', 'conflict') otherwise.
+        """
+        raise NotImplementedError
+
+    def delete_task(self, task_id, project_id, member_id):
+        """Delete the task if member_id is a member and the task exists;
+        returns the deleted task. Raises WriteRejected like update_task().
+        """
+        raise NotImplementedError
+
+    def write_tasks(self, project_id, operations, results):
+        """Apply (index, op, payload, old_task) task writes of one project.
+
+        op is 'create' (payload: task), 'update' (payload: (task_id, changes))
+        or 'delete' (payload: task_id); old_task is the task as the caller
+        read it (None for creates), for the counters. Each write either
+        happens or sets results[index] to a 404/409 error (409 with
+        PROJECT_DELETING_ERROR once the project is being deleted, or when
+        the task changed after old_task was read); successful writes get
+        statusCode 200.
+        """
+        raise NotImplementedError
+
+    def remove_archived_tasks(self, project_id, tasks):
+        """Delete these tasks from the live table, each only if its
+        updated_at is unchanged; returns the ones deleted
+        """
+        raise NotImplementedError
+
+    def task_pages(self, project_id, statuses=None, fields=None):
+        """Yield a project's tasks page by page (lists)"""
+        raise NotImplementedError
+
+    def task_page(self, project_id, statuses, fields, limit, start_key=None):
+        """One page of a project's tasks; returns (tasks, last_key or None)"""
+        raise NotImplementedError
+
+    def user_task_pages(self, user_id, role, statuses=None, fields=None):
+        """Yield the tasks a user is assigned to (role 'assigned') or created
+        (role 'created'), across all projects, page by page
+        """
+        raise NotImplementedError
+
+    def user_task_page(self, user_id, role, statuses, fields, limit, start_key=None):
+        """One page of user_task_pages(); returns (tasks, last_key or None).
+        With statuses a page may be short, or empty, before the last one.
+        """
+        raise NotImplementedError
+
+    def tasks_for_projects(self, project_ids, statuses=None, fields=None):
+        """Every task of several projects; returns (tasks, incomplete)"""
+        raise NotImplementedError
+
+    def task_changes(self, project_ids, since_key):
+        """Tasks updated after since_key and task/project tombstones of these
+        projects; returns ([('task' | 'deleted', item)], incomplete)
+        """
+        raise NotImplementedError
+
+    # ----- tombstones -----
+
+    def record_tombstones(self, tombstones):
+        raise NotImplementedError
+
+    def tombstones(self, scope, since_key):
+        raise NotImplementedError
+
+    # ----- counters -----
+
+    def apply_stat_deltas(self, project_id, deltas):
+        raise NotImplementedError
+
+    def stat_counters(self, project_id):
+        """{stat_key: count} of every counter of a project"""
+        raise NotImplementedError
+
+    def project_stats(self, project_ids, days):
+        """read_project_stats() summaries of several projects; returns (summaries, incomplete)"""
+        raise NotImplementedError
+
+    def load_project_version(self, project_id):
+        """Handle resolving to the project's version number (0 if never written)"""
+        raise NotImplementedError
+
+    # ----- search index -----
+
+    def write_postings(self, project_id, puts, deletes):
+        """Apply search.posting_changes() output: deletes first, then puts"""
+        raise NotImplementedError
+
+    def search_postings(self, project_ids, terms, prefix):
+        """Postings of the query terms (the last one by prefix if `prefix`),
+        at most search.MAX_POSTINGS_PER_TERM per term and project, best first;
+        returns ([(project_id, task_id, token, weight)], incomplete)
+        """
+        raise NotImplementedError
+
+    def project_postings(self, project_id):
+        """{(task_id, token): weight} of every posting of a project"""
+        raise NotImplementedError
+
+    # ----- activity log -----
+
+    def append_activity(self, events):
+        """Store activity.activity_event() items"""
+        raise NotImplementedError
+
+    def activity_page(self, project_id, limit, start_key=None):
+        """A project's events newest first, within the retention period;
+        returns (events, last_key or None)
+        """
+        raise NotImplementedError
+
+    # ----- users -----
+
+    def read_usernames(self, user_ids):
+        """{user_id: username} for the users the local directory knows"""
+        raise NotImplementedError
+
+    def write_usernames(self, usernames):
+        raise NotImplementedError
+
+    def lookup_username(self, user_id):
+        """Authoritative lookup for a user the local directory doesn't know, or None"""
+        raise NotImplementedError
+
+    def search_users(self, prefix, limit):
+        """[{'user_id', 'username'}] whose username starts with prefix"""
+        raise NotImplementedError
+
+
+_storage = None
+_lock = threading.Lock()
+
+
+def get_storage():
+    """The process-wide storage engine selected by STORAGE_BACKEND"""
+    global _storage
+    if _storage is None:
+        with _lock:
+            if _storage is None:
+                if STORAGE_BACKEND == 'sqlite':
+                    from functions.storage_sqlite import SQLiteStorage
+                    _storage = SQLiteStorage(os.environ.get('SQLITE_PATH', 'task-manager.db'))
+                elif STORAGE_BACKEND == 'dynamodb':
+                    from functions.storage_dynamodb import DynamoDBStorage
+                    _storage = DynamoDBStorage()
+                else:
+                    raise ValueError(f'Unknown STORAGE_BACKEND: {STORAGE_BACKEND}')
+    return _storage
+
+
+def use_storage(storage):
+    """Replace the storage engine (benchmarks, self-hosted servers)"""
+    global _storage
+    with _lock:
+        _storage = storage
+
+
+class LazyStorage:
+    """Module-level stand-in for the storage engine, resolved on each use"""
+
+    def __getattr__(self, attr):
+        return getattr(get_storage(), attr)
+
+
+storage = LazyStorage()
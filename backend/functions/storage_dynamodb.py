@@ -0,0 +1,1029 @@
+import os
+import time
+from contextvars import ContextVar
+from botocore.exceptions import ClientError
+from functions.activity import (
+    ACTIVITY_SCAN_DAYS, ACTIVITY_TABLE, DAY_INDEX, bucket_key, day_index_items, timeline_days
+)
+from functions.analytics import (
+    STATS_TABLE, VERSION_KEY, apply_stat_deltas, read_project_stats, stat_updates, task_stat_deltas,
+    transition_deltas
+)
+from functions.aws import LazyClient, LazyTable
+from functions.batch_writes import (
+    UnprocessedItemsError, batch_write, delete_request, put_request, serialize_item
+)
+from functions.loader import RequestLoader
+from functions.pagination import projection_params
+from functions.scatter import (
+    UnprocessedKeysError, batch_get_items, deserialize_item, query_all_pages, query_pages, scatter_gather
+)
+from functions.search import MAX_POSTINGS_PER_TERM, SEARCH_TABLE, parse_posting, posting_key
+from functions.storage import (
+    MEMBER_STATUSES, PROJECT_DELETING, PROJECT_DELETING_ERROR, Mapped, Storage, WriteRejected, task_projection
+)
+
+# TransactWriteItems takes at most 100 items
+TRANSACT_LIMIT = 100
+
+# write_tasks() result error for a task that changed after the caller read it
+TASK_CHANGED_ERROR = 'Task was changed concurrently, please retry'
+
+# Authorized task writes re-read the task this many times when it keeps
+# changing between the read and the transaction
+TASK_WRITE_ATTEMPTS = 3
+
+# Persistent sub -> username mirror
+USER_DIRECTORY_TABLE = os.environ.get('USER_DIRECTORY_TABLE', 'UserDirectory')
+USER_POOL_ID = os.environ.get('COGNITO_USER_POOLID')
+
+
+def task_query_params(table_name, project_id, statuses=None, fields=None):
+    """Low-level query parameters for a project's tasks.
+
+    A single status uses the project-status-index so only matching tasks are
+    read; several statuses fall back to a filter on the project-id-index.
+    """
+    names = {}
+    values = {':project_id': {'S': project_id}}
+    params = {'TableName': table_name}
+
+    if statuses and len(statuses) == 1:
+        params['IndexName'] = 'project-status-index'
+        params['KeyConditionExpression'] = 'project_id = :project_id AND #status = :status'
+        names['#status'] = 'status'
+        values[':status'] = {'S': statuses[0]}
+    else:
+        params['IndexName'] = 'project-id-index'
+        params['KeyConditionExpression'] = 'project_id = :project_id'
+        if statuses:
+            placeholders = []
+            for i, status in enumerate(statuses):
+                placeholders.append(f':status{i}')
+                values[f':status{i}'] = {'S': status}
+            params['FilterExpression'] = f"#status IN ({', '.join(placeholders)})"
+            names['#status'] = 'status'
+
+    projected = task_projection(fields)
+    if projected:
+        projection = projection_params(projected)
+        params['ProjectionExpression'] = projection['ProjectionExpression']
+        names.update(projection['ExpressionAttributeNames'])
+
+    params['ExpressionAttributeValues'] = values
+    if names:
+        params['ExpressionAttributeNames'] = names
+    return params
+
+
+# Per-user task indexes: role -> (index, hash key attribute)
+USER_TASK_INDEXES = {
+    'assigned': ('assigned-tasks-index', 'assigned_to'),
+    'created': ('user_id-index', 'user_id')
+}
+
+
+def user_task_query_params(table_name, user_id, role, statuses=None, fields=None):
+    """Low-level query parameters for a user's tasks on a per-user task index.
+
+    Only the user's own tasks are read. The indexes have no sort key, so a
+    status filter is a FilterExpression over them: a filtered read costs as
+    much as reading all of the user's tasks, however few match. That stays
+    bounded by what one user is assigned to or created, not by the size of
+    their projects; a status-keyed index would be needed if it grew large.
+    """
+    index_name, key_name = USER_TASK_INDEXES[role]
+    names = {'#user': key_name}
+    values = {':user_id': {'S': user_id}}
+    params = {
+        'TableName': table_name,
+        'IndexName': index_name,
+        'KeyConditionExpression': '#user = :user_id'
+    }
+    if statuses:
+        placeholders = []
+        for i, status in enumerate(statuses):
+            placeholders.append(f':status{i}')
+            values[f':status{i}'] = {'S': status}
+        params['FilterExpression'] = f"#status IN ({', '.join(placeholders)})"
+        names['#status'] = 'status'
+
+    projected = task_projection(fields)
+    if projected:
+        projection = projection_params(projected)
+        params['ProjectionExpression'] = projection['ProjectionExpression']
+        names.update(projection['ExpressionAttributeNames'])
+
+    params['ExpressionAttributeValues'] = values
+    params['ExpressionAttributeNames'] = names
+    return params
+
+
+def version_bump(project_id):
+    """Transaction item that ADDs 1 to the project version (the ETag counter)"""
+    return {'Update': {
+        'TableName': STATS_TABLE,
+        'Key': serialize_item({'project_id': project_id, 'stat_key': VERSION_KEY}),
+        'UpdateExpression': 'ADD #count :one',
+        'ExpressionAttributeNames': {'#count': 'count'},
+        'ExpressionAttributeValues': {':one': {'N': '1'}}
+    }}
+
+
+def transaction_chunks(transact_items):
+    """Split (index, item, (old_task, new_task)) entries into lists whose
+    task items, counter updates, version bump and project check fit in one
+    TransactWriteItems
+    """
+    chunk, stat_keys = [], set()
+    for entry in transact_items:
+        keys = set(task_stat_deltas(*entry[2]))
+        # The tasks, their distinct counters, the version and the project
+        # check, with the new entry
+        if chunk and len(chunk) + 1 + len(stat_keys | keys) + 2 > TRANSACT_LIMIT:
+            yield chunk
+            chunk, stat_keys = [], set()
+        chunk.append(entry)
+        stat_keys |= keys
+    if chunk:
+        yield chunk
+
+
+def task_guard(old_task):
+    """Condition that the task is still as it was read (updated_at changes on every write)"""
+    if old_task is None:
+        return 'attribute_exists(task_id)', {}
+    if old_task.get('updated_at') is None:
+        return 'attribute_exists(task_id) AND attribute_not_exists(updated_at)', {}
+    return 'updated_at = :seen', serialize_item({':seen': old_task['updated_at']})
+
+
+def set_expression(changes):
+    """UpdateExpression, names and (serialized) values that SET the given attributes"""
+    update_expr = []
+    expr_names = {}
+    expr_values = {}
+    for i, (key, value) in enumerate(changes.items()):
+        update_expr.append(f'#a{i} = :v{i}')
+        expr_names[f'#a{i}'] = key
+        expr_values[f':v{i}'] = value
+    return 'SET ' + ', '.join(update_expr), expr_names, serialize_item(expr_values)
+
+
+class DynamoDBStorage(Storage):
+    """DynamoDB tables for data, Cognito as the user directory of record.
+
+    Hot paths use the low-level client; point reads are coalesced into
+    BatchGetItem by a request-scoped loader, and multi-project reads fan out
+    on the scatter pool within its latency budget.
+    """
+
+    name = 'dynamodb'
+
+    def __init__(self):
+        # Clients are built on first use, see functions/aws.py
+        self.project_table = LazyTable('Projects')
+        self.task_table = LazyTable('Tasks')
+        self.project_members_table = LazyTable('ProjectMembers')
+        self.tombstone_table = LazyTable('Tombstones')
+        self.user_directory_table = LazyTable(USER_DIRECTORY_TABLE)
+        self.client = LazyClient('dynamodb')
+        self.cognito = LazyClient('cognito-idp')
+        # Request-scoped point-read loader, replaced by begin_request(); a
+        # context variable so concurrent requests each have their own
+        self._loader = ContextVar('request_loader', default=None)
+        # (bucket, day) entries this process already wrote to the activity
+        # day index; a warm container writes each one once
+        self.indexed_days = set()
+        # project_id -> owner's user_id, the key of the project record; a
+        # project's owner never changes
+        self.project_owners = {}
+
+    def begin_request(self):
+        self._loader.set(RequestLoader(self.client))
+
+    @property
+    def loader(self):
+        loader = self._loader.get()
+        if loader is None:
+            loader = RequestLoader(self.client)
+            self._loader.set(loader)
+        return loader
+
+    # ----- members -----
+
+    def load_member(self, project_id, user_id):
+        return self.loader.load(self.project_members_table.name, {'project_id': project_id, 'user_id': user_id})
+
+    def member_projects(self, user_id):
+        return list(query_all_pages(
+            self.client,
+            TableName=self.project_members_table.name,
+            IndexName='user-projects-index',
+            KeyConditionExpression='user_id = :user_id',
+            FilterExpression='#status IN (:owner, :member)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':user_id': {'S': user_id},
+                ':owner': {'S': 'OWNER'},
+                ':member': {'S': 'ACCEPTED'}
+            }
+        ))
+
+    def project_members(self, project_id):
+        return list(query_all_pages(
+            self.client,
+            TableName=self.project_members_table.name,
+            KeyConditionExpression='project_id = :project_id',
+            FilterExpression='#status IN (:owner, :member)',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':project_id': {'S': project_id},
+                ':owner': {'S': 'OWNER'},
+                ':member': {'S': 'ACCEPTED'}
+            }
+        ))
+
+    def pending_invites(self, user_id):
+        return list(query_all_pages(
+            self.client,
+            TableName=self.project_members_table.name,
+            IndexName='user-projects-index',
+            KeyConditionExpression='user_id = :user_id',
+            FilterExpression='#status = :status',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={
+                ':user_id': {'S': user_id},
+                ':status': {'S': 'PENDING'}
+            }
+        ))
+
+    def put_member(self, member):
+        self.client.put_item(TableName=self.project_members_table.name, Item=serialize_item(member))
+
+    def add_member(self, member):
+        try:
+            self.client.put_item(
+                TableName=self.project_members_table.name,
+                Item=serialize_item(member),
+                ConditionExpression='attribute_not_exists(project_id) AND attribute_not_exists(user_id)'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise e
+            return False
+        return True
+
+    def member_check(self, project_id, user_id, statuses=MEMBER_STATUSES):
+        """Transaction item that requires user_id to hold one of these statuses"""
+        values = {f':status{i}': status for i, status in enumerate(statuses)}
+        return {'ConditionCheck': {
+            'TableName': self.project_members_table.name,
+            'Key': serialize_item({'project_id': project_id, 'user_id': user_id}),
+            'ConditionExpression': f"#status IN ({', '.join(values)})",
+            'ExpressionAttributeNames': {'#status': 'status'},
+            'ExpressionAttributeValues': serialize_item(values)
+        }}
+
+    def _project_owner(self, project_id):
+        owner_id = self.project_owners.get(project_id)
+        if owner_id is None:
+            # The members table, unlike project-id-index, reads consistently,
+            # so a project created a moment ago is found
+            owners = query_all_pages(
+                self.client,
+                TableName=self.project_members_table.name,
+                KeyConditionExpression='project_id = :project_id',
+                FilterExpression='#status = :owner',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues=serialize_item({':project_id': project_id, ':owner': 'OWNER'}),
+                ConsistentRead=True
+            )
+            owner_id = next((owner['user_id'] for owner in owners), None)
+            if owner_id is not None:
+                self.project_owners[project_id] = owner_id
+        return owner_id
+
+    def project_check(self, project_id):
+        """Transaction item that requires the project record to exist and not
+        be DELETING; raises WriteRejected('deleting') if it has no owner left
+        """
+        owner_id = self._project_owner(project_id)
+        if owner_id is None:
+            raise WriteRejected('deleting')
+        return {'ConditionCheck': {
+            'TableName': self.project_table.name,
+            'Key': serialize_item({'user_id': owner_id, 'project_id': project_id}),
+            'ConditionExpression': 'attribute_exists(project_id) AND (attribute_not_exists(#status) OR #status <> :deleting)',
+            'ExpressionAttributeNames': {'#status': 'status'},
+            'ExpressionAttributeValues': serialize_item({':deleting': PROJECT_DELETING})
+        }}
+
+    def _authorized_write(self, transact_items, reasons):
+        """One transaction; the first failed condition raises WriteRejected(reasons[i])"""
+        try:
+            self.client.transact_write_items(TransactItems=transact_items)
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise e
+            for reason, cancelled in zip(reasons, e.response.get('CancellationReasons', [])):
+                if reason and cancelled.get('Code') == 'ConditionalCheckFailed':
+                    raise WriteRejected(reason)
+            raise e
+
+    def invite_member(self, invite):
+        # Owner check, insert and version bump in one transaction
+        self._authorized_write([
+            self.member_check(invite['project_id'], invite['invited_by'], ('OWNER',)),
+            {'Put': {
+                'TableName': self.project_members_table.name,
+                'Item': serialize_item(invite),
+                'ConditionExpression': 'attribute_not_exists(user_id)'
+            }},
+            version_bump(invite['project_id'])
+        ], ['forbidden', 'exists'])
+
+    def set_member_status(self, project_id, user_id, status, changed_at):
+        self.client.update_item(
+            TableName=self.project_members_table.name,
+            Key=serialize_item({'project_id': project_id, 'user_id': user_id}),
+            UpdateExpression='SET #status = :status, accepted_at = :time',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues=serialize_item({':status': status, ':time': changed_at})
+        )
+
+    def update_pending_invites(self, project_id, changes):
+        """One conditional update per invite, so an invite answered meanwhile stays as it is"""
+        update_expression, expr_names, expr_values = set_expression(changes)
+        invites = query_all_pages(
+            self.client,
+            TableName=self.project_members_table.name,
+            KeyConditionExpression='project_id = :project_id',
+            FilterExpression='#status = :pending',
+            ProjectionExpression='project_id, user_id',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':project_id': {'S': project_id}, ':pending': {'S': 'PENDING'}}
+        )
+        for key in invites:
+            try:
+                self.client.update_item(
+                    TableName=self.project_members_table.name,
+                    Key=serialize_item(key),
+                    UpdateExpression=update_expression,
+                    ConditionExpression='#status = :pending',
+                    ExpressionAttributeNames={**expr_names, '#status': 'status'},
+                    ExpressionAttributeValues={**expr_values, ':pending': {'S': 'PENDING'}}
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                    raise e
+
+    # ----- projects -----
+
+    def create_project(self, project, owner_member):
+        self.client.put_item(TableName=self.project_table.name, Item=serialize_item(project))
+        self.put_member(owner_member)
+
+    def load_project(self, owner_id, project_id):
+        return self.loader.load(self.project_table.name, {'user_id': owner_id, 'project_id': project_id})
+
+    def find_project(self, project_id):
+        response = self.client.query(
+            TableName=self.project_table.name,
+            IndexName='project-id-index',
+            KeyConditionExpression='project_id = :project_id',
+            ExpressionAttributeValues={':project_id': {'S': project_id}},
+            Limit=1
+        )
+        return deserialize_item(response['Items'][0]) if response.get('Items') else None
+
+    def project_ids(self):
+        params = {
+            'TableName': self.project_table.name,
+            'ProjectionExpression': 'project_id, #status',
+            'ExpressionAttributeNames': {'#status': 'status'}
+        }
+        while True:
+            response = self.client.scan(**params)
+            for item in response.get('Items', []):
+                project = deserialize_item(item)
+                if project.get('status') != PROJECT_DELETING:
+                    yield project['project_id']
+            if not response.get('LastEvaluatedKey'):
+                return
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def load_projects(self, project_ids):
+        """Load projects with their member lists using a fixed number of round trips.
+
+        Member lists are fetched concurrently; the OWNER row of each list gives the
+        Projects table key, so project records come back in one BatchGetItem per
+        100 projects.
+        """
+        member_rows, incomplete = scatter_gather(project_ids, self.project_members)
+
+        members_by_project = {}
+        owners = {}
+        for row in member_rows:
+            members_by_project.setdefault(row['project_id'], []).append(
+                {'user_id': row['user_id'], 'status': row['status']}
+            )
+            if row['status'] == 'OWNER':
+                owners[row['project_id']] = row['user_id']
+
+        records = self.loader.get_many(
+            self.project_table.name,
+            [{'user_id': owner_id, 'project_id': project_id} for project_id, owner_id in owners.items()]
+        )
+        records_by_id = {record['project_id']: record for record in records if record}
+
+        projects = []
+        for project_id in project_ids:
+            if project_id in incomplete:
+                continue
+            project = records_by_id.get(project_id)
+            if project is None and project_id not in owners:
+                # No OWNER member row; fall back to the project-id-index
+                project = self.find_project(project_id)
+            if project is None or project.get('status') == PROJECT_DELETING:
+                continue
+            project['members'] = members_by_project.get(project_id, [])
+            projects.append(project)
+        return projects, incomplete
+
+    def update_project(self, project_id, member_id, changes):
+        """Membership check, update and version bump in one transaction.
+
+        The Projects key holds the owner's id, so the update first assumes
+        the caller is the owner and looks the owner up only if that fails.
+        """
+        update_expression, expr_names, expr_values = set_expression(changes)
+        owner_id = member_id
+        while True:
+            try:
+                self._authorized_write([
+                    self.member_check(project_id, member_id),
+                    {'Update': {
+                        'TableName': self.project_table.name,
+                        'Key': serialize_item({'user_id': owner_id, 'project_id': project_id}),
+                        'UpdateExpression': update_expression,
+                        'ConditionExpression': 'attribute_exists(project_id)',
+                        'ExpressionAttributeNames': expr_names,
+                        'ExpressionAttributeValues': expr_values
+                    }},
+                    version_bump(project_id)
+                ], ['forbidden', 'not_found'])
+                return
+            except WriteRejected as e:
+                if e.reason != 'not_found' or owner_id != member_id:
+                    raise e
+            project = self.find_project(project_id)
+            if project is None or project['user_id'] == member_id:
+                raise WriteRejected('not_found')
+            owner_id = project['user_id']
+
+    def mark_project_deleting(self, owner_id, project_id, status, deleting_at):
+        try:
+            self.client.update_item(
+                TableName=self.project_table.name,
+                Key=serialize_item({'user_id': owner_id, 'project_id': project_id}),
+                UpdateExpression='SET #status = :deleting, deleting_at = :now',
+                ConditionExpression='attribute_exists(project_id)',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues=serialize_item({':deleting': status, ':now': deleting_at})
+            )
+        except ClientError as e:
+            # Record already gone: an earlier cascade got this far
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise e
+
+    def delete_project_data(self, project_id, owner_id, deadline=None):
+        """Delete with paged, batched writes; every step re-reads what is left"""
+        def out_of_time():
+            return deadline is not None and time.monotonic() >= deadline
+
+        # Other members first, so the project leaves their task listings quickly
+        for page in query_pages(
+            self.client,
+            TableName=self.project_members_table.name,
+            KeyConditionExpression='project_id = :project_id',
+            ProjectionExpression='project_id, user_id',
+            ExpressionAttributeValues={':project_id': {'S': project_id}}
+        ):
+            batch_write(self.client, self.project_members_table.name, [
+                delete_request(key) for key in page if key['user_id'] != owner_id
+            ])
+            if out_of_time():
+                return False
+
+        for page in query_pages(
+            self.client,
+            TableName=self.task_table.name,
+            IndexName='project-id-index',
+            KeyConditionExpression='project_id = :project_id',
+            ProjectionExpression='task_id, project_id',
+            ExpressionAttributeValues={':project_id': {'S': project_id}}
+        ):
+            batch_write(self.client, self.task_table.name, [delete_request(key) for key in page])
+            if out_of_time():
+                return False
+
+        for page in query_pages(
+            self.client,
+            TableName=STATS_TABLE,
+            KeyConditionExpression='project_id = :project_id',
+            ProjectionExpression='project_id, stat_key',
+            ExpressionAttributeValues={':project_id': {'S': project_id}}
+        ):
+            batch_write(self.client, STATS_TABLE, [delete_request(key) for key in page])
+            if out_of_time():
+                return False
+
+        for page in query_pages(
+            self.client,
+            TableName=SEARCH_TABLE,
+            KeyConditionExpression='project_id = :project_id',
+            ProjectionExpression='project_id, posting',
+            ExpressionAttributeValues={':project_id': {'S': project_id}}
+        ):
+            batch_write(self.client, SEARCH_TABLE, [delete_request(key) for key in page])
+            if out_of_time():
+                return False
+
+        # Finally delete the project and the owner's membership
+        key = serialize_item({'project_id': project_id, 'user_id': owner_id})
+        self.client.delete_item(TableName=self.project_table.name, Key=key)
+        self.client.delete_item(TableName=self.project_members_table.name, Key=key)
+        return True
+
+    # ----- tasks -----
+
+    def load_task(self, task_id, project_id):
+        return self.loader.load(self.task_table.name, {'task_id': task_id, 'project_id': project_id})
+
+    def put_task(self, task):
+        """The project check, the Put, its counters and the version bump in one transaction"""
+        self._authorized_write([
+            self.project_check(task['project_id']),
+            {'Put': {'TableName': self.task_table.name, 'Item': serialize_item(task)}},
+            *stat_updates(task['project_id'], transition_deltas([(None, task)]))
+        ], ['deleting'])
+
+    def put_tasks(self, tasks):
+        """BatchWriteItem chunks, unprocessed items retried by batch_write"""
+        batch_write(self.client, self.task_table.name, [put_request(task) for task in tasks])
+
+    def _read_task(self, task_id, project_id):
+        response = self.client.get_item(
+            TableName=self.task_table.name,
+            Key=serialize_item({'task_id': task_id, 'project_id': project_id}),
+            ConsistentRead=True
+        )
+        return deserialize_item(response['Item']) if response.get('Item') else None
+
+    def _authorized_task_write(self, task_id, project_id, member_id, write):
+        """Read the task, then run the membership check, write(old_task) and
+        the counter updates as one transaction guarded on the task being
+        unchanged since the read.
+
+        write(old_task) returns (transaction item, new task or None).
+        TransactWriteItems returns no old values, and the counters and search
+        index need the previous state, hence the consistent read first.
+        """
+        for _ in range(TASK_WRITE_ATTEMPTS):
+            old_task = self._read_task(task_id, project_id)
+            item, new_task = write(old_task)
+            try:
+                self._authorized_write(
+                    [
+                        self.member_check(project_id, member_id),
+                        item,
+                        *stat_updates(project_id, transition_deltas([(old_task, new_task)]))
+                    ],
+                    ['forbidden', 'conflict' if old_task else 'not_found']
+                )
+            except WriteRejected as e:
+                if e.reason == 'conflict':
+                    continue
+                raise e
+            return old_task
+        raise WriteRejected('conflict')
+
+    def update_task(self, task_id, project_id, changes, member_id):
+        update_expression, expr_names, expr_values = set_expression(changes)
+
+        def write(old_task):
+            condition, guard_values = task_guard(old_task)
+            return {'Update': {
+                'TableName': self.task_table.name,
+                'Key': serialize_item({'task_id': task_id, 'project_id': project_id}),
+                'UpdateExpression': update_expression,
+                'ConditionExpression': condition,
+                'ExpressionAttributeNames': expr_names,
+                'ExpressionAttributeValues': {**expr_values, **guard_values}
+            }}, {**old_task, **changes} if old_task else None
+        return self._authorized_task_write(task_id, project_id, member_id, write)
+
+    def delete_task(self, task_id, project_id, member_id):
+        def write(old_task):
+            condition, guard_values = task_guard(old_task)
+            delete = {
+                'TableName': self.task_table.name,
+                'Key': serialize_item({'task_id': task_id, 'project_id': project_id}),
+                'ConditionExpression': condition
+            }
+            if guard_values:
+                delete['ExpressionAttributeValues'] = guard_values
+            return {'Delete': delete}, None
+        return self._authorized_task_write(task_id, project_id, member_id, write)
+
+    def write_tasks(self, project_id, operations, results):
+        """TransactWriteItems of up to 100 items, sharing the transaction with
+        the counters and the check that the project is not being deleted.
+
+        Creates are conditional on the task not existing, updates and deletes
+        on it being as the caller read it (task_guard), so the counters are
+        computed from the state that is actually replaced.
+        """
+        try:
+            check = self.project_check(project_id)
+        except WriteRejected:
+            for index, _, _, _ in operations:
+                results[index].update(statusCode=409, error=PROJECT_DELETING_ERROR)
+            return
+
+        transact_items = []
+        for index, op, payload, old_task in operations:
+            if op == 'create':
+                transact_items.append((index, {'Put': {
+                    'TableName': self.task_table.name,
+                    'Item': serialize_item(payload),
+                    'ConditionExpression': 'attribute_not_exists(task_id)'
+                }}, (None, payload)))
+            elif op == 'update':
+                task_id, changes = payload
+                update_expression, expr_names, expr_values = set_expression(changes)
+                condition, guard_values = task_guard(old_task)
+                transact_items.append((index, {'Update': {
+                    'TableName': self.task_table.name,
+                    'Key': serialize_item({'task_id': task_id, 'project_id': project_id}),
+                    'UpdateExpression': update_expression,
+                    'ConditionExpression': condition,
+                    'ExpressionAttributeNames': expr_names,
+                    'ExpressionAttributeValues': {**expr_values, **guard_values}
+                }}, (old_task, {**old_task, **changes} if old_task else None)))
+            else:
+                condition, guard_values = task_guard(old_task)
+                delete = {
+                    'TableName': self.task_table.name,
+                    'Key': serialize_item({'task_id': payload, 'project_id': project_id}),
+                    'ConditionExpression': condition
+                }
+                if guard_values:
+                    delete['ExpressionAttributeValues'] = guard_values
+                transact_items.append((index, {'Delete': delete}, (old_task, None)))
+
+        for chunk in transaction_chunks(transact_items):
+            self._transact_tasks(project_id, chunk, results, check)
+
+    def _transact_tasks(self, project_id, transact_items, results, check=None):
+        """Write one chunk of (index, item, (old_task, new_task)) and its
+        counters transactionally, dropping items whose condition fails and
+        retrying the rest with their counters recomputed. A failed project
+        check fails the whole chunk.
+        """
+        checks = [check] if check else []
+        pending = list(transact_items)
+        while pending:
+            deltas = transition_deltas([transition for _, _, transition in pending])
+            try:
+                self.client.transact_write_items(
+                    TransactItems=checks + [item for _, item, _ in pending] + stat_updates(project_id, deltas)
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'TransactionCanceledException':
+                    raise e
+                reasons = e.response.get('CancellationReasons', [])
+                if checks and reasons and reasons[0].get('Code') == 'ConditionalCheckFailed':
+                    for index, _, _ in pending:
+                        results[index].update(statusCode=409, error=PROJECT_DELETING_ERROR)
+                    return
+                reasons = reasons[len(checks):]
+                failed = set()
+                for (index, item, (old_task, _)), reason in zip(pending, reasons):
+                    code = reason.get('Code')
+                    if code in (None, 'None'):
+                        continue
+                    failed.add(index)
+                    if code == 'ConditionalCheckFailed':
+                        if 'Put' in item:
+                            results[index].update(statusCode=409, error='Task already exists')
+                        elif old_task:
+                            # Guarded on the state the caller read
+                            results[index].update(statusCode=409, error=TASK_CHANGED_ERROR)
+                        else:
+                            results[index].update(statusCode=404, error='Task not found')
+                    else:
+                        results[index].update(statusCode=409, error=reason.get('Message') or code)
+                if not failed:
+                    raise e
+                pending = [entry for entry in pending if entry[0] not in failed]
+                continue
+
+            for index, _, _ in pending:
+                results[index]['statusCode'] = 200
+            return
+
+    def remove_archived_tasks(self, project_id, tasks):
+        """Conditional deletes with their counters in TransactWriteItems
+        chunks; a changed task only drops out
+        """
+        transact_items = [
+            (index, {'Delete': {
+                'TableName': self.task_table.name,
+                'Key': serialize_item({'task_id': task['task_id'], 'project_id': project_id}),
+                'ConditionExpression': 'updated_at = :updated_at',
+                'ExpressionAttributeValues': {':updated_at': {'S': task['updated_at']}}
+            }}, (task, None))
+            for index, task in enumerate(tasks)
+        ]
+        results = [{} for _ in tasks]
+        for chunk in transaction_chunks(transact_items):
+            self._transact_tasks(project_id, chunk, results)
+        return [task for task, result in zip(tasks, results) if result.get('statusCode') == 200]
+
+    def task_pages(self, project_id, statuses=None, fields=None):
+        return query_pages(self.client, **task_query_params(self.task_table.name, project_id, statuses, fields))
+
+    def task_page(self, project_id, statuses, fields, limit, start_key=None):
+        params = task_query_params(self.task_table.name, project_id, statuses, fields)
+        params['Limit'] = limit
+        if start_key:
+            params['ExclusiveStartKey'] = start_key
+        response = self.client.query(**params)
+        return [deserialize_item(item) for item in response.get('Items', [])], response.get('LastEvaluatedKey')
+
+    def user_task_pages(self, user_id, role, statuses=None, fields=None):
+        return query_pages(
+            self.client, **user_task_query_params(self.task_table.name, user_id, role, statuses, fields)
+        )
+
+    def user_task_page(self, user_id, role, statuses, fields, limit, start_key=None):
+        # Limit counts the tasks read before the status filter, so a
+        # filtered page can hold fewer than `limit` (or none) and still
+        # have a next key
+        params = user_task_query_params(self.task_table.name, user_id, role, statuses, fields)
+        params['Limit'] = limit
+        if start_key:
+            params['ExclusiveStartKey'] = start_key
+        response = self.client.query(**params)
+        return [deserialize_item(item) for item in response.get('Items', [])], response.get('LastEvaluatedKey')
+
+    def tasks_for_projects(self, project_ids, statuses=None, fields=None):
+        # Query every project concurrently, each paged to completion
+        return scatter_gather(
+            project_ids,
+            lambda pid: query_all_pages(
+                self.client, **task_query_params(self.task_table.name, pid, statuses, fields)
+            )
+        )
+
+    def task_changes(self, project_ids, since_key):
+        """Reads the project-updated-index and the Tombstones table, so the cost
+        is proportional to the number of changes rather than to project size.
+        """
+        return scatter_gather(project_ids, lambda pid: self._project_changes(pid, since_key))
+
+    def _project_changes(self, project_id, since_key):
+        changed = query_all_pages(
+            self.client,
+            TableName=self.task_table.name,
+            IndexName='project-updated-index',
+            KeyConditionExpression='project_id = :project_id AND updated_at > :since',
+            ExpressionAttributeValues={
+                ':project_id': {'S': project_id},
+                ':since': {'S': since_key}
+            }
+        )
+        return [('task', task) for task in changed] + [
+            ('deleted', item) for item in self.tombstones(project_id, since_key)
+        ]
+
+    # ----- tombstones -----
+
+    def record_tombstones(self, tombstones):
+        batch_write(self.client, self.tombstone_table.name, [put_request(item) for item in tombstones])
+
+    def tombstones(self, scope, since_key):
+        return list(query_all_pages(
+            self.client,
+            TableName=self.tombstone_table.name,
+            KeyConditionExpression='#scope = :scope AND tombstone_key > :since',
+            ExpressionAttributeNames={'#scope': 'scope'},
+            ExpressionAttributeValues={
+                ':scope': {'S': scope},
+                ':since': {'S': since_key}
+            }
+        ))
+
+    # ----- counters -----
+
+    def apply_stat_deltas(self, project_id, deltas):
+        apply_stat_deltas(self.client, project_id, deltas)
+
+    def stat_counters(self, project_id):
+        return {
+            counter['stat_key']: int(counter.get('count', 0))
+            for counter in query_all_pages(
+                self.client,
+                TableName=STATS_TABLE,
+                KeyConditionExpression='project_id = :project_id',
+                ExpressionAttributeValues={':project_id': {'S': project_id}}
+            )
+        }
+
+    def project_stats(self, project_ids, days):
+        return scatter_gather(project_ids, lambda pid: [read_project_stats(self.client, pid, days)])
+
+    def load_project_version(self, project_id):
+        return Mapped(
+            self.loader.load(STATS_TABLE, {'project_id': project_id, 'stat_key': VERSION_KEY}),
+            lambda item: int(item['count']) if item else 0
+        )
+
+    # ----- search index -----
+
+    def write_postings(self, project_id, puts, deletes):
+        # Keys embed the weight, so a changed weight is a delete plus a put
+        # of two different items and both fit in the same batch
+        batch_write(self.client, SEARCH_TABLE, [
+            delete_request({'project_id': project_id, 'posting': posting_key(token, weight, task_id)})
+            for (task_id, token), weight in deletes.items()
+        ] + [
+            put_request({'project_id': project_id, 'posting': posting_key(token, weight, task_id)})
+            for (task_id, token), weight in puts.items()
+        ])
+
+    def search_postings(self, project_ids, terms, prefix):
+        """One capped begins_with query per term and project, all fanned out at once"""
+        patterns = [term + '#' for term in terms]
+        if prefix:
+            patterns[-1] = terms[-1]
+        postings, incomplete = scatter_gather(
+            [(pid, pattern) for pid in project_ids for pattern in patterns],
+            lambda key: self._term_postings(*key)
+        )
+        return postings, list(dict.fromkeys(pid for pid, _ in incomplete))
+
+    def _term_postings(self, project_id, pattern):
+        postings = []
+        for page in query_pages(
+            self.client,
+            TableName=SEARCH_TABLE,
+            KeyConditionExpression='project_id = :project_id AND begins_with(posting, :pattern)',
+            ExpressionAttributeValues={
+                ':project_id': {'S': project_id},
+                ':pattern': {'S': pattern}
+            },
+            Limit=MAX_POSTINGS_PER_TERM
+        ):
+            for item in page:
+                token, weight, task_id = parse_posting(item['posting'])
+                postings.append((project_id, task_id, token, weight))
+            if len(postings) >= MAX_POSTINGS_PER_TERM:
+                break
+        return postings[:MAX_POSTINGS_PER_TERM]
+
+    def project_postings(self, project_id):
+        postings = {}
+        for item in query_all_pages(
+            self.client,
+            TableName=SEARCH_TABLE,
+            KeyConditionExpression='project_id = :project_id',
+            ExpressionAttributeValues={':project_id': {'S': project_id}}
+        ):
+            token, weight, task_id = parse_posting(item['posting'])
+            postings[(task_id, token)] = weight
+        return postings
+
+    # ----- activity log -----
+
+    def append_activity(self, events):
+        # Day index entries ride in the same BatchWriteItem as the events
+        entries = [
+            entry for entry in day_index_items(events)
+            if (entry['bucket'], entry['event_key']) not in self.indexed_days
+        ]
+        batch_write(self.client, ACTIVITY_TABLE, [put_request(item) for item in events + entries])
+        if len(self.indexed_days) > 10000:
+            self.indexed_days.clear()
+        self.indexed_days.update((entry['bucket'], entry['event_key']) for entry in entries)
+
+    def activity_page(self, project_id, limit, start_key=None):
+        """Reads day buckets newest first, ACTIVITY_SCAN_DAYS of them at a time.
+
+        Only days listed in the project's day index are read. Every bucket of
+        a round is queried concurrently for at most `limit` events; the
+        buckets are then consumed in day order until the page is full, so a
+        page reads about as many events as it returns.
+        """
+        start_day = start_key['day'] if start_key else None
+        days = self._activity_days(project_id, timeline_days(start_day))
+        events = []
+        for offset in range(0, len(days), ACTIVITY_SCAN_DAYS):
+            window = days[offset:offset + ACTIVITY_SCAN_DAYS]
+            results, _ = scatter_gather(window, lambda day: [(day, self._activity_bucket(
+                project_id, day, limit, start_key['event_key'] if start_key and day == start_day else None
+            ))])
+            buckets = dict(results)
+            for day in window:
+                if day not in buckets:
+                    # Missed the fan-out budget; the next page resumes here
+                    return events, {'day': day, 'event_key': None}
+                items, truncated = buckets[day]
+                for item in items:
+                    events.append(item)
+                    if len(events) == limit:
+                        return events, {'day': day, 'event_key': item['event_key']}
+                if truncated:
+                    return events, {'day': day, 'event_key': items[-1]['event_key']}
+        return events, None
+
+    def _activity_days(self, project_id, days):
+        """The days of `days` (a newest-first range) that have events, newest first"""
+        return [item['event_key'] for item in query_all_pages(
+            self.client,
+            TableName=ACTIVITY_TABLE,
+            KeyConditionExpression='#bucket = :bucket AND event_key BETWEEN :oldest AND :newest',
+            ExpressionAttributeNames={'#bucket': 'bucket'},
+            ExpressionAttributeValues={
+                ':bucket': {'S': bucket_key(project_id, DAY_INDEX)},
+                ':oldest': {'S': days[-1]},
+                ':newest': {'S': days[0]}
+            },
+            ScanIndexForward=False
+        )] if days else []
+
+    def _activity_bucket(self, project_id, day, limit, before=None):
+        """Newest events of one day; returns (events, truncated by the 1 MB page size)"""
+        params = {
+            'TableName': ACTIVITY_TABLE,
+            # BUCKET is a reserved word
+            'KeyConditionExpression': '#bucket = :bucket',
+            'ExpressionAttributeNames': {'#bucket': 'bucket'},
+            'ExpressionAttributeValues': {':bucket': {'S': bucket_key(project_id, day)}},
+            'ScanIndexForward': False,
+            'Limit': limit
+        }
+        if before:
+            params['KeyConditionExpression'] += ' AND event_key < :before'
+            params['ExpressionAttributeValues'][':before'] = {'S': before}
+        response = self.client.query(**params)
+        items = [deserialize_item(item) for item in response.get('Items', [])]
+        return items, bool(items) and len(items) < limit and 'LastEvaluatedKey' in response
+
+    # ----- users -----
+
+    def read_usernames(self, user_ids):
+        try:
+            items = batch_get_items(self.client, USER_DIRECTORY_TABLE, [{'user_id': user_id} for user_id in user_ids])
+        except (ClientError, UnprocessedKeysError) as e:
+            # The mirror is an optimisation; Cognito remains the source of truth
+            print(f"User directory read failed: {e}")
+            return {}
+        return {item['user_id']: item['username'] for item in items}
+
+    def write_usernames(self, usernames):
+        try:
+            batch_write(self.client, self.user_directory_table.name, [
+                put_request({'user_id': user_id, 'username': username})
+                for user_id, username in usernames.items()
+            ])
+        except (ClientError, UnprocessedItemsError) as e:
+            print(f"User directory write failed: {e}")
+
+    def lookup_username(self, user_id):
+        # Query for user using sub (user_id)
+        response = self.cognito.list_users(
+            UserPoolId=USER_POOL_ID,
+            Filter=f'sub = "{user_id}"',
+            Limit=1
+        )
+        if not response.get('Users'):
+            return None
+        return response['Users'][0].get('Username')
+
+    def search_users(self, prefix, limit):
+        # Search by username
+        response = self.cognito.list_users(
+            UserPoolId=USER_POOL_ID,
+            Filter=f'username ^= "{prefix}"',
+            Limit=limit
+        )
+        users = []
+        for user in response.get('Users', []):
+            # The sub is the user_id
+            sub = next((attr['Value'] for attr in user.get('Attributes', []) if attr['Name'] == 'sub'), None)
+            if sub:
+                users.append({'user_id': sub, 'username': user.get('Username')})
+        return users
@@ -0,0 +1,746 @@
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from decimal import Decimal
+from functions.activity import ACTIVITY_TABLE, is_day_index, timeline_days
+from functions.analytics import (
+    STATS_DAY_RETENTION_DAYS, VERSION_KEY, first_trend_day, summarize_stats, transition_deltas
+)
+from functions.search import MAX_POSTINGS_PER_TERM, SEARCH_TABLE, parse_posting
+from functions.storage import (
+    MEMBER_STATUSES, PROJECT_DELETING, PROJECT_DELETING_ERROR, Resolved, Storage, WriteRejected,
+    task_projection
+)
+
+# Bound parameters per statement (SQLITE_MAX_VARIABLE_NUMBER is 999 on old builds)
+IN_CHUNK = 500
+
+# Items keep their full JSON document in `data`; the columns beside it are
+# the keys and the attributes queries filter or sort on
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS projects (
+    project_id TEXT PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    status TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS projects_user_id ON projects (user_id);
+
+CREATE TABLE IF NOT EXISTS project_members (
+    project_id TEXT NOT NULL,
+    user_id TEXT NOT NULL,
+    status TEXT NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (project_id, user_id)
+);
+CREATE INDEX IF NOT EXISTS project_members_user_id ON project_members (user_id, status);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT NOT NULL,
+    project_id TEXT NOT NULL,
+    user_id TEXT,
+    assigned_to TEXT,
+    status TEXT,
+    updated_at TEXT,
+    data TEXT NOT NULL,
+    PRIMARY KEY (task_id, project_id)
+);
+CREATE INDEX IF NOT EXISTS tasks_project_id ON tasks (project_id, task_id);
+CREATE INDEX IF NOT EXISTS tasks_project_status ON tasks (project_id, status, task_id);
+CREATE INDEX IF NOT EXISTS tasks_project_updated ON tasks (project_id, updated_at);
+CREATE INDEX IF NOT EXISTS tasks_user_id ON tasks (user_id, project_id, task_id);
+CREATE INDEX IF NOT EXISTS tasks_assigned_to ON tasks (assigned_to, project_id, task_id);
+
+CREATE TABLE IF NOT EXISTS tombstones (
+    scope TEXT NOT NULL,
+    tombstone_key TEXT NOT NULL,
+    expires_at INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (scope, tombstone_key)
+);
+CREATE INDEX IF NOT EXISTS tombstones_expires_at ON tombstones (expires_at);
+
+CREATE TABLE IF NOT EXISTS project_stats (
+    project_id TEXT NOT NULL,
+    stat_key TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    expires_at INTEGER,
+    PRIMARY KEY (project_id, stat_key)
+);
+CREATE INDEX IF NOT EXISTS project_stats_expires_at ON project_stats (expires_at);
+
+CREATE TABLE IF NOT EXISTS search_postings (
+    project_id TEXT NOT NULL,
+    token TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    weight INTEGER NOT NULL,
+    PRIMARY KEY (project_id, token, task_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS search_postings_weight ON search_postings (project_id, token, weight DESC, task_id);
+
+CREATE TABLE IF NOT EXISTS activity_log (
+    project_id TEXT NOT NULL,
+    event_key TEXT NOT NULL,
+    expires_at INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (project_id, event_key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS activity_log_expires_at ON activity_log (expires_at);
+
+CREATE TABLE IF NOT EXISTS users (
+    user_id TEXT PRIMARY KEY,
+    username TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS users_username ON users (username);
+'''
+
+# UPSERT (INSERT ... ON CONFLICT DO UPDATE) needs 3.24, row-value
+# comparisons 3.15
+MIN_SQLITE_VERSION = (3, 24, 0)
+
+# DynamoDB table name -> (table, indexed columns) for put_items()
+ITEM_TABLES = {
+    'Projects': ('projects', ('project_id', 'user_id', 'status')),
+    'ProjectMembers': ('project_members', ('project_id', 'user_id', 'status')),
+    'Tasks': ('tasks', ('task_id', 'project_id', 'user_id', 'assigned_to', 'status', 'updated_at')),
+    ACTIVITY_TABLE: ('activity_log', ('project_id', 'event_key', 'expires_at')),
+}
+
+
+# Per-user task indexes: role -> column
+USER_TASK_COLUMNS = {
+    'assigned': 'assigned_to',
+    'created': 'user_id'
+}
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+
+def dumps(item):
+    return json.dumps(item, default=_default, separators=(',', ':'))
+
+
+def placeholders(values):
+    return ', '.join('?' * len(values))
+
+
+def chunks(values, size=IN_CHUNK):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def project_fields(item, fields):
+    """Keep only the projected attributes, like a ProjectionExpression"""
+    projected = task_projection(fields)
+    if not projected:
+        return item
+    return {key: item[key] for key in projected if key in item}
+
+
+class SQLiteStorage(Storage):
+    """Embedded SQLite engine for self-hosted deployments.
+
+    One connection per thread on a WAL database, so readers never block the
+    writer. Multi-project reads are single set-based queries instead of a
+    fan-out, and usernames come from the local users table (filled with
+    `python server.py users`). Needs SQLite 3.24 or later.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path):
+        if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+            raise RuntimeError(
+                f"SQLite {sqlite3.sqlite_version} is too old, the SQLite engine needs "
+                f"{'.'.join(map(str, MIN_SQLITE_VERSION))} or later"
+            )
+        self.path = path
+        self._local = threading.local()
+        self.db.executescript(SCHEMA)
+
+    @property
+    def db(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            # Autocommit; writes open explicit transactions (see _transaction)
+            connection = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode = WAL')
+            connection.execute('PRAGMA synchronous = NORMAL')
+            connection.execute('PRAGMA foreign_keys = ON')
+            connection.execute('PRAGMA busy_timeout = 5000')
+            self._local.connection = connection
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE takes the write lock up front, so concurrent writers wait
+        # on busy_timeout instead of failing on a lock upgrade
+        db = self.db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _items(self, sql, params=()):
+        return [json.loads(row[0]) for row in self.db.execute(sql, params)]
+
+    def _item(self, sql, params=()):
+        row = self.db.execute(sql, params).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_items(self, table_name, items):
+        """Bulk-load DynamoDB-shaped items (migrations, benchmarks)"""
+        if table_name == 'ProjectStats':
+            with self._transaction() as db:
+                db.executemany(
+                    'INSERT OR REPLACE INTO project_stats (project_id, stat_key, count) VALUES (?, ?, ?)',
+                    [(item['project_id'], item['stat_key'], int(item.get('count', 0))) for item in items]
+                )
+            return
+        if table_name == SEARCH_TABLE:
+            with self._transaction() as db:
+                db.executemany(
+                    'INSERT OR REPLACE INTO search_postings (project_id, token, weight, task_id) VALUES (?, ?, ?, ?)',
+                    [(item['project_id'], *parse_posting(item['posting'])) for item in items]
+                )
+            return
+        if table_name == ACTIVITY_TABLE:
+            # activity_log is ordered by time already; it needs no day index
+            items = [item for item in items if not is_day_index(item)]
+        table, columns = ITEM_TABLES[table_name]
+        with self._transaction() as db:
+            db.executemany(
+                f"INSERT OR REPLACE INTO {table} ({', '.join(columns)}, data) VALUES ({placeholders(columns)}, ?)",
+                [tuple(item.get(column) for column in columns) + (dumps(item),) for item in items]
+            )
+
+    # ----- members -----
+
+    def _put_member(self, db, member, replace=True):
+        verb = 'INSERT OR REPLACE' if replace else 'INSERT OR IGNORE'
+        return db.execute(
+            f'{verb} INTO project_members (project_id, user_id, status, data) VALUES (?, ?, ?, ?)',
+            (member['project_id'], member['user_id'], member['status'], dumps(member))
+        ).rowcount
+
+    def load_member(self, project_id, user_id):
+        return Resolved(self._item(
+            'SELECT data FROM project_members WHERE project_id = ? AND user_id = ?', (project_id, user_id)
+        ))
+
+    def member_projects(self, user_id):
+        return self._items(
+            "SELECT data FROM project_members WHERE user_id = ? AND status IN ('OWNER', 'ACCEPTED') "
+            'ORDER BY project_id',
+            (user_id,)
+        )
+
+    def project_members(self, project_id):
+        return self._items(
+            "SELECT data FROM project_members WHERE project_id = ? AND status IN ('OWNER', 'ACCEPTED') "
+            'ORDER BY user_id',
+            (project_id,)
+        )
+
+    def pending_invites(self, user_id):
+        return self._items(
+            "SELECT data FROM project_members WHERE user_id = ? AND status = 'PENDING' ORDER BY project_id",
+            (user_id,)
+        )
+
+    def put_member(self, member):
+        with self._transaction() as db:
+            self._put_member(db, member)
+
+    def add_member(self, member):
+        with self._transaction() as db:
+            return bool(self._put_member(db, member, replace=False))
+
+    def _require_member(self, db, project_id, user_id, statuses=MEMBER_STATUSES):
+        row = db.execute(
+            'SELECT status FROM project_members WHERE project_id = ? AND user_id = ?', (project_id, user_id)
+        ).fetchone()
+        if not row or row[0] not in statuses:
+            raise WriteRejected('forbidden')
+
+    def _require_live_project(self, db, project_id):
+        row = db.execute('SELECT status FROM projects WHERE project_id = ?', (project_id,)).fetchone()
+        if not row or row[0] == PROJECT_DELETING:
+            raise WriteRejected('deleting')
+
+    def _bump_version(self, db, project_id):
+        db.execute(
+            '''
+            INSERT INTO project_stats (project_id, stat_key, count) VALUES (?, ?, 1)
+            ON CONFLICT (project_id, stat_key) DO UPDATE SET count = count + 1
+            ''',
+            (project_id, VERSION_KEY)
+        )
+
+    def invite_member(self, invite):
+        with self._transaction() as db:
+            self._require_member(db, invite['project_id'], invite['invited_by'], ('OWNER',))
+            if not self._put_member(db, invite, replace=False):
+                raise WriteRejected('exists')
+            self._bump_version(db, invite['project_id'])
+
+    def set_member_status(self, project_id, user_id, status, changed_at):
+        with self._transaction() as db:
+            row = db.execute(
+                'SELECT data FROM project_members WHERE project_id = ? AND user_id = ?', (project_id, user_id)
+            ).fetchone()
+            member = json.loads(row[0]) if row else {'project_id': project_id, 'user_id': user_id}
+            member.update(status=status, accepted_at=changed_at)
+            self._put_member(db, member)
+
+    def update_pending_invites(self, project_id, changes):
+        with self._transaction() as db:
+            rows = db.execute(
+                "SELECT data FROM project_members WHERE project_id = ? AND status = 'PENDING'", (project_id,)
+            ).fetchall()
+            for (data,) in rows:
+                self._put_member(db, {**json.loads(data), **changes})
+
+    # ----- projects -----
+
+    def create_project(self, project, owner_member):
+        with self._transaction() as db:
+            db.execute(
+                'INSERT INTO projects (project_id, user_id, status, data) VALUES (?, ?, ?, ?)',
+                (project['project_id'], project['user_id'], project.get('status'), dumps(project))
+            )
+            self._put_member(db, owner_member)
+
+    def load_project(self, owner_id, project_id):
+        return Resolved(self._item(
+            'SELECT data FROM projects WHERE project_id = ? AND user_id = ?', (project_id, owner_id)
+        ))
+
+    def find_project(self, project_id):
+        return self._item('SELECT data FROM projects WHERE project_id = ?', (project_id,))
+
+    def project_ids(self):
+        rows = self.db.execute(
+            'SELECT project_id FROM projects WHERE status IS NULL OR status != ?', (PROJECT_DELETING,)
+        ).fetchall()
+        for (project_id,) in rows:
+            yield project_id
+
+    def load_projects(self, project_ids):
+        """Projects joined with their members, one query per chunk of projects"""
+        found = {}
+        for chunk in chunks(project_ids):
+            rows = self.db.execute(
+                f'''
+                SELECT p.project_id, p.data, m.user_id, m.status
+                FROM projects p
+                LEFT JOIN project_members m
+                    ON m.project_id = p.project_id AND m.status IN ('OWNER', 'ACCEPTED')
+                WHERE p.project_id IN ({placeholders(chunk)})
+                    AND (p.status IS NULL OR p.status != ?)
+                ORDER BY p.project_id, m.user_id
+                ''',
+                (*chunk, PROJECT_DELETING)
+            )
+            for project_id, data, member_id, status in rows:
+                project = found.get(project_id)
+                if project is None:
+                    project = found[project_id] = {**json.loads(data), 'members': []}
+                if member_id is not None:
+                    project['members'].append({'user_id': member_id, 'status': status})
+        return [found[project_id] for project_id in project_ids if project_id in found], []
+
+    def _update_project(self, db, project_id, changes):
+        row = db.execute('SELECT data FROM projects WHERE project_id = ?', (project_id,)).fetchone()
+        if row is None:
+            return False
+        project = {**json.loads(row[0]), **changes}
+        db.execute(
+            'UPDATE projects SET status = ?, data = ? WHERE project_id = ?',
+            (project.get('status'), dumps(project), project_id)
+        )
+        return True
+
+    def update_project(self, project_id, member_id, changes):
+        with self._transaction() as db:
+            self._require_member(db, project_id, member_id)
+            if not self._update_project(db, project_id, changes):
+                raise WriteRejected('not_found')
+            self._bump_version(db, project_id)
+
+    def mark_project_deleting(self, owner_id, project_id, status, deleting_at):
+        with self._transaction() as db:
+            self._update_project(db, project_id, {'status': status, 'deleting_at': deleting_at})
+
+    def delete_project_data(self, project_id, owner_id, deadline=None):
+        # One transaction: the cascade never needs resuming
+        with self._transaction() as db:
+            db.execute('DELETE FROM tasks WHERE project_id = ?', (project_id,))
+            db.execute('DELETE FROM project_stats WHERE project_id = ?', (project_id,))
+            db.execute('DELETE FROM search_postings WHERE project_id = ?', (project_id,))
+            db.execute('DELETE FROM projects WHERE project_id = ?', (project_id,))
+            db.execute('DELETE FROM project_members WHERE project_id = ?', (project_id,))
+        return True
+
+    # ----- tasks -----
+
+    def _put_task(self, db, task, replace=True):
+        self._put_tasks(db, [task], replace)
+
+    def _put_tasks(self, db, tasks, replace=True):
+        verb = 'INSERT OR REPLACE' if replace else 'INSERT'
+        db.executemany(
+            f'{verb} INTO tasks (task_id, project_id, user_id, assigned_to, status, updated_at, data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [
+                (task['task_id'], task['project_id'], task.get('user_id'), task.get('assigned_to'),
+                 task.get('status'), task.get('updated_at'), dumps(task))
+                for task in tasks
+            ]
+        )
+
+    def _task(self, db, task_id, project_id):
+        row = db.execute(
+            'SELECT data FROM tasks WHERE task_id = ? AND project_id = ?', (task_id, project_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load_task(self, task_id, project_id):
+        return Resolved(self._task(self.db, task_id, project_id))
+
+    def put_task(self, task):
+        with self._transaction() as db:
+            self._require_live_project(db, task['project_id'])
+            self._put_task(db, task)
+            self._apply_stat_deltas(db, task['project_id'], transition_deltas([(None, task)]))
+
+    def put_tasks(self, tasks):
+        with self._transaction() as db:
+            self._put_tasks(db, tasks)
+
+    def update_task(self, task_id, project_id, changes, member_id):
+        with self._transaction() as db:
+            self._require_member(db, project_id, member_id)
+            old_task = self._task(db, task_id, project_id)
+            if old_task is None:
+                raise WriteRejected('not_found')
+            new_task = {**old_task, **changes}
+            self._put_task(db, new_task)
+            self._apply_stat_deltas(db, project_id, transition_deltas([(old_task, new_task)]))
+        return old_task
+
+    def delete_task(self, task_id, project_id, member_id):
+        with self._transaction() as db:
+            self._require_member(db, project_id, member_id)
+            old_task = self._task(db, task_id, project_id)
+            if old_task is None:
+                raise WriteRejected('not_found')
+            db.execute('DELETE FROM tasks WHERE task_id = ? AND project_id = ?', (task_id, project_id))
+            self._apply_stat_deltas(db, project_id, transition_deltas([(old_task, None)]))
+        return old_task
+
+    def remove_archived_tasks(self, project_id, tasks):
+        removed = []
+        with self._transaction() as db:
+            for task in tasks:
+                if db.execute(
+                    'DELETE FROM tasks WHERE task_id = ? AND project_id = ? AND updated_at = ?',
+                    (task['task_id'], project_id, task['updated_at'])
+                ).rowcount:
+                    removed.append(task)
+            if removed:
+                self._apply_stat_deltas(db, project_id, transition_deltas([(task, None) for task in removed]))
+        return removed
+
+    def write_tasks(self, project_id, operations, results):
+        """All operations and their counters in one transaction; a failed
+        check only skips its operation. Counters follow the tasks as read
+        inside the transaction rather than the caller's old_task.
+        """
+        with self._transaction() as db:
+            try:
+                self._require_live_project(db, project_id)
+            except WriteRejected:
+                for index, _, _, _ in operations:
+                    results[index].update(statusCode=409, error=PROJECT_DELETING_ERROR)
+                return
+            transitions = []
+            for index, op, payload, _ in operations:
+                if op == 'create':
+                    try:
+                        self._put_task(db, payload, replace=False)
+                    except sqlite3.IntegrityError:
+                        results[index].update(statusCode=409, error='Task already exists')
+                        continue
+                    transitions.append((None, payload))
+                elif op == 'update':
+                    task_id, changes = payload
+                    old_task = self._task(db, task_id, project_id)
+                    if old_task is None:
+                        results[index].update(statusCode=404, error='Task not found')
+                        continue
+                    new_task = {**old_task, **changes}
+                    self._put_task(db, new_task)
+                    transitions.append((old_task, new_task))
+                else:
+                    old_task = self._task(db, payload, project_id)
+                    if old_task is None:
+                        results[index].update(statusCode=404, error='Task not found')
+                        continue
+                    db.execute('DELETE FROM tasks WHERE task_id = ? AND project_id = ?', (payload, project_id))
+                    transitions.append((old_task, None))
+                results[index]['statusCode'] = 200
+            if transitions:
+                self._apply_stat_deltas(db, project_id, transition_deltas(transitions))
+
+    def _task_filter(self, project_ids, statuses):
+        sql = f'project_id IN ({placeholders(project_ids)})'
+        params = list(project_ids)
+        if statuses:
+            sql += f' AND status IN ({placeholders(statuses)})'
+            params.extend(statuses)
+        return sql, params
+
+    def task_pages(self, project_id, statuses=None, fields=None, page_size=1000):
+        start_key = None
+        while True:
+            page, start_key = self.task_page(project_id, statuses, fields, page_size, start_key)
+            yield page
+            if not start_key:
+                return
+
+    def task_page(self, project_id, statuses, fields, limit, start_key=None):
+        # Keyset pagination on the (project_id, task_id) index
+        sql, params = self._task_filter([project_id], statuses)
+        if start_key:
+            sql += ' AND task_id > ?'
+            params.append(start_key['task_id'])
+        tasks = self._items(f'SELECT data FROM tasks WHERE {sql} ORDER BY task_id LIMIT ?', (*params, limit + 1))
+        last_key = {'task_id': tasks[limit - 1]['task_id']} if len(tasks) > limit else None
+        return [project_fields(task, fields) for task in tasks[:limit]], last_key
+
+    def user_task_pages(self, user_id, role, statuses=None, fields=None, page_size=1000):
+        start_key = None
+        while True:
+            page, start_key = self.user_task_page(user_id, role, statuses, fields, page_size, start_key)
+            yield page
+            if not start_key:
+                return
+
+    def user_task_page(self, user_id, role, statuses, fields, limit, start_key=None):
+        # Keyset pagination on the (user column, project_id, task_id) index
+        sql = f'{USER_TASK_COLUMNS[role]} = ?'
+        params = [user_id]
+        if statuses:
+            sql += f' AND status IN ({placeholders(statuses)})'
+            params.extend(statuses)
+        if start_key:
+            sql += ' AND (project_id, task_id) > (?, ?)'
+            params.extend([start_key['project_id'], start_key['task_id']])
+        tasks = self._items(
+            f'SELECT data FROM tasks WHERE {sql} ORDER BY project_id, task_id LIMIT ?', (*params, limit + 1)
+        )
+        last_key = None
+        if len(tasks) > limit:
+            last_key = {'project_id': tasks[limit - 1]['project_id'], 'task_id': tasks[limit - 1]['task_id']}
+        return [project_fields(task, fields) for task in tasks[:limit]], last_key
+
+    def tasks_for_projects(self, project_ids, statuses=None, fields=None):
+        tasks = []
+        for chunk in chunks(project_ids):
+            sql, params = self._task_filter(chunk, statuses)
+            tasks.extend(
+                project_fields(task, fields)
+                for task in self._items(f'SELECT data FROM tasks WHERE {sql} ORDER BY project_id, task_id', params)
+            )
+        return tasks, []
+
+    def task_changes(self, project_ids, since_key):
+        changes = []
+        for chunk in chunks(project_ids):
+            changes.extend(('task', task) for task in self._items(
+                f'SELECT data FROM tasks WHERE project_id IN ({placeholders(chunk)}) AND updated_at > ? '
+                'ORDER BY project_id, updated_at',
+                (*chunk, since_key)
+            ))
+            changes.extend(('deleted', item) for item in self._items(
+                f'SELECT data FROM tombstones WHERE scope IN ({placeholders(chunk)}) AND tombstone_key > ? '
+                'ORDER BY scope, tombstone_key',
+                (*chunk, since_key)
+            ))
+        return changes, []
+
+    # ----- tombstones -----
+
+    def record_tombstones(self, tombstones):
+        with self._transaction() as db:
+            # Stands in for the DynamoDB TTL on expires_at
+            db.execute('DELETE FROM tombstones WHERE expires_at < ?', (int(time.time()),))
+            db.executemany(
+                'INSERT OR REPLACE INTO tombstones (scope, tombstone_key, expires_at, data) VALUES (?, ?, ?, ?)',
+                [(item['scope'], item['tombstone_key'], item['expires_at'], dumps(item)) for item in tombstones]
+            )
+
+    def tombstones(self, scope, since_key):
+        return self._items(
+            'SELECT data FROM tombstones WHERE scope = ? AND tombstone_key > ? ORDER BY tombstone_key',
+            (scope, since_key)
+        )
+
+    # ----- counters -----
+
+    def apply_stat_deltas(self, project_id, deltas):
+        with self._transaction() as db:
+            self._apply_stat_deltas(db, project_id, deltas)
+
+    def _apply_stat_deltas(self, db, project_id, deltas):
+        now = int(time.time())
+        day_expires = now + STATS_DAY_RETENTION_DAYS * 86400
+        db.execute('DELETE FROM project_stats WHERE expires_at < ?', (now,))
+        db.executemany(
+            '''
+            INSERT INTO project_stats (project_id, stat_key, count, expires_at) VALUES (?, ?, ?, ?)
+            ON CONFLICT (project_id, stat_key)
+            DO UPDATE SET count = count + excluded.count, expires_at = excluded.expires_at
+            ''',
+            [
+                (project_id, stat_key, delta, day_expires if stat_key.startswith('day#') else None)
+                for stat_key, delta in sorted(deltas.items()) if delta
+            ]
+        )
+
+    def stat_counters(self, project_id):
+        return dict(self.db.execute(
+            'SELECT stat_key, count FROM project_stats WHERE project_id = ?', (project_id,)
+        ))
+
+    def project_stats(self, project_ids, days):
+        first_day = first_trend_day(days)
+        counters = {project_id: [] for project_id in project_ids}
+        for chunk in chunks(project_ids):
+            # Same ranges as read_project_stats: recent day#..., status#...,
+            # total, and the assignee#... counters
+            rows = self.db.execute(
+                f'''
+                SELECT project_id, stat_key, count FROM project_stats
+                WHERE project_id IN ({placeholders(chunk)})
+                    AND (stat_key >= ? OR (stat_key >= 'assignee#' AND stat_key < 'assignee$'))
+                ''',
+                (*chunk, f'day#{first_day}')
+            )
+            for project_id, stat_key, count in rows:
+                counters[project_id].append({'stat_key': stat_key, 'count': count})
+        return [
+            summarize_stats(project_id, counters[project_id], first_day, days) for project_id in project_ids
+        ], []
+
+    def load_project_version(self, project_id):
+        row = self.db.execute(
+            'SELECT count FROM project_stats WHERE project_id = ? AND stat_key = ?', (project_id, VERSION_KEY)
+        ).fetchone()
+        return Resolved(row[0] if row else 0)
+
+    # ----- search index -----
+
+    def write_postings(self, project_id, puts, deletes):
+        with self._transaction() as db:
+            db.executemany(
+                'DELETE FROM search_postings WHERE project_id = ? AND token = ? AND task_id = ?',
+                [(project_id, token, task_id) for task_id, token in deletes]
+            )
+            db.executemany(
+                'INSERT OR REPLACE INTO search_postings (project_id, token, task_id, weight) VALUES (?, ?, ?, ?)',
+                [(project_id, token, task_id, weight) for (task_id, token), weight in puts.items()]
+            )
+
+    def search_postings(self, project_ids, terms, prefix):
+        """One capped seek on the weight index per term and project; SQLite
+        statements are cheap, and a per-project LIMIT is what bounds the read
+        """
+        ranges = [(term, term) for term in terms]
+        if prefix:
+            ranges[-1] = (terms[-1], terms[-1] + '\U0010ffff')
+        postings = []
+        for project_id in project_ids:
+            for low, high in ranges:
+                postings.extend(
+                    (project_id, task_id, token, weight)
+                    for token, task_id, weight in self.db.execute(
+                        'SELECT token, task_id, weight FROM search_postings '
+                        'WHERE project_id = ? AND token >= ? AND token <= ? '
+                        'ORDER BY token, weight DESC, task_id LIMIT ?',
+                        (project_id, low, high, MAX_POSTINGS_PER_TERM)
+                    )
+                )
+        return postings, []
+
+    def project_postings(self, project_id):
+        return {
+            (task_id, token): weight
+            for token, task_id, weight in self.db.execute(
+                'SELECT token, task_id, weight FROM search_postings WHERE project_id = ?', (project_id,)
+            )
+        }
+
+    # ----- activity log -----
+
+    def append_activity(self, events):
+        with self._transaction() as db:
+            # Stands in for the DynamoDB TTL on expires_at
+            db.execute('DELETE FROM activity_log WHERE expires_at < ?', (int(time.time()),))
+            db.executemany(
+                'INSERT INTO activity_log (project_id, event_key, expires_at, data) VALUES (?, ?, ?, ?)',
+                [(event['project_id'], event['event_key'], event['expires_at'], dumps(event)) for event in events]
+            )
+
+    def activity_page(self, project_id, limit, start_key=None):
+        # One range of the primary key; day buckets only matter to DynamoDB
+        sql = 'project_id = ? AND event_key >= ?'
+        params = [project_id, timeline_days()[-1]]
+        if start_key and start_key.get('event_key'):
+            sql += ' AND event_key < ?'
+            params.append(start_key['event_key'])
+        events = self._items(
+            f'SELECT data FROM activity_log WHERE {sql} ORDER BY event_key DESC LIMIT ?', (*params, limit + 1)
+        )
+        last_key = None
+        if len(events) > limit:
+            last_key = {'day': events[limit - 1]['at'][:10], 'event_key': events[limit - 1]['event_key']}
+        return events[:limit], last_key
+
+    # ----- users -----
+
+    def read_usernames(self, user_ids):
+        usernames = {}
+        for chunk in chunks(user_ids):
+            usernames.update(self.db.execute(
+                f'SELECT user_id, username FROM users WHERE user_id IN ({placeholders(chunk)})', chunk
+            ))
+        return usernames
+
+    def write_usernames(self, usernames):
+        with self._transaction() as db:
+            db.executemany('INSERT OR REPLACE INTO users (user_id, username) VALUES (?, ?)', usernames.items())
+
+    def lookup_username(self, user_id):
+        # The users table is the directory of record (see `server.py users`);
+        # read_usernames saw it all
+        return None
+
+    def search_users(self, prefix, limit):
+        # A range instead of LIKE so the username index is used
+        rows = self.db.execute(
+            'SELECT user_id, username FROM users WHERE username >= ? AND username < ? ORDER BY username LIMIT ?',
+            (prefix, prefix + '\U0010ffff', limit)
+        )
+        return [{'user_id': user_id, 'username': username} for user_id, username in rows]
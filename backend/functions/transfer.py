@@ -0,0 +1,119 @@
+import os
+import json
+from uuid import uuid4
+
+# Version of the NDJSON layout written by GET /projects/export
+EXPORT_FORMAT_VERSION = 1
+
+# Tasks written per round of POST /projects/import (and held in memory)
+IMPORT_BATCH_TASKS = int(os.environ.get('IMPORT_BATCH_TASKS', '1000'))
+
+# Task attributes an import keeps; ids, project and usernames are assigned
+# by the importing project
+IMPORT_TASK_FIELDS = ('name', 'description', 'status', 'user_id', 'assigned_to', 'created_at', 'updated_at')
+
+
+class ImportRejected(ValueError):
+    """An import document that fails validation; nothing has been written"""
+
+    def __init__(self, line, message):
+        super().__init__(f'Line {line}: {message}')
+
+
+def export_records(project, members, tasks):
+    """NDJSON records of a project: a header with its metadata, then its
+    members, then its tasks (any iterable, consumed once)
+    """
+    yield {'type': 'project', 'version': EXPORT_FORMAT_VERSION, 'project': project}
+    for member in members:
+        yield {'type': 'member', 'member': member}
+    for task in tasks:
+        yield {'type': 'task', 'task': task}
+
+
+def _lines(text):
+    # Slices one line at a time; splitlines() or StringIO would copy the
+    # whole document first
+    start = 0
+    while start < len(text):
+        end = text.find('\n', start)
+        if end == -1:
+            end = len(text)
+        yield text[start:end]
+        start = end + 1
+
+
+def read_records(text):
+    """Yield (line number, record) of an NDJSON document, one line at a time"""
+    for number, line in enumerate(_lines(text), 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            raise ImportRejected(number, 'invalid JSON')
+        if not isinstance(record, dict) or not isinstance(record.get(record.get('type')), dict):
+            raise ImportRejected(number, 'expected {"type": ..., <type>: {...}}')
+        yield number, record
+
+
+def validate_import(text, statuses):
+    """Check a whole import document before anything is written.
+
+    Returns (project, member user ids, task count). Tasks must have a name
+    and a known status, and may only be assigned to exported members.
+    """
+    project, member_ids, tasks = None, set(), 0
+    for number, record in read_records(text):
+        kind = record['type']
+        if project is None:
+            if kind != 'project':
+                raise ImportRejected(number, 'the first record must be the project')
+            if record.get('version') != EXPORT_FORMAT_VERSION:
+                raise ImportRejected(number, f'unsupported export version {record.get("version")!r}')
+            project = record['project']
+            if not project.get('name'):
+                raise ImportRejected(number, 'project has no name')
+        elif kind == 'member':
+            if not record['member'].get('user_id'):
+                raise ImportRejected(number, 'member has no user_id')
+            member_ids.add(record['member']['user_id'])
+        elif kind == 'task':
+            task = record['task']
+            if not task.get('name'):
+                raise ImportRejected(number, 'task has no name')
+            if task.get('status') not in statuses:
+                raise ImportRejected(number, f'unknown task status {task.get("status")!r}')
+            if task.get('assigned_to') and task['assigned_to'] not in member_ids:
+                raise ImportRejected(number, 'task is assigned to a user that is not an exported member')
+            tasks += 1
+        else:
+            raise ImportRejected(number, f'unknown record type {kind!r}')
+    if project is None:
+        raise ImportRejected(0, 'empty document')
+    return project, member_ids, tasks
+
+
+def imported_task(task, project_id, importer_id, current_time):
+    """A new task of project_id from an exported one"""
+    item = {field: task[field] for field in IMPORT_TASK_FIELDS if task.get(field) is not None}
+    item.setdefault('description', '')
+    item.setdefault('user_id', importer_id)
+    item.setdefault('created_at', current_time)
+    item.setdefault('updated_at', item['created_at'])
+    item.update(task_id=str(uuid4()), project_id=project_id)
+    return item
+
+
+def import_task_batches(text, project_id, importer_id, current_time):
+    """Yield lists of at most IMPORT_BATCH_TASKS new tasks from a validated document"""
+    batch = []
+    for _, record in read_records(text):
+        if record['type'] != 'task':
+            continue
+        batch.append(imported_task(record['task'], project_id, importer_id, current_time))
+        if len(batch) == IMPORT_BATCH_TASKS:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
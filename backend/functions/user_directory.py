@@ -0,0 +1,167 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from botocore.exceptions import ClientError
+from functions.storage import storage
+
+# Cache settings (module level so the cache survives warm Lambda invocations)
+CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', '5000'))
+CACHE_TTL_SECONDS = int(os.environ.get('USER_CACHE_TTL_SECONDS', '900'))
+NEGATIVE_CACHE_TTL_SECONDS = int(os.environ.get('USER_CACHE_NEGATIVE_TTL_SECONDS', '60'))
+
+# Marker stored for subs Cognito does not know about
+_UNKNOWN = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a per-entry TTL."""
+
+    def __init__(self, max_entries, ttl_seconds, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl_seconds=None):
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (value, self._clock() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_cache = TTLCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS)
+
+# Lookups currently being resolved, so concurrent callers wait instead of
+# issuing the same remote call twice
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+def get_user_details(user_id):
+    """Helper function to get user details for a single Cognito sub"""
+    return {'user_id': user_id, 'username': get_usernames([user_id])[user_id]}
+
+
+def get_usernames(user_ids):
+    """Resolve many Cognito subs to usernames in one deduplicated pass.
+
+    Lookups go warm cache -> storage mirror (UserDirectory via BatchGetItem)
+    -> directory of record (Cognito), so a whole board costs a fixed number
+    of directory reads. Unknown subs resolve to themselves, matching the
+    previous fallback behaviour.
+    """
+    wanted = {user_id for user_id in user_ids if user_id}
+    resolved = {}
+    missing = []
+
+    for user_id in wanted:
+        cached = _cache.get(user_id)
+        if cached is None:
+            missing.append(user_id)
+        else:
+            resolved[user_id] = user_id if cached is _UNKNOWN else cached
+
+    if missing:
+        owned, waiting = _claim(missing)
+        try:
+            if owned:
+                resolved.update(_resolve_remote(owned))
+        finally:
+            _release(owned)
+
+        for user_id, event in waiting.items():
+            event.wait()
+            cached = _cache.get(user_id)
+            if cached is None:
+                # The other lookup failed; fall back to the sub itself
+                resolved[user_id] = user_id
+            else:
+                resolved[user_id] = user_id if cached is _UNKNOWN else cached
+
+    return resolved
+
+
+def remember_users(users):
+    """Record sub -> username pairs that were learned for free (e.g. from search)"""
+    fresh = {}
+    for user_id, username in users.items():
+        if not user_id or not username:
+            continue
+        if _cache.get(user_id) != username:
+            fresh[user_id] = username
+        _cache.set(user_id, username)
+    if fresh:
+        storage.write_usernames(fresh)
+
+
+def _claim(user_ids):
+    """Split misses into lookups this caller owns and ones already in flight"""
+    owned, waiting = [], {}
+    with _inflight_lock:
+        for user_id in user_ids:
+            event = _inflight.get(user_id)
+            if event is None:
+                _inflight[user_id] = threading.Event()
+                owned.append(user_id)
+            else:
+                waiting[user_id] = event
+    return owned, waiting
+
+
+def _release(user_ids):
+    with _inflight_lock:
+        for user_id in user_ids:
+            event = _inflight.pop(user_id, None)
+            if event is not None:
+                event.set()
+
+
+def _resolve_remote(user_ids):
+    resolved = storage.read_usernames(user_ids)
+    for user_id, username in resolved.items():
+        _cache.set(user_id, username)
+
+    learned = {}
+    for user_id in user_ids:
+        if user_id in resolved:
+            continue
+        try:
+            username = storage.lookup_username(user_id)
+        except ClientError:
+            # Transient Cognito failure (e.g. throttling): don't cache it
+            resolved[user_id] = user_id
+            continue
+        if username is None:
+            _cache.set(user_id, _UNKNOWN, NEGATIVE_CACHE_TTL_SECONDS)
+            resolved[user_id] = user_id
+        else:
+            _cache.set(user_id, username)
+            learned[user_id] = username
+            resolved[user_id] = username
+
+    if learned:
+        storage.write_usernames(learned)
+    return resolved
@@ -0,0 +1,437 @@
+"""Self-hosted HTTP server for app.lambda_handler, with a load generator.
+
+`serve` turns plain HTTP requests into the API Gateway proxy events the
+handler expects and runs them on a pool of threads in each of --workers
+processes. The processes share one listening socket; each keeps its AWS
+clients (and their connection pools) or SQLite connections across
+requests, like a warm Lambda container.
+
+    python server.py serve --port 8080 --workers 4 --threads 16
+    python server.py serve --storage sqlite --sqlite-path tasks.db
+
+`users` fills the SQLite engine's user directory, which stands in for
+Cognito: /users search and every username come from it. Pairs are given
+as SUB=USERNAME or read from a user_id,username CSV file.
+
+    python server.py users --sqlite-path tasks.db --add 1a2b...=alice
+    python server.py users --sqlite-path tasks.db --file users.csv
+
+`loadgen` replays a request mix against a server from --clients keep-alive
+connections per process and reports throughput, latency percentiles per
+request and clients starved of a server thread; benchmarks/throughput.py
+runs it against a seeded server.
+
+    python server.py loadgen --url http://127.0.0.1:8080 --user u1 \\
+        --request "GET /projects" --request "GET /tasks?project_id=p1" \\
+        --clients 16 --processes 2 --duration 30
+"""
+import os
+import sys
+import json
+import time
+import csv
+import base64
+import signal
+import socket
+import argparse
+import threading
+import statistics
+import http.client
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+# Seconds an idle keep-alive connection holds a worker thread
+KEEPALIVE_TIMEOUT_SECONDS = 5
+
+# Read size when discarding a request body over REQUEST_MAX_BYTES
+DISCARD_CHUNK_BYTES = 64 * 1024
+
+# Seconds the accept loop waits for a free thread before polling again
+ACCEPT_WAIT_SECONDS = 0.5
+
+# A load generator client that completed fewer than this share of the
+# median client's requests was starved of a server thread
+STARVED_SHARE = 0.25
+
+
+def lambda_event(method, target, headers, body):
+    """The API Gateway proxy event for an HTTP request"""
+    url = urlsplit(target)
+    query = dict(parse_qsl(url.query, keep_blank_values=True))
+    return {
+        'httpMethod': method,
+        'resource': url.path.rstrip('/') or '/',
+        'path': url.path,
+        'headers': dict(headers),
+        'queryStringParameters': query or None,
+        # As from API Gateway with binary media types */*: any body, gzip
+        # included, arrives base64-encoded
+        'body': base64.b64encode(body).decode('ascii') if body else None,
+        'isBase64Encoded': bool(body)
+    }
+
+
+class LambdaRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    timeout = KEEPALIVE_TIMEOUT_SECONDS
+    # Headers and body are separate writes; with Nagle on, delayed ACKs
+    # would add ~40 ms to every response
+    disable_nagle_algorithm = True
+    access_log = False
+
+    def handle_event(self):
+        import app
+        from functions.http import REQUEST_MAX_BYTES, message_response
+
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > REQUEST_MAX_BYTES:
+            # Refused without holding the body in memory; it is still read
+            # so the client gets the 413 rather than a reset connection
+            while length > 0:
+                chunk = self.rfile.read(min(length, DISCARD_CHUNK_BYTES))
+                if not chunk:
+                    break
+                length -= len(chunk)
+            response = message_response(413, f'Request body is over {REQUEST_MAX_BYTES} bytes')
+        else:
+            body = self.rfile.read(length) if length else b''
+            response = app.lambda_handler(lambda_event(self.command, self.path, self.headers.items(), body), None)
+
+        payload = response.get('body') or ''
+        if response.get('isBase64Encoded'):
+            payload = base64.b64decode(payload)
+        elif isinstance(payload, str):
+            payload = payload.encode('utf-8')
+        self.send_response(response.get('statusCode', 200))
+        for name, value in (response.get('headers') or {}).items():
+            self.send_header(name, value)
+        if self.server.saturated:
+            # Hand the thread to a waiting connection; the client reconnects
+            self.send_header('Connection', 'close')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_OPTIONS = handle_event
+
+    def log_message(self, format, *args):
+        if self.access_log:
+            super().log_message(format, *args)
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that handles connections on a fixed pool of threads.
+
+    A connection is only accepted once a thread is free for it, so a busy
+    worker leaves it in the shared backlog for another worker instead of
+    queueing it behind keep-alive connections. While connections wait,
+    busy ones are closed after their current response so threads rotate.
+    """
+
+    def __init__(self, sock, threads):
+        super().__init__(sock.getsockname(), LambdaRequestHandler, bind_and_activate=False)
+        # Serve from the shared, already listening socket; non-blocking, as
+        # another worker may accept a connection this one was woken for
+        self.socket.close()
+        self.socket = sock
+        self.socket.setblocking(False)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='request')
+        self.slots = threading.Semaphore(threads)
+        self.saturated = False
+
+    def get_request(self):
+        if not self.slots.acquire(blocking=False):
+            self.saturated = True
+            acquired = self.slots.acquire(timeout=ACCEPT_WAIT_SECONDS)
+            self.saturated = False
+            if not acquired:
+                raise BlockingIOError('No free request thread')
+        try:
+            request, client_address = self.socket.accept()
+        except OSError:
+            self.slots.release()
+            raise
+        request.setblocking(True)
+        return request, client_address
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self.process_request_thread, request, client_address)
+
+    def process_request_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+
+def configure(args):
+    """Environment for the app, set before any worker imports it"""
+    if args.storage:
+        os.environ['STORAGE_BACKEND'] = args.storage
+    if args.sqlite_path:
+        os.environ['SQLITE_PATH'] = args.sqlite_path
+    # Outside Lambda cascades run inline instead of invoking the function
+    os.environ.pop('AWS_LAMBDA_FUNCTION_NAME', None)
+    # Request threads plus the shared fan-out and batch-write pools can all
+    # hold a connection at once
+    os.environ.setdefault('AWS_MAX_POOL_CONNECTIONS', str(
+        args.threads + int(os.environ.get('FANOUT_MAX_WORKERS', '8')) +
+        int(os.environ.get('BATCH_WRITE_CONCURRENCY', '4'))
+    ))
+
+
+def run_worker(sock, threads, access_log):
+    import app  # noqa: F401  (build the route table before taking requests)
+
+    LambdaRequestHandler.access_log = access_log
+    server = PooledHTTPServer(sock, threads)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.pool.shutdown(wait=False)
+
+
+def serve(args):
+    configure(args)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(args.backlog)
+    print(f'Serving on http://{args.host}:{sock.getsockname()[1]} '
+          f'({args.workers} workers x {args.threads} threads)', flush=True)
+
+    if args.workers == 1:
+        run_worker(sock, args.threads, args.access_log)
+        return 0
+
+    # Workers are forked after the socket is bound and accept from it
+    # directly; the app is imported in each worker, never in the parent
+    children = []
+    for _ in range(args.workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                run_worker(sock, args.threads, args.access_log)
+            finally:
+                os._exit(0)
+        children.append(pid)
+
+    def stop(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    for pid in children:
+        while True:
+            try:
+                os.waitpid(pid, 0)
+                break
+            except InterruptedError:
+                continue
+            except ChildProcessError:
+                break
+    return 0
+
+
+# ------------------------------ Load generator ------------------------------
+
+def parse_request(spec, user_id=None):
+    """A (label, method, target, body) from 'METHOD /path?query [json body]'"""
+    method, _, rest = spec.strip().partition(' ')
+    target, _, body = rest.strip().partition(' ')
+    if user_id:
+        url = urlsplit(target)
+        target = url.path + '?' + urlencode([*parse_qsl(url.query, keep_blank_values=True), ('userId', user_id)])
+    return spec.strip(), method.upper(), target, json.loads(body) if body else None
+
+
+def run_client(url, requests, deadline, offset):
+    """Send requests round-robin on one keep-alive connection until deadline;
+    returns [(label, ms, status)]
+    """
+    location = urlsplit(url)
+    prefix = location.path.rstrip('/')
+    connection = http.client.HTTPConnection(location.hostname, location.port or 80, timeout=60)
+    samples = []
+    index = offset
+    while time.monotonic() < deadline:
+        label, method, target, body = requests[index % len(requests)]
+        index += 1
+        # Bytes, so http.client sends the body with the headers
+        payload = json.dumps(body).encode('utf-8') if body is not None else None
+        headers = {'Content-Type': 'application/json'} if payload else {}
+        start = time.perf_counter()
+        try:
+            connection.request(method, prefix + target, body=payload, headers=headers)
+            response = connection.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            connection = http.client.HTTPConnection(location.hostname, location.port or 80, timeout=60)
+            status = 0
+        samples.append((label, (time.perf_counter() - start) * 1000, status))
+    connection.close()
+    return samples
+
+
+def run_process(url, requests, clients, duration, offset):
+    """One load generator process: `clients` threads, each on its own
+    connection; returns each client's samples
+    """
+    deadline = time.monotonic() + duration
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        futures = [pool.submit(run_client, url, requests, deadline, offset + n) for n in range(clients)]
+        return [future.result() for future in futures]
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_load(url, requests, clients=8, processes=1, duration=10.0):
+    """Drive a server with the request mix; returns a summary dict"""
+    started = time.monotonic()
+    if processes == 1:
+        per_client = run_process(url, requests, clients, duration, 0)
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            batches = pool.starmap(
+                run_process, [(url, requests, clients, duration, n * clients) for n in range(processes)]
+            )
+        per_client = [client for batch in batches for client in batch]
+    elapsed = time.monotonic() - started
+    samples = [sample for client in per_client for sample in client]
+
+    # A client left waiting for a server thread shows up as a handful of
+    # very slow requests, which percentiles over all samples hide
+    counts = [len(client) for client in per_client]
+    median_count = statistics.median(counts) if counts else 0
+
+    rows = []
+    for label in dict.fromkeys(request[0] for request in requests):
+        latencies = [ms for name, ms, status in samples if name == label]
+        if not latencies:
+            continue
+        rows.append({
+            'route': label,
+            'requests': len(latencies),
+            'p50_ms': statistics.median(latencies),
+            'p90_ms': percentile(latencies, 90),
+            'p99_ms': percentile(latencies, 99),
+            'max_ms': max(latencies),
+            'errors': sum(1 for name, ms, status in samples if name == label and not 200 <= status < 400)
+        })
+    latencies = [ms for _, ms, _ in samples]
+    return {
+        'requests': len(samples),
+        'errors': sum(row['errors'] for row in rows),
+        'seconds': elapsed,
+        'throughput': len(samples) / elapsed if elapsed else 0,
+        'p50_ms': statistics.median(latencies) if latencies else 0,
+        'p99_ms': percentile(latencies, 99) if latencies else 0,
+        'clients': len(counts),
+        'client_requests_min': min(counts) if counts else 0,
+        'client_requests_median': median_count,
+        'starved_clients': sum(1 for count in counts if count < median_count * STARVED_SHARE),
+        'routes': rows
+    }
+
+
+def print_load(title, summary):
+    print(f'\n{title}')
+    print(f"{'request':<48}{'n':>8}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>8}")
+    for row in summary['routes']:
+        print(f"{row['route'][:47]:<48}{row['requests']:>8}{row['p50_ms']:>9.1f}{row['p90_ms']:>9.1f}"
+              f"{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}{row['errors']:>8}")
+    print(f"{summary['requests']} requests in {summary['seconds']:.1f}s: {summary['throughput']:.1f} req/s, "
+          f"p50 {summary['p50_ms']:.1f} ms, p99 {summary['p99_ms']:.1f} ms, {summary['errors']} errors")
+    print(f"{summary['clients']} clients: {summary['client_requests_min']} to {summary['client_requests_median']:g} "
+          f"(median) requests each, {summary['starved_clients']} starved")
+
+
+def loadgen(args):
+    requests = [parse_request(spec, args.user) for spec in args.request]
+    summary = run_load(args.url, requests, args.clients, args.processes, args.duration)
+    print_load(f'{args.url}: {args.processes} processes x {args.clients} clients, {args.duration:g}s', summary)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(summary, f, indent=2)
+    return 1 if summary['errors'] or summary['starved_clients'] else 0
+
+
+def add_users(args):
+    """Upsert sub -> username pairs into the SQLite user directory"""
+    from functions.storage_sqlite import SQLiteStorage
+
+    users = {}
+    for spec in args.add or ():
+        user_id, _, username = spec.partition('=')
+        if not user_id or not username:
+            print(f'Expected SUB=USERNAME, got {spec!r}', file=sys.stderr)
+            return 2
+        users[user_id] = username
+    if args.file:
+        with open(args.file, newline='') as f:
+            for row in csv.reader(f):
+                if len(row) >= 2 and row[0] and row[1] and row[:2] != ['user_id', 'username']:
+                    users[row[0]] = row[1]
+    if not users:
+        print('No users given (--add or --file)', file=sys.stderr)
+        return 2
+
+    engine = SQLiteStorage(args.sqlite_path or os.environ.get('SQLITE_PATH', 'task-manager.db'))
+    engine.write_usernames(users)
+    print(f'{len(users)} users written to {engine.path}')
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = commands.add_parser('serve', help='run the API as an HTTP server')
+    serve_parser.add_argument('--host', default='127.0.0.1')
+    serve_parser.add_argument('--port', type=int, default=8080, help='0 picks a free port')
+    serve_parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes')
+    serve_parser.add_argument('--threads', type=int, default=16, help='request threads per worker')
+    serve_parser.add_argument('--backlog', type=int, default=128, help='listen backlog')
+    serve_parser.add_argument('--storage', choices=['dynamodb', 'sqlite'],
+                              help='storage engine (default: STORAGE_BACKEND)')
+    serve_parser.add_argument('--sqlite-path', help='SQLite database file (default: SQLITE_PATH)')
+    serve_parser.add_argument('--access-log', action='store_true', help='log every request to stderr')
+
+    users_parser = commands.add_parser('users', help='add users to the SQLite user directory')
+    users_parser.add_argument('--sqlite-path', help='SQLite database file (default: SQLITE_PATH)')
+    users_parser.add_argument('--add', action='append', metavar='SUB=USERNAME', help='user to add (repeatable)')
+    users_parser.add_argument('--file', help='CSV file of user_id,username rows')
+
+    load_parser = commands.add_parser('loadgen', help='drive a running server with a request mix')
+    load_parser.add_argument('--url', required=True, help='server base URL')
+    load_parser.add_argument('--user', help='userId added to every request')
+    load_parser.add_argument('--request', action='append', required=True, metavar='"METHOD /path?query [json]"',
+                             help='request of the mix (repeatable), sent round-robin')
+    load_parser.add_argument('--clients', type=int, default=8, help='connections per process')
+    load_parser.add_argument('--processes', type=int, default=1, help='load generator processes')
+    load_parser.add_argument('--duration', type=float, default=10.0, help='seconds to run')
+    load_parser.add_argument('--json', help='also write the summary to this file')
+
+    args = parser.parse_args(argv)
+    return {'serve': serve, 'users': add_users, 'loadgen': loadgen}[args.command](args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,6 +1,10 @@
 resource "aws_api_gateway_rest_api" "task_manager_api" {
   name        = "task-manager-api"
   description = "API for managing tasks and projects"
+
+  # Lets the Lambda return gzip bodies (isBase64Encoded); API Gateway decodes
+  # them back to binary for clients that sent Accept-Encoding: gzip
+  binary_media_types = ["*/*"]
 }
 
 resource "aws_api_gateway_resource" "projects" {
@@ -9,18 +13,66 @@ resource "aws_api_gateway_resource" "projects" {
   path_part   = "projects"
 }
 
+resource "aws_api_gateway_resource" "projects_export" {
+  rest_api_id = aws_api_gateway_rest_api.task_manager_api.id
+  parent_id   = aws_api_gateway_resource.projects.id
+  path_part   = "export"
+}
+
+resource "aws_api_gateway_resource" "projects_import" {
+  rest_api_id = aws_api_gateway_rest_api.task_manager_api.id
+  parent_id   = aws_api_gateway_resource.projects.id
+  path_part   = "import"
+}
+
 resource "aws_api_gateway_resource" "tasks" {
   rest_api_id = aws_api_gateway_rest_api.task_manager_api.id
   parent_id   = aws_api_gateway_rest_api.task_manager_api.root_resource_id
   path_part   = "tasks"
 }
 
+resource "aws_api_gateway_resource" "tasks_batch" {
+  rest_api_id = aws_api_gateway_rest_api.task_manager_api.id
+  parent_id   = aws_api_gateway_resource.tasks.id
+  path_part   = "batch"
+}
+
+resource "aws_api_gateway_resource" "tasks_search" {
+  rest_api_id = aws_api_gateway_rest_api.task_manager_api.id
+  parent_id   = aws_api_gateway_resource.tasks.id
+  path_part   = "search"
+}
+
+resource "aws_api_gateway_resource" "tasks_archive" {
+  rest_api_id = aws_api_gateway_rest_api.task_manager_api.id
+  parent_id   = aws_api_gateway_resource.tasks.id
+  path_part   = "archive"
+}
+
 resource "aws_api_gateway_resource" "invites" {
   rest_api_id = aws_api_gateway_rest_api.task_manager_api.id
   parent_id   = aws_api_gateway_rest_api.task_manager_api.root_resource_id
   path_part   = "invites"
 }
 
+resource "aws_api_gateway_resource" "analytics" {
+  rest_api_id = aws_api_gateway_rest_api.task_manager_api.id
+  parent_id   = aws_api_gateway_rest_api.task_manager_api.root_resource_id
+  path_part   = "analytics"
+}
+
+resource "aws_api_gateway_resource" "activity" {
+  rest_api_id = aws_api_gateway_rest_api.task_manager_api.id
+  parent_id   = aws_api_gateway_rest_api.task_manager_api.root_resource_id
+  path_part   = "activity"
+}
+
+resource "aws_api_gateway_resource" "changes" {
+  rest_api_id = aws_api_gateway_rest_api.task_manager_api.id
+  parent_id   = aws_api_gateway_rest_api.task_manager_api.root_resource_id
+  path_part   = "changes"
+}
+
 resource "aws_api_gateway_resource" "users" {
   rest_api_id = aws_api_gateway_rest_api.task_manager_api.id
   parent_id   = aws_api_gateway_rest_api.task_manager_api.root_resource_id
@@ -37,6 +89,20 @@ resource "aws_api_gateway_method" "any_method_projects" {
   # This method will trigger the AWS Lambda function
 }
 
+resource "aws_api_gateway_method" "any_method_projects_export" {
+  rest_api_id   = aws_api_gateway_rest_api.task_manager_api.id
+  resource_id   = aws_api_gateway_resource.projects_export.id
+  http_method   = "ANY"
+  authorization = "NONE"
+}
+
+resource "aws_api_gateway_method" "any_method_projects_import" {
+  rest_api_id   = aws_api_gateway_rest_api.task_manager_api.id
+  resource_id   = aws_api_gateway_resource.projects_import.id
+  http_method   = "ANY"
+  authorization = "NONE"
+}
+
 # Define the ANY method for /tasks
 resource "aws_api_gateway_method" "any_method_tasks" {
   rest_api_id   = aws_api_gateway_rest_api.task_manager_api.id
@@ -45,6 +111,27 @@ resource "aws_api_gateway_method" "any_method_tasks" {
   authorization = "NONE"
 }
 
+resource "aws_api_gateway_method" "any_method_tasks_batch" {
+  rest_api_id   = aws_api_gateway_rest_api.task_manager_api.id
+  resource_id   = aws_api_gateway_resource.tasks_batch.id
+  http_method   = "ANY"
+  authorization = "NONE"
+}
+
+resource "aws_api_gateway_method" "any_method_tasks_search" {
+  rest_api_id   = aws_api_gateway_rest_api.task_manager_api.id
+  resource_id   = aws_api_gateway_resource.tasks_search.id
+  http_method   = "ANY"
+  authorization = "NONE"
+}
+
+resource "aws_api_gateway_method" "any_method_tasks_archive" {
+  rest_api_id   = aws_api_gateway_rest_api.task_manager_api.id
+  resource_id   = aws_api_gateway_resource.tasks_archive.id
+  http_method   = "ANY"
+  authorization = "NONE"
+}
+
 resource "aws_api_gateway_method" "any_method_invites" {
   rest_api_id   = aws_api_gateway_rest_api.task_manager_api.id
   resource_id   = aws_api_gateway_resource.invites.id
@@ -52,6 +139,27 @@ resource "aws_api_gateway_method" "any_method_invites" {
   authorization = "NONE"
 }
 
+resource "aws_api_gateway_method" "any_method_analytics" {
+  rest_api_id   = aws_api_gateway_rest_api.task_manager_api.id
+  resource_id   = aws_api_gateway_resource.analytics.id
+  http_method   = "ANY"
+  authorization = "NONE"
+}
+
+resource "aws_api_gateway_method" "any_method_activity" {
+  rest_api_id   = aws_api_gateway_rest_api.task_manager_api.id
+  resource_id   = aws_api_gateway_resource.activity.id
+  http_method   = "ANY"
+  authorization = "NONE"
+}
+
+resource "aws_api_gateway_method" "any_method_changes" {
+  rest_api_id   = aws_api_gateway_rest_api.task_manager_api.id
+  resource_id   = aws_api_gateway_resource.changes.id
+  http_method   = "ANY"
+  authorization = "NONE"
+}
+
 resource "aws_api_gateway_method" "get_users" {
   rest_api_id   = aws_api_gateway_rest_api.task_manager_api.id
   resource_id   = aws_api_gateway_resource.users.id
@@ -69,6 +177,24 @@ resource "aws_api_gateway_integration" "lambda_integration_projects" {
   uri                     = aws_lambda_function.task_manager_lambda.invoke_arn
 }
 
+resource "aws_api_gateway_integration" "lambda_integration_projects_export" {
+  rest_api_id             = aws_api_gateway_rest_api.task_manager_api.id
+  resource_id             = aws_api_gateway_resource.projects_export.id
+  http_method             = aws_api_gateway_method.any_method_projects_export.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = aws_lambda_function.task_manager_lambda.invoke_arn
+}
+
+resource "aws_api_gateway_integration" "lambda_integration_projects_import" {
+  rest_api_id             = aws_api_gateway_rest_api.task_manager_api.id
+  resource_id             = aws_api_gateway_resource.projects_import.id
+  http_method             = aws_api_gateway_method.any_method_projects_import.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = aws_lambda_function.task_manager_lambda.invoke_arn
+}
+
 # Define the integration between the method and Lambda for /tasks
 resource "aws_api_gateway_integration" "lambda_integration_tasks" {
   rest_api_id             = aws_api_gateway_rest_api.task_manager_api.id
@@ -79,6 +205,33 @@ resource "aws_api_gateway_integration" "lambda_integration_tasks" {
   uri                     = aws_lambda_function.task_manager_lambda.invoke_arn
 }
 
+resource "aws_api_gateway_integration" "lambda_integration_tasks_batch" {
+  rest_api_id             = aws_api_gateway_rest_api.task_manager_api.id
+  resource_id             = aws_api_gateway_resource.tasks_batch.id
+  http_method             = aws_api_gateway_method.any_method_tasks_batch.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = aws_lambda_function.task_manager_lambda.invoke_arn
+}
+
+resource "aws_api_gateway_integration" "lambda_integration_tasks_search" {
+  rest_api_id             = aws_api_gateway_rest_api.task_manager_api.id
+  resource_id             = aws_api_gateway_resource.tasks_search.id
+  http_method             = aws_api_gateway_method.any_method_tasks_search.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = aws_lambda_function.task_manager_lambda.invoke_arn
+}
+
+resource "aws_api_gateway_integration" "lambda_integration_tasks_archive" {
+  rest_api_id             = aws_api_gateway_rest_api.task_manager_api.id
+  resource_id             = aws_api_gateway_resource.tasks_archive.id
+  http_method             = aws_api_gateway_method.any_method_tasks_archive.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = aws_lambda_function.task_manager_lambda.invoke_arn
+}
+
 resource "aws_api_gateway_integration" "lambda_integration_invites" {
   rest_api_id             = aws_api_gateway_rest_api.task_manager_api.id
   resource_id             = aws_api_gateway_resource.invites.id
@@ -88,6 +241,35 @@ resource "aws_api_gateway_integration" "lambda_integration_invites" {
   uri                     = aws_lambda_function.task_manager_lambda.invoke_arn
 }
 
+resource "aws_api_gateway_integration" "lambda_integration_analytics" {
+  rest_api_id             = aws_api_gateway_rest_api.task_manager_api.id
+  resource_id             = aws_api_gateway_resource.analytics.id
+  http_method             = aws_api_gateway_method.any_method_analytics.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = aws_lambda_function.task_manager_lambda.invoke_arn
+}
+
+resource "aws_api_gateway_integration" "lambda_integration_activity" {
+  rest_api_id             = aws_api_gateway_rest_api.task_manager_api.id
+  resource_id             = aws_api_gateway_resource.activity.id
+  http_method             = aws_api_gateway_method.any_method_activity.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = aws_lambda_function.task_manager_lambda.invoke_arn
+}
+
+# Long poll: GET /changes blocks up to CHANGES_WAIT_SECONDS, inside the
+# 29 second integration timeout
+resource "aws_api_gateway_integration" "lambda_integration_changes" {
+  rest_api_id             = aws_api_gateway_rest_api.task_manager_api.id
+  resource_id             = aws_api_gateway_resource.changes.id
+  http_method             = aws_api_gateway_method.any_method_changes.http_method
+  integration_http_method = "POST"
+  type                    = "AWS_PROXY"
+  uri                     = aws_lambda_function.task_manager_lambda.invoke_arn
+}
+
 resource "aws_api_gateway_integration" "lambda_integration_users" {
   rest_api_id             = aws_api_gateway_rest_api.task_manager_api.id
   resource_id             = aws_api_gateway_resource.users.id
@@ -104,7 +286,15 @@ resource "aws_api_gateway_deployment" "task_manager_api_deployment" {
 
   depends_on = [
     aws_api_gateway_integration.lambda_integration_projects,
+    aws_api_gateway_integration.lambda_integration_projects_export,
+    aws_api_gateway_integration.lambda_integration_projects_import,
     aws_api_gateway_integration.lambda_integration_tasks,
+    aws_api_gateway_integration.lambda_integration_tasks_batch,
+    aws_api_gateway_integration.lambda_integration_tasks_search,
+    aws_api_gateway_integration.lambda_integration_tasks_archive,
+    aws_api_gateway_integration.lambda_integration_analytics,
+    aws_api_gateway_integration.lambda_integration_activity,
+    aws_api_gateway_integration.lambda_integration_changes,
     aws_lambda_function.task_manager_lambda  # This forces redeployment when Lambda changes
   ]
 }
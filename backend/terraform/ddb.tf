@@ -49,6 +49,16 @@ resource "aws_dynamodb_table" "tasks" {
     type = "S"
   }
 
+  attribute {
+    name = "status"
+    type = "S"
+  }
+
+  attribute {
+    name = "updated_at"
+    type = "S"
+  }
+
   # Add project-id-index GSI
   global_secondary_index {
     name               = "project-id-index"
@@ -69,6 +79,22 @@ resource "aws_dynamodb_table" "tasks" {
     range_key         = "project_id"
     projection_type   = "ALL"
   }
+
+  # Lets a board column (one status) be read without touching other tasks
+  global_secondary_index {
+    name               = "project-status-index"
+    hash_key          = "project_id"
+    range_key         = "status"
+    projection_type   = "ALL"
+  }
+
+  # Delta sync: tasks of a project changed after a given time
+  global_secondary_index {
+    name               = "project-updated-index"
+    hash_key          = "project_id"
+    range_key         = "updated_at"
+    projection_type   = "ALL"
+  }
 }
 
 resource "aws_dynamodb_table" "project_members" {
@@ -97,3 +123,106 @@ resource "aws_dynamodb_table" "project_members" {
     projection_type    = "ALL"
   }
 }
+
+
+# Persistent Cognito sub -> username mirror, read in bulk by the user directory
+resource "aws_dynamodb_table" "user_directory" {
+  name           = "UserDirectory"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "user_id"
+
+  attribute {
+    name = "user_id"
+    type = "S"
+  }
+}
+
+# Deletion tombstones for delta sync; scope is a project_id or user#<sub>
+resource "aws_dynamodb_table" "tombstones" {
+  name           = "Tombstones"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "scope"
+  range_key      = "tombstone_key" # <deleted_at>#<entity_id>
+
+  attribute {
+    name = "scope"
+    type = "S"
+  }
+
+  attribute {
+    name = "tombstone_key"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+}
+
+# Pre-aggregated task counters maintained by the task write paths
+resource "aws_dynamodb_table" "project_stats" {
+  name           = "ProjectStats"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "project_id"
+  range_key      = "stat_key" # total, status#<s>, assignee#<sub>, day#<date>#...
+
+  attribute {
+    name = "project_id"
+    type = "S"
+  }
+
+  attribute {
+    name = "stat_key"
+    type = "S"
+  }
+
+  # Daily trend counters expire; the running totals don't carry expires_at
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+}
+
+# Inverted index for task search: one posting per (project, token, task),
+# so a term lookup reads only the matching tasks of one project
+resource "aws_dynamodb_table" "task_search" {
+  name           = "TaskSearch"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "project_id"
+  range_key      = "posting" # <token>#<9999 - weight>#<task_id>, best-first per token
+
+  attribute {
+    name = "project_id"
+    type = "S"
+  }
+
+  attribute {
+    name = "posting"
+    type = "S"
+  }
+}
+
+# Append-only activity log. Each project/day is its own partition, so a busy
+# project spreads over days and a timeline reads the newest days first
+resource "aws_dynamodb_table" "activity_log" {
+  name           = "ActivityLog"
+  billing_mode   = "PAY_PER_REQUEST"
+  hash_key       = "bucket"    # <project_id>#<YYYY-MM-DD>
+  range_key      = "event_key" # <timestamp>#<event id>
+
+  attribute {
+    name = "bucket"
+    type = "S"
+  }
+
+  attribute {
+    name = "event_key"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+}
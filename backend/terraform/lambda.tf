@@ -12,6 +12,8 @@ resource "aws_lambda_function" "task_manager_lambda" {
       TASK_TABLE    = aws_dynamodb_table.tasks.name
       COGNITO_USER_POOLID = aws_cognito_user_pool.user_pool.id
       COGNITO_CLIENT_ID = aws_cognito_user_pool_client.user_pool_client.id
+      USER_DIRECTORY_TABLE = aws_dynamodb_table.user_directory.name
+      ARCHIVE_BUCKET = aws_s3_bucket.task_archive.bucket
     }
   }
 
@@ -59,17 +61,66 @@ resource "aws_iam_policy" "lambda_policy" {
           "dynamodb:GetItem",
           "dynamodb:Query",
           "dynamodb:UpdateItem",
-          "dynamodb:DeleteItem"
+          "dynamodb:DeleteItem",
+          "dynamodb:BatchGetItem",
+          "dynamodb:BatchWriteItem",
+          "dynamodb:ConditionCheckItem"
         ],
         Effect = "Allow",
         Resource = [
           aws_dynamodb_table.projects.arn,
           aws_dynamodb_table.tasks.arn,
           aws_dynamodb_table.project_members.arn,
+          aws_dynamodb_table.user_directory.arn,
+          aws_dynamodb_table.tombstones.arn,
+          aws_dynamodb_table.project_stats.arn,
+          aws_dynamodb_table.task_search.arn,
+          aws_dynamodb_table.activity_log.arn,
           "${aws_dynamodb_table.projects.arn}/index/*",
           "${aws_dynamodb_table.tasks.arn}/index/*",
           "${aws_dynamodb_table.project_members.arn}/index/*"
         ]
+      },
+      {
+        # The daily archive job lists every project
+        Action = [
+          "dynamodb:Scan"
+        ],
+        Effect = "Allow",
+        Resource = [
+          aws_dynamodb_table.projects.arn
+        ]
+      },
+      {
+        # Archive segments of long-Done tasks
+        Action = [
+          "s3:GetObject",
+          "s3:PutObject",
+          "s3:DeleteObject"
+        ],
+        Effect = "Allow",
+        Resource = [
+          "${aws_s3_bucket.task_archive.arn}/*"
+        ]
+      },
+      {
+        Action = [
+          "s3:ListBucket"
+        ],
+        Effect = "Allow",
+        Resource = [
+          aws_s3_bucket.task_archive.arn
+        ]
+      },
+      {
+        # Cascade deletes run as asynchronous invocations of this function
+        Action = [
+          "lambda:InvokeFunction"
+        ],
+        Effect = "Allow",
+        Resource = [
+          aws_lambda_function.task_manager_lambda.arn
+        ]
       }
     ]
   })
@@ -79,4 +130,25 @@ resource "aws_iam_policy_attachment" "lambda_policy_attachment" {
   name       = "lambda-policy-attachment"
   policy_arn = aws_iam_policy.lambda_policy.arn
   roles      = [aws_iam_role.lambda_role.name]
-}
\ No newline at end of file
+}
+
+# Daily archive of tasks that have been Done for ARCHIVE_AFTER_DAYS; the job
+# starts one asynchronous archive_tasks invocation per project
+resource "aws_cloudwatch_event_rule" "archive_tasks" {
+  name                = "task-manager-archive-tasks"
+  schedule_expression = "rate(1 day)"
+}
+
+resource "aws_cloudwatch_event_target" "archive_tasks" {
+  rule  = aws_cloudwatch_event_rule.archive_tasks.name
+  arn   = aws_lambda_function.task_manager_lambda.arn
+  input = jsonencode({ job = "archive_tasks" })
+}
+
+resource "aws_lambda_permission" "allow_archive_schedule" {
+  statement_id  = "AllowArchiveSchedule"
+  action        = "lambda:InvokeFunction"
+  principal     = "events.amazonaws.com"
+  function_name = aws_lambda_function.task_manager_lambda.function_name
+  source_arn    = aws_cloudwatch_event_rule.archive_tasks.arn
+}
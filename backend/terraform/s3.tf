@@ -1,3 +1,37 @@
 resource "aws_s3_bucket" "task-manager-bucket" {
   bucket = "task-mngr-bucket-ddb"  # Use your existing bucket name here
-}
\ No newline at end of file
+}
+
+# Archive segments of tasks Done for ARCHIVE_AFTER_DAYS (functions/archive.py);
+# the only copy of those tasks, so versioned and private
+resource "aws_s3_bucket" "task_archive" {
+  bucket = "task-mngr-archive"
+}
+
+resource "aws_s3_bucket_versioning" "task_archive" {
+  bucket = aws_s3_bucket.task_archive.id
+  versioning_configuration {
+    status = "Enabled"
+  }
+}
+
+resource "aws_s3_bucket_public_access_block" "task_archive" {
+  bucket                  = aws_s3_bucket.task_archive.id
+  block_public_acls       = true
+  block_public_policy     = true
+  ignore_public_acls      = true
+  restrict_public_buckets = true
+}
+
+# Versions left by deleted projects' segments don't accumulate
+resource "aws_s3_bucket_lifecycle_configuration" "task_archive" {
+  bucket = aws_s3_bucket.task_archive.id
+  rule {
+    id     = "expire-noncurrent-segments"
+    status = "Enabled"
+    filter {}
+    noncurrent_version_expiration {
+      noncurrent_days = 30
+    }
+  }
+}
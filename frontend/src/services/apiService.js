@@ -2,6 +2,9 @@ const API_URL =
   process.env.REACT_APP_API_URL ||
   "https://9ehr6i4dpi.execute-api.us-east-1.amazonaws.com/dev";
 
+// Request body limit of the API (REQUEST_MAX_BYTES in the backend)
+const IMPORT_MAX_BYTES = 4 * 1024 * 1024;
+
 export const projectService = {
   async getProjects(userId) {
     const response = await fetch(`${API_URL}/projects?userId=${userId}`, {
@@ -45,6 +48,40 @@ export const projectService = {
     if (!response.ok) throw new Error("Failed to delete project");
     return response.json();
   },
+
+  // NDJSON export of a project's metadata, members and tasks, as a Blob
+  async exportProject(projectId, userId) {
+    const params = new URLSearchParams({ project_id: projectId, userId });
+    const response = await fetch(`${API_URL}/projects/export?${params}`);
+    if (!response.ok) throw new Error("Failed to export project");
+    return response.blob();
+  },
+
+  // Creates a new project from an export (a File, Blob or string), gzipped
+  // where the browser can since the API takes at most 4 MB per request
+  async importProject(document, userId) {
+    const params = new URLSearchParams({ userId });
+    const headers = { "Content-Type": "application/x-ndjson" };
+    let body = new Blob([document]);
+    if (typeof CompressionStream !== "undefined") {
+      const stream = body.stream().pipeThrough(new CompressionStream("gzip"));
+      body = await new Response(stream).blob();
+      headers["Content-Encoding"] = "gzip";
+    }
+    if (body.size > IMPORT_MAX_BYTES) {
+      throw new Error("Export is too large to import");
+    }
+    const response = await fetch(`${API_URL}/projects/import?${params}`, {
+      method: "POST",
+      headers,
+      body,
+    });
+    if (!response.ok) {
+      const error = await response.text();
+      throw new Error(error || "Failed to import project");
+    }
+    return response.json();
+  },
 };
 
 export const taskService = {
@@ -124,6 +161,17 @@ export const taskService = {
     return response.json();
   },
 
+  // Apply many creates/updates/deletes in one request; returns one result per operation
+  async batchTasks(projectId, operations, userId) {
+    const response = await fetch(`${API_URL}/tasks/batch`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ project_id: projectId, operations, userId }),
+    });
+    if (!response.ok) throw new Error("Failed to apply task batch");
+    return response.json();
+  },
+
   async updateTaskStatus(taskId, projectId, status, userId) {
     const response = await fetch(`${API_URL}/tasks?task_id=${taskId}`, {
       method: "PUT",
@@ -199,3 +247,18 @@ export const userService = {
     return response.json();
   },
 };
+
+export const changeService = {
+  // Long poll: resolves when something changed or after the server's wait;
+  // without a cursor it returns one for the current state right away
+  async getChanges(cursor, userId) {
+    const params = new URLSearchParams({ userId });
+    if (cursor) params.set("cursor", cursor);
+    const response = await fetch(`${API_URL}/changes?${params}`);
+    if (!response.ok) {
+      const error = await response.text();
+      throw new Error(error || "Failed to fetch changes");
+    }
+    return response.json();
+  },
+};